@@ -1,14 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, stream_template, request, redirect, url_for, flash, get_flashed_messages, jsonify, Response, g
 from flask_wtf.csrf import CSRFProtect # type: ignore [import-untyped]
 from proxmoxer import ProxmoxAPI
+from proxmoxer.core import ResourceException
 from dotenv import load_dotenv
 import os
 import requests
+import urllib3
+import threading
+import time
 from datetime import datetime, timezone, timedelta, date as DateType
-from collections import deque
-import statistics
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 import math
-from typing import List, Dict, Optional, Tuple, Deque, Any, Union
+import random
+import socket
+import json
+import queue
+import traceback
+import uuid
+from typing import List, Dict, Optional, Tuple, Any, Union, Callable, Iterator
+from history_store import VMPerformanceHistory, CounterRateTracker, PERF_SERIES_NAMES
+from timeseries_store import SQLiteTimeSeriesStore
+from rightsizing import RightSizingPolicy, merge_rrd_utilization, build_right_sizing_report
+from snapshot_jobs import SnapshotDeleteQueue
+from snapshot_analysis import analyze_snapshots
+from snapshot_catalog import SnapshotCatalog
+from state_backend import StateBackend, MemoryStateBackend, SQLiteStateBackend, SharedMapping
+from telemetry import TelemetryRegistry, RequestTiming, CURRENT_REQUEST_TIMING, run_in_request_context
 
 load_dotenv()
 app = Flask(__name__)
@@ -18,37 +36,99 @@ csrf = CSRFProtect(app)
 PROXMOX_HOST: Optional[str] = os.getenv("PROXMOX_HOST")
 PROXMOX_USER: Optional[str] = os.getenv("PROXMOX_USER")
 PROXMOX_PASSWORD: Optional[str] = os.getenv("PROXMOX_PASSWORD")
+PROXMOX_TOKEN_NAME: Optional[str] = os.getenv("PROXMOX_TOKEN_NAME")
+PROXMOX_TOKEN_VALUE: Optional[str] = os.getenv("PROXMOX_TOKEN_VALUE")
+PROXMOX_TICKET_RENEW_SECONDS: int = int(os.getenv("PROXMOX_TICKET_RENEW_SECONDS", "3000")) # proxmoxer kendi kilitsiz yenilemesini 3600 sn'de yapar; havuz ondan önce davranır
+PROXMOX_LOGIN_RETRY_SECONDS: float = float(os.getenv("PROXMOX_LOGIN_RETRY_SECONDS", "5"))
+PROXMOX_HTTP_POOL_SIZE: int = int(os.getenv("PROXMOX_HTTP_POOL_SIZE", "32"))
 PROXMOX_VERIFY_SSL_STR: str = os.getenv("PROXMOX_VERIFY_SSL", "False")
 PROXMOX_VERIFY_SSL: bool = PROXMOX_VERIFY_SSL_STR.lower() in ['true', '1', 't']
 
 if not PROXMOX_VERIFY_SSL:
-    if hasattr(requests.packages, 'urllib3'):
-        requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning) # type: ignore
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 ProxmoxNodeType = Any
 VMKeyType = Tuple[str, int]
-CPUHistoryType = Deque[float]
-RAMHistoryType = Deque[float]
-PerfCPURAMHistoryType = Dict[str, Deque[float]]
-PerformanceHistoryValueType = Dict[str, Union[PerfCPURAMHistoryType, str]]
-PerformanceHistoryDictType = Dict[VMKeyType, PerformanceHistoryValueType]
-VMConfigValueType = Dict[str, Union[Optional[str], Optional[int], str]]
-CachedVMConfigsType = Dict[str, VMConfigValueType]
+PerformanceHistoryDictType = Dict[VMKeyType, VMPerformanceHistory]
+VMConfigValueType = Dict[str, Union[str, int, float, None]] # fetched_at duvar saati (float)
+CachedVMConfigsType = SharedMapping[VMConfigValueType]
 VMDetailType = Dict[str, Any]
 SnapshotDetailType = Dict[str, Any]
 RRDDataType = List[Dict[str, Optional[Union[int, float]]]]
+ResourceKeyType = Tuple[str, int, str]
 ProcessedRRDValuesType = Dict[str, Optional[float]]
 
+TELEMETRY: TelemetryRegistry = TelemetryRegistry()
 PERFORMANCE_HISTORY: PerformanceHistoryDictType = {}
-CACHED_VM_CONFIGS: CachedVMConfigsType = {}
+PERF_HISTORY_LOCK: threading.RLock = threading.RLock()
+RRD_CACHE: "OrderedDict[Tuple[str, int, str, str, str], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+RRD_CACHE_LOCK: threading.Lock = threading.Lock()
+RRD_CACHE_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
 
-HISTORY_MAX_LEN: int = 10
+INVENTORY_MODE: str = os.getenv("PVEGUARD_INVENTORY_MODE", "cluster").lower()
+CONFIG_CACHE_MAX_AGE_SECONDS: float = float(os.getenv("PVEGUARD_CONFIG_CACHE_MAX_AGE_SECONDS", "900"))
+CONFIG_CACHE_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+SNAPSHOT_FETCH_WORKERS: int = max(1, int(os.getenv("PVEGUARD_SNAPSHOT_FETCH_WORKERS", "16")))
+SNAPSHOT_FETCH_PER_NODE: int = max(1, int(os.getenv("PVEGUARD_SNAPSHOT_FETCH_PER_NODE", "4")))
+METRICS_COLLECTOR_ENABLED: bool = os.getenv("PVEGUARD_METRICS_COLLECTOR", "True").lower() in ['true', '1', 't']
+METRICS_COLLECTOR_INTERVAL_SECONDS: float = max(1.0, float(os.getenv("PVEGUARD_METRICS_INTERVAL_SECONDS", "7")))
+METRICS_COLLECTOR_JITTER_SECONDS: float = max(0.0, float(os.getenv("PVEGUARD_METRICS_JITTER_SECONDS", "0.5")))
+METRICS_COLLECTOR_MAX_BACKOFF_SECONDS: float = max(1.0, float(os.getenv("PVEGUARD_METRICS_MAX_BACKOFF_SECONDS", "120")))
+LIVE_SAMPLING_MODE: str = os.getenv("PVEGUARD_LIVE_SAMPLING_MODE", "cluster").lower() # cluster | nodes | per_vm
+BULK_COUNTER_FIELDS: Tuple[str, ...] = ('diskread', 'diskwrite', 'netin', 'netout')
+COUNTER_RATES: CounterRateTracker = CounterRateTracker(idle_after_seconds=max(30.0, 3 * METRICS_COLLECTOR_INTERVAL_SECONDS))
+LIVE_STREAM_KEEPALIVE_SECONDS: float = 15.0
+LIVE_STREAM_MAX_SECONDS: float = float(os.getenv("PVEGUARD_LIVE_STREAM_MAX_SECONDS", "300"))
+LIVE_HISTORY_FIELDS: Tuple[str, ...] = ('cpu_history', 'ram_history')
+RRD_STEP_SECONDS: Dict[str, int] = {"hour": 60, "day": 1800, "week": 10800, "month": 43200, "year": 604800}
+RRD_CACHE_MAX_ENTRIES: int = int(os.getenv("PVEGUARD_RRD_CACHE_MAX_ENTRIES", "4096"))
+RRD_MAX_POINTS_LIMIT: int = 5000
+SNAPSHOT_INDEX_MAX_AGE_SECONDS: float = float(os.getenv("PVEGUARD_SNAPSHOT_INDEX_MAX_AGE_SECONDS", "900"))
+SNAPSHOT_CATALOG_MAX_AGE_SECONDS: float = float(os.getenv("PVEGUARD_SNAPSHOT_CATALOG_MAX_AGE_SECONDS", "60"))
+SNAPSHOT_PAGE_SIZE: int = max(1, int(os.getenv("PVEGUARD_SNAPSHOT_PAGE_SIZE", "200")))
+SNAPSHOT_PAGE_MAX_SIZE: int = max(SNAPSHOT_PAGE_SIZE, 1000)
+DASHBOARD_STREAMING: bool = os.getenv("PVEGUARD_STREAM_DASHBOARD", "True").lower() in ['true', '1', 't']
+SNAPSHOT_TASK_TYPES: Tuple[str, ...] = ('qmsnapshot', 'qmdelsnapshot', 'qmrollback', 'vzsnapshot', 'vzdelsnapshot', 'vzrollback')
+SNAPSHOT_DELETE_WORKERS: int = max(1, int(os.getenv("PVEGUARD_SNAPSHOT_DELETE_WORKERS", "8")))
+SNAPSHOT_DELETE_PER_NODE: int = max(1, int(os.getenv("PVEGUARD_SNAPSHOT_DELETE_PER_NODE", "2")))
+SNAPSHOT_DELETE_LOCK_RETRIES: int = max(0, int(os.getenv("PVEGUARD_SNAPSHOT_DELETE_LOCK_RETRIES", "5")))
+SNAPSHOT_DELETE_TASK_TIMEOUT_SECONDS: float = float(os.getenv("PVEGUARD_SNAPSHOT_DELETE_TASK_TIMEOUT_SECONDS", "900"))
+STATE_BACKEND_KIND: str = os.getenv("PVEGUARD_STATE_BACKEND", "memory").lower() # memory | sqlite
+STATE_DB_PATH: str = os.getenv("PVEGUARD_STATE_DB_PATH", os.path.join(app.instance_path, "pveguard_state.sqlite3"))
+COLLECTOR_LEASE_NAME: str = "metrics_collector"
+SNAPSHOT_INDEX_EVENTS_NAMESPACE: str = "snapshot_index_events"
+SERVER_TIMING_ENABLED: bool = os.getenv("PVEGUARD_SERVER_TIMING", "False").lower() in ['true', '1', 't']
+TIMESERIES_DB_PATH: str = os.getenv("PVEGUARD_TSDB_PATH", os.path.join(app.instance_path, "pveguard_metrics.sqlite3"))
+TIMESERIES_ROLLUP_INTERVAL_SECONDS: float = float(os.getenv("PVEGUARD_TSDB_ROLLUP_INTERVAL_SECONDS", "300"))
+TIMESERIES_RAW_RETENTION_DAYS: float = float(os.getenv("PVEGUARD_TSDB_RAW_RETENTION_DAYS", "2"))
+TIMESERIES_5M_RETENTION_DAYS: float = float(os.getenv("PVEGUARD_TSDB_5M_RETENTION_DAYS", "35"))
+TIMESERIES_1H_RETENTION_DAYS: float = float(os.getenv("PVEGUARD_TSDB_1H_RETENTION_DAYS", "400"))
+TIMEFRAME_SECONDS: Dict[str, int] = {"hour": 3600, "day": 86400, "week": 7 * 86400, "month": 30 * 86400, "year": 365 * 86400}
+
+HISTORY_MAX_LEN: int = max(10, int(os.getenv("PVEGUARD_HISTORY_MAX_LEN", "2880")))
+SPARKLINE_POINTS: int = max(2, min(HISTORY_MAX_LEN, int(os.getenv("PVEGUARD_SPARKLINE_POINTS", "30"))))
+RIGHT_SIZING_MIN_SAMPLES: int = max(1, int(os.getenv("PVEGUARD_RIGHT_SIZING_MIN_SAMPLES", "5")))
 CPU_UNDERUTILIZED_THRESHOLD: float = 20.0
 RAM_UNDERUTILIZED_THRESHOLD: float = 30.0
-CPU_SUGGESTION_THRESHOLD_PERCENT: float = 15.0
-MIN_VCPU: int = 1
-RAM_SUGGESTION_THRESHOLD_PERCENT: float = 25.0
-MIN_RAM_MB: int = 1024
+CPU_SUGGESTION_THRESHOLD_PERCENT: float = float(os.getenv("PVEGUARD_CPU_SUGGESTION_THRESHOLD_PERCENT", "15"))
+MIN_VCPU: int = int(os.getenv("PVEGUARD_MIN_VCPU", "1"))
+RAM_SUGGESTION_THRESHOLD_PERCENT: float = float(os.getenv("PVEGUARD_RAM_SUGGESTION_THRESHOLD_PERCENT", "25"))
+MIN_RAM_MB: int = int(os.getenv("PVEGUARD_MIN_RAM_MB", "1024"))
+RIGHT_SIZING_POLICY: RightSizingPolicy = RightSizingPolicy(
+    cpu_threshold_percent=CPU_SUGGESTION_THRESHOLD_PERCENT, ram_threshold_percent=RAM_SUGGESTION_THRESHOLD_PERCENT,
+    cpu_upsize_percent=float(os.getenv("PVEGUARD_CPU_UPSIZE_THRESHOLD_PERCENT", "85")), ram_upsize_percent=float(os.getenv("PVEGUARD_RAM_UPSIZE_THRESHOLD_PERCENT", "90")),
+    cpu_headroom_percent=float(os.getenv("PVEGUARD_CPU_HEADROOM_PERCENT", "30")), ram_headroom_percent=float(os.getenv("PVEGUARD_RAM_HEADROOM_PERCENT", "20")),
+    min_vcpu=MIN_VCPU, min_ram_mb=MIN_RAM_MB, ram_step_mb=int(os.getenv("PVEGUARD_RAM_STEP_MB", "256")), min_samples=int(os.getenv("PVEGUARD_RIGHT_SIZING_REPORT_MIN_SAMPLES", "24")))
+RIGHT_SIZING_REPORT_INTERVAL_SECONDS: float = max(60.0, float(os.getenv("PVEGUARD_RIGHT_SIZING_REPORT_INTERVAL_SECONDS", "900")))
+
+SHORT_HISTORY_SERIES: Dict[str, str] = {
+    "cpu_usage_percent_short": "cpu",
+    "ram_usage_percent_short": "ram",
+    "diskread_Bps_short": "diskread",
+    "diskwrite_Bps_short": "diskwrite",
+    "netin_Bps_short": "netin",
+    "netout_Bps_short": "netout",
+}
 
 METRIC_DS_MAP: Dict[str, str] = {
     "cpu_usage_percent": "cpu",
@@ -59,28 +139,175 @@ METRIC_DS_MAP: Dict[str, str] = {
     "netout_Bps": "netout",
 }
 
+def _open_timeseries_store() -> Optional[SQLiteTimeSeriesStore]:
+    if not TIMESERIES_DB_PATH or TIMESERIES_DB_PATH.lower() in ['none', 'off', 'false']: return None
+    try: return SQLiteTimeSeriesStore(TIMESERIES_DB_PATH, raw_retention_seconds=int(TIMESERIES_RAW_RETENTION_DAYS * 86400),
+                                      rollup_5m_retention_seconds=int(TIMESERIES_5M_RETENTION_DAYS * 86400), rollup_1h_retention_seconds=int(TIMESERIES_1H_RETENTION_DAYS * 86400))
+    except Exception as e: print(f"Zaman serisi deposu açılamadı ({TIMESERIES_DB_PATH}), geçmiş yalnızca bellekte tutulacak: {e}"); return None
+
+TIMESERIES_STORE: Optional[SQLiteTimeSeriesStore] = _open_timeseries_store()
+
+def _open_state_backend() -> StateBackend:
+    # Birden fazla worker (ör. gunicorn -w 4) ile çalışırken 'sqlite' seçilmeli; aksi halde her süreç kendi config önbelleğini ve toplayıcısını tutar.
+    if STATE_BACKEND_KIND != 'sqlite': return MemoryStateBackend()
+    try: return SQLiteStateBackend(STATE_DB_PATH)
+    except Exception as e: print(f"Paylaşılan durum deposu açılamadı ({STATE_DB_PATH}), durum yalnızca bu süreçte tutulacak: {e}"); return MemoryStateBackend()
+
+STATE_BACKEND: StateBackend = _open_state_backend()
+CACHED_VM_CONFIGS: CachedVMConfigsType = SharedMapping(STATE_BACKEND, "vm_configs")
+
+class ProxmoxClientPool:
+    """Tek bir kimliği doğrulanmış ProxmoxAPI istemcisini tüm istekler ve thread'ler arasında paylaşır.
+
+    Parola ile girişte PROXMOX_TICKET_RENEW_SECONDS dolunca (2 saatlik süre bitmeden) mevcut ticket parola yerine verilerek
+    yeni bir ProxmoxAPI oluşturulur ve paylaşılan istemci onunla değiştirilir; yenileme başarısız olursa tam giriş yapılır.
+    API token kullanılırken yenileme gerekmez. Yenilemeler arasında aynı requests.Session kullanıldığı için keep-alive HTTP bağlantıları yeniden kullanılır.
+    """
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock(); self._client: Optional[ProxmoxAPI] = None
+        self._ticket_born_at: float = 0.0; self._last_failure_at: Optional[float] = None
+        self.stats: Dict[str, int] = {"hits": 0, "logins": 0, "relogins": 0, "ticket_renewals": 0, "failures": 0, "invalidations": 0}
+
+    @staticmethod
+    def uses_api_token() -> bool:
+        return bool(PROXMOX_TOKEN_NAME and PROXMOX_TOKEN_VALUE)
+
+    def _credentials_configured(self) -> bool:
+        if not PROXMOX_HOST or not PROXMOX_USER: return False
+        return self.uses_api_token() or bool(PROXMOX_PASSWORD)
+
+    @staticmethod
+    def _timed_ticket_request(fn: Callable[[], Any]) -> Any:
+        # proxmoxer ticket isteğini oturum dışında (requests.post) yapar; bu yüzden access/ticket burada ayrıca ölçülür.
+        started_at: float = time.perf_counter()
+        try: result: Any = fn()
+        except Exception as e: TELEMETRY.observe_upstream("POST", "access/ticket", time.perf_counter() - started_at, type(e).__name__); raise
+        TELEMETRY.observe_upstream("POST", "access/ticket", time.perf_counter() - started_at, "2xx"); return result
+
+    @staticmethod
+    def _client_session(client: ProxmoxAPI) -> Optional[requests.Session]:
+        # proxmoxer oturuma genel bir erişim sunmaz; alan kaybolursa istemci varsayılan bağlantı havuzu ve ölçümsüz çalışmaya devam eder.
+        session: Any = getattr(client, "_store", {}).get("session")
+        return session if isinstance(session, requests.Session) else None
+
+    def _prepare(self, client: ProxmoxAPI) -> ProxmoxAPI:
+        session: Optional[requests.Session] = self._client_session(client)
+        if session is None: print("proxmoxer oturumu bulunamadı; bağlantı havuzu boyutu ve upstream ölçümleri uygulanmayacak."); return client
+        TELEMETRY.instrument_session(session); adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=PROXMOX_HTTP_POOL_SIZE)
+        session.mount("https://", adapter); session.mount("http://", adapter)
+        return client
+
+    def _login(self) -> ProxmoxAPI:
+        if self.uses_api_token(): return self._prepare(ProxmoxAPI(PROXMOX_HOST, user=PROXMOX_USER, token_name=PROXMOX_TOKEN_NAME, token_value=PROXMOX_TOKEN_VALUE, verify_ssl=PROXMOX_VERIFY_SSL, timeout=10))
+        return self._prepare(self._timed_ticket_request(lambda: ProxmoxAPI(PROXMOX_HOST, user=PROXMOX_USER, password=PROXMOX_PASSWORD, verify_ssl=PROXMOX_VERIFY_SSL, timeout=10)))
+
+    def _renew_ticket(self, client: ProxmoxAPI) -> Optional[ProxmoxAPI]:
+        """Geçerli ticket'ı parola olarak kullanıp yeni bir istemci açar; Proxmox süresi dolmamış ticket'la girişe izin verir."""
+        ticket: Optional[str] = client.get_tokens()[0]
+        if not ticket: return None
+        try: renewed: ProxmoxAPI = self._timed_ticket_request(lambda: ProxmoxAPI(PROXMOX_HOST, user=PROXMOX_USER, password=ticket, verify_ssl=PROXMOX_VERIFY_SSL, timeout=10))
+        except Exception as e:
+            TELEMETRY.record_retry("POST", "access/ticket", "ticket_renewal_failed"); print(f"Proxmox ticket yenilenemedi, yeniden giriş yapılacak: {e}"); return None
+        self.stats["ticket_renewals"] += 1; return self._prepare(renewed)
+
+    def get(self) -> Optional[ProxmoxAPI]:
+        with self._lock:
+            if not self._credentials_configured(): return None
+            now: float = time.monotonic()
+            if self._client is not None:
+                if self.uses_api_token() or now - self._ticket_born_at < PROXMOX_TICKET_RENEW_SECONDS: self.stats["hits"] += 1; return self._client
+                renewed: Optional[ProxmoxAPI] = self._renew_ticket(self._client)
+                if renewed is not None: self._client = renewed; self._ticket_born_at = time.monotonic(); self.stats["hits"] += 1; return renewed
+                self._client = None; self.stats["relogins"] += 1
+            if self._last_failure_at is not None and now - self._last_failure_at < PROXMOX_LOGIN_RETRY_SECONDS: return None
+            try:
+                self._client = self._login(); self._ticket_born_at = time.monotonic(); self._last_failure_at = None; self.stats["logins"] += 1
+                return self._client
+            except Exception as e:
+                self._last_failure_at = now; self.stats["failures"] += 1
+                print(f"Proxmox bağlantı hatası: {str(e)}"); return None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._client is not None: self._client = None; self.stats["invalidations"] += 1; self.stats["relogins"] += 1
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            age: Optional[float] = round(time.monotonic() - self._ticket_born_at, 1) if self._client is not None and not self.uses_api_token() else None
+            return {**self.stats, "connected": self._client is not None, "auth_mode": "token" if self.uses_api_token() else "ticket", "ticket_age_seconds": age}
+
+PROXMOX_POOL: ProxmoxClientPool = ProxmoxClientPool()
+
 def connect_to_proxmox() -> Optional[ProxmoxAPI]:
-    try:
-        if not all([PROXMOX_HOST, PROXMOX_USER, PROXMOX_PASSWORD]):
-            return None
-        proxmox = ProxmoxAPI(
-            PROXMOX_HOST, user=PROXMOX_USER, password=PROXMOX_PASSWORD,
-            verify_ssl=PROXMOX_VERIFY_SSL, timeout=10
-        )
-        return proxmox
-    except Exception as e:
-        print(f"Proxmox bağlantı hatası: {str(e)}")
-        return None
+    return PROXMOX_POOL.get()
+
+def invalidate_proxmox_on_auth_error(e: Exception) -> None:
+    status_code: Optional[int] = e.status_code if isinstance(e, ResourceException) else None # proxmoxer API hataları; requests hataları yanıtı taşır
+    api_response: Optional[requests.Response] = getattr(e, 'response', None)
+    if status_code is None and api_response is not None: status_code = api_response.status_code
+    if status_code == 401: PROXMOX_POOL.invalidate()
+
+SNAPSHOT_DELETE_QUEUE: SnapshotDeleteQueue = SnapshotDeleteQueue(connect_to_proxmox, max_workers=SNAPSHOT_DELETE_WORKERS, per_node=SNAPSHOT_DELETE_PER_NODE, lock_retries=SNAPSHOT_DELETE_LOCK_RETRIES,
+                                                                   task_timeout_seconds=SNAPSHOT_DELETE_TASK_TIMEOUT_SECONDS, on_error=invalidate_proxmox_on_auth_error,
+                                                                   on_deleted=lambda item: SNAPSHOT_INDEX.apply_snapshot_deleted(item['node'], item['type'], item['vmid'], item['snap_name'], item.get('upid')),
+                                                                   on_retry=lambda item: TELEMETRY.record_retry("DELETE", f"nodes/{{node}}/{item['type']}/{{vmid}}/snapshot/{{snapname}}", "guest_locked"),
+                                                                   state_backend=STATE_BACKEND)
+
+def get_cached_rrd_data(prox_instance: ProxmoxAPI, node: str, vmid: int, timeframe: str = 'hour', cf: str = 'AVERAGE', resource_type: str = 'qemu') -> List[Dict[str, Any]]:
+    """rrddata yanıtını (node, vmid, timeframe, cf) anahtarıyla bir RRD adımı süresince önbellekte tutar.
 
-def get_vm_rrd_metrics(prox_instance: ProxmoxAPI, node: str, vmid: int, timeframe: str = 'hour') -> ProcessedRRDValuesType:
-    metrics_to_fetch: Dict[str, str] = {
-        ds_prox: key_fe for key_fe, ds_prox in METRIC_DS_MAP.items() if "_Bps" in key_fe or key_fe in ["cpu_usage_percent", "ram_usage_percent"]
-    }
+    Proxmox RRD'leri her timeframe için sabit adımlarla güncellenir (hour: 60 sn ... year: 1 hafta); bu süre dolmadan
+    yapılan tekrar çağrılar aynı veriyi döndüreceğinden tek bir çekim VM'in tüm metrikleri için kullanılır.
+    """
+    cache_key: Tuple[str, int, str, str, str] = (node, vmid, timeframe, cf, resource_type); now: float = time.monotonic()
+    with RRD_CACHE_LOCK:
+        cached: Optional[Tuple[float, List[Dict[str, Any]]]] = RRD_CACHE.get(cache_key)
+        if cached and cached[0] > now: RRD_CACHE_STATS["hits"] += 1; RRD_CACHE.move_to_end(cache_key); return cached[1]
+        RRD_CACHE_STATS["misses"] += 1
+    target_resource: ProxmoxNodeType = prox_instance.nodes(node).qemu(vmid) if resource_type == 'qemu' else prox_instance.nodes(node).lxc(vmid)
+    rrd_data_list: List[Dict[str, Any]] = target_resource.rrddata.get(timeframe=timeframe, cf=cf) or []
+    step: int = RRD_STEP_SECONDS.get(timeframe, 60); last_time: Optional[int] = next((int(p['time']) for p in reversed(rrd_data_list) if p.get('time') is not None), None)
+    # Son noktanın zamanı biliniyorsa önbellek bir sonraki RRD adımına kadar, değilse bir adım süresince geçerli kalır.
+    ttl: float = float(step) if last_time is None else max(5.0, min(float(step), last_time + step - time.time()))
+    with RRD_CACHE_LOCK:
+        RRD_CACHE[cache_key] = (time.monotonic() + ttl, rrd_data_list); RRD_CACHE.move_to_end(cache_key)
+        while len(RRD_CACHE) > RRD_CACHE_MAX_ENTRIES: RRD_CACHE.popitem(last=False); RRD_CACHE_STATS["evictions"] += 1
+    return rrd_data_list
+
+def _safe_float(raw_value: Any) -> Optional[float]:
+    try: value: float = float(raw_value)
+    except (ValueError, TypeError): return None
+    return None if math.isnan(value) or math.isinf(value) else value
+
+def downsample_lttb(labels: List[int], values: List[Optional[float]], max_points: int) -> Tuple[List[int], List[Optional[float]]]:
+    """Largest-Triangle-Three-Buckets ile seriyi en fazla max_points noktaya indirir; tepe ve dipler korunur.
+
+    Değeri olmayan (None) noktalar seçime katılmaz; seri zaten kısaysa olduğu gibi döndürülür.
+    """
+    points: List[Tuple[int, float]] = [(t, v) for t, v in zip(labels, values) if v is not None]
+    if max_points < 3 or len(labels) <= max_points: return labels, values
+    if len(points) <= max_points: return [t for t, _ in points], [v for _, v in points]
+    sampled: List[Tuple[int, float]] = [points[0]]; bucket_size: float = (len(points) - 2) / (max_points - 2); previous_index: int = 0
+    for bucket in range(max_points - 2):
+        bucket_start: int = int(bucket * bucket_size) + 1; bucket_end: int = int((bucket + 1) * bucket_size) + 1
+        next_start: int = bucket_end; next_end: int = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_slice: List[Tuple[int, float]] = points[next_start:next_end] or [points[-1]]
+        avg_t: float = sum(p[0] for p in next_slice) / len(next_slice); avg_v: float = sum(p[1] for p in next_slice) / len(next_slice)
+        prev_t, prev_v = points[previous_index]; best_area: float = -1.0; best_index: int = bucket_start
+        for idx in range(bucket_start, min(bucket_end, len(points) - 1)):
+            area: float = abs((prev_t - avg_t) * (points[idx][1] - prev_v) - (prev_t - points[idx][0]) * (avg_v - prev_v))
+            if area > best_area: best_area = area; best_index = idx
+        sampled.append(points[best_index]); previous_index = best_index
+    sampled.append(points[-1])
+    return [t for t, _ in sampled], [v for _, v in sampled]
+
+def get_vm_rrd_metrics(prox_instance: ProxmoxAPI, node: str, vmid: int, timeframe: str = 'hour', resource_type: str = 'qemu') -> ProcessedRRDValuesType:
     output_keys_for_metrics: Dict[str,str] = {ds_prox: key_fe for key_fe, ds_prox in METRIC_DS_MAP.items()}
     processed_values: ProcessedRRDValuesType = {val: None for val in output_keys_for_metrics.values()}
 
     try:
-        rrd_data_list: List[Dict[str, Any]] = prox_instance.nodes(node).qemu(vmid).rrddata.get(timeframe=timeframe, cf='AVERAGE')
+        rrd_data_list: List[Dict[str, Any]] = get_cached_rrd_data(prox_instance, node, vmid, timeframe, 'AVERAGE', resource_type)
         if not rrd_data_list: return processed_values
         for prox_ds_name, frontend_key_name in output_keys_for_metrics.items():
             latest_value: Optional[float] = None
@@ -93,82 +320,200 @@ def get_vm_rrd_metrics(prox_instance: ProxmoxAPI, node: str, vmid: int, timefram
                             latest_value = round(value, 2); break
                     except (ValueError, TypeError): continue
             processed_values[frontend_key_name] = latest_value
-    except requests.exceptions.HTTPError as e:
-        if e.response and e.response.status_code == 500 and "rrdcached" in str(e.response.text).lower(): print(f"RRDcached error for VM {vmid} on {node} (timeframe: {timeframe}): {e}. Often transient.")
-        elif e.response and e.response.status_code == 400 and "unknown data source" in str(e.response.text).lower():
-            ds_name_error = str(e.response.text).split("'")[1] if "'" in str(e.response.text) else "unknown_ds"; print(f"RRD data source '{ds_name_error}' not found for VM {vmid} on {node}. Check METRIC_DS_MAP or RRD settings.")
-        else: print(f"HTTPError fetching RRD data for VM {vmid} on {node} (timeframe: {timeframe}): {e}")
-    except Exception as e: print(f"Generic error fetching RRD data for VM {vmid} on {node} (timeframe: {timeframe}): {e}")
+    except ResourceException as e:
+        error_text: str = str(e)
+        if e.status_code == 500 and "rrdcached" in error_text.lower(): print(f"RRDcached error for VM {vmid} on {node} (timeframe: {timeframe}): {e}. Often transient.")
+        elif e.status_code == 400 and "unknown data source" in error_text.lower():
+            ds_name_error = error_text.split("'")[1] if "'" in error_text else "unknown_ds"; print(f"RRD data source '{ds_name_error}' not found for VM {vmid} on {node}. Check METRIC_DS_MAP or RRD settings.")
+        else: print(f"ResourceException fetching RRD data for VM {vmid} on {node} (timeframe: {timeframe}): {e}"); invalidate_proxmox_on_auth_error(e)
+    except Exception as e: print(f"Generic error fetching RRD data for VM {vmid} on {node} (timeframe: {timeframe}): {e}"); invalidate_proxmox_on_auth_error(e)
     return processed_values
 
+def _ensure_perf_history(vm_key: VMKeyType) -> VMPerformanceHistory:
+    with PERF_HISTORY_LOCK:
+        if vm_key not in PERFORMANCE_HISTORY:
+            PERFORMANCE_HISTORY[vm_key] = VMPerformanceHistory(HISTORY_MAX_LEN)
+            # Yeniden başlatma sonrası pencereyi kalıcı depodaki son örneklerle doldur; böylece ortalamalar ve öneriler sıfırdan başlamaz.
+            if TIMESERIES_STORE is not None:
+                try: PERFORMANCE_HISTORY[vm_key].preload(TIMESERIES_STORE.load_recent(vm_key[0], vm_key[1], PERF_SERIES_NAMES, time.time() - HISTORY_MAX_LEN * METRICS_COLLECTOR_INTERVAL_SECONDS, HISTORY_MAX_LEN))
+                except Exception as e: print(f"VM {vm_key[1]} geçmişi kalıcı depodan yüklenemedi: {e}")
+        return PERFORMANCE_HISTORY[vm_key]
+
+def record_vm_perf_sample(node_name: str, vmid: int, status: Dict[str, Any], rrd_metrics: Optional[ProcessedRRDValuesType] = None) -> VMDetailType:
+    """status.current veya /cluster/resources girdisinden (cpu, mem, maxmem, status) bir örnek alıp geçmişe ekler."""
+    with PERF_HISTORY_LOCK:
+        vm_perf_history: VMPerformanceHistory = _ensure_perf_history((node_name, vmid))
+        current_status_text: str = status.get('status', 'unknown'); vm_perf_history.status_text = current_status_text
+        base_return_data: VMDetailType = {"vmid": vmid, "node": node_name, "status": current_status_text, "cpu_usage_percent": 0.0, "ram_usage_percent": 0.0,
+                                          "avg_cpu_usage_percent": None, "max_cpu_usage_percent": None, "avg_ram_usage_percent": None, "max_ram_usage_percent": None,
+                                          "history_count": 0, "name": status.get('name'), "uptime_seconds": status.get('uptime', 0), **(rrd_metrics or {})}
+        if current_status_text != 'running':
+            vm_perf_history.clear(); base_return_data["history_count"] = 0; return base_return_data
+        current_cpu_usage: float = (status.get('cpu') or 0.0) * 100.0; mem_used_bytes: int = status.get('mem') or 0; max_mem_bytes: int = status.get('maxmem') or 1
+        current_ram_usage: float = (mem_used_bytes / max_mem_bytes) * 100.0 if max_mem_bytes > 0 else 0.0
+        rrd_values: ProcessedRRDValuesType = rrd_metrics or {}
+        sample: Dict[str, Optional[float]] = {'cpu': round(current_cpu_usage, 2), 'ram': round(current_ram_usage, 2), 'diskread': rrd_values.get('diskread_Bps'),
+                                              'diskwrite': rrd_values.get('diskwrite_Bps'), 'netin': rrd_values.get('netin_Bps'), 'netout': rrd_values.get('netout_Bps')}
+        vm_perf_history.append(sample)
+        if TIMESERIES_STORE is not None:
+            try: TIMESERIES_STORE.append(node_name, vmid, time.time(), sample)
+            except Exception as e: print(f"Örnek kalıcı depoya yazılamadı (VM {vmid}): {e}")
+        avg_cpu, max_cpu = vm_perf_history.summary('cpu'); avg_ram, max_ram = vm_perf_history.summary('ram')
+        base_return_data.update({"cpu_usage_percent": round(current_cpu_usage, 2), "ram_usage_percent": round(current_ram_usage, 2),
+                                 "mem_used_mb": round(mem_used_bytes / (1024 * 1024), 2), "max_mem_mb": round(max_mem_bytes / (1024 * 1024), 2), "avg_cpu_usage_percent": avg_cpu,
+                                 "max_cpu_usage_percent": max_cpu, "avg_ram_usage_percent": avg_ram, "max_ram_usage_percent": max_ram, "history_count": len(vm_perf_history)})
+        return base_return_data
+
 def get_vm_current_status(prox_instance: ProxmoxAPI, node_name: str, vmid: int) -> Optional[VMDetailType]:
     global PERFORMANCE_HISTORY
     if not prox_instance: return None
-    vm_key: VMKeyType = (node_name, vmid)
-    if vm_key not in PERFORMANCE_HISTORY: PERFORMANCE_HISTORY[vm_key] = {'history': {'cpu': deque(maxlen=HISTORY_MAX_LEN), 'ram': deque(maxlen=HISTORY_MAX_LEN)}, 'status_text': 'unknown'}
-    current_status_text: str = 'unknown'; vm_perf_history: PerfCPURAMHistoryType = PERFORMANCE_HISTORY[vm_key]['history'] # type: ignore
+    vm_key: VMKeyType = (node_name, vmid); vm_perf_history: VMPerformanceHistory = _ensure_perf_history(vm_key); current_status_text: str = 'unknown'
     try:
         status: Dict[str, Any] = prox_instance.nodes(node_name).qemu(vmid).status.current.get()
-        current_status_text = status.get('status', 'unknown'); PERFORMANCE_HISTORY[vm_key]['status_text'] = current_status_text
         rrd_metrics: ProcessedRRDValuesType = {};
-        if current_status_text == 'running': rrd_metrics = get_vm_rrd_metrics(prox_instance, node_name, vmid, timeframe='hour')
-        base_return_data: VMDetailType = {"vmid": vmid, "node": node_name, "status": current_status_text, "cpu_usage_percent": 0.0, "ram_usage_percent": 0.0, "avg_cpu_usage_percent": None, "max_cpu_usage_percent": None, "avg_ram_usage_percent": None, "max_ram_usage_percent": None, "history_count": 0, "name": status.get('name'), "uptime_seconds": status.get('uptime', 0), **rrd_metrics}
-        if current_status_text != 'running':
-            vm_perf_history['cpu'].clear(); vm_perf_history['ram'].clear(); base_return_data["history_count"] = 0; return base_return_data
-        current_cpu_usage: float = status.get('cpu', 0.0) * 100.0; mem_used_bytes: int = status.get('mem', 0); max_mem_bytes: int = status.get('maxmem', 1); current_ram_usage: float = (mem_used_bytes / max_mem_bytes) * 100.0 if max_mem_bytes > 0 else 0.0
-        vm_perf_history['cpu'].append(round(current_cpu_usage, 2)); vm_perf_history['ram'].append(round(current_ram_usage, 2))
-        avg_cpu: Optional[float] = None; max_cpu: Optional[float] = None; avg_ram: Optional[float] = None; max_ram: Optional[float] = None
-        cpu_history_list: List[float] = list(vm_perf_history['cpu']); ram_history_list: List[float] = list(vm_perf_history['ram'])
-        if cpu_history_list: avg_cpu = round(statistics.mean(cpu_history_list), 2); max_cpu = round(max(cpu_history_list), 2)
-        if ram_history_list: avg_ram = round(statistics.mean(ram_history_list), 2); max_ram = round(max(ram_history_list), 2)
-        base_return_data.update({"cpu_usage_percent": round(current_cpu_usage, 2), "ram_usage_percent": round(current_ram_usage, 2), "mem_used_mb": round(mem_used_bytes / (1024 * 1024), 2), "max_mem_mb": round(max_mem_bytes / (1024 * 1024), 2), "avg_cpu_usage_percent": avg_cpu, "max_cpu_usage_percent": max_cpu, "avg_ram_usage_percent": avg_ram, "max_ram_usage_percent": max_ram, "history_count": len(cpu_history_list)})
-        return base_return_data
-    except requests.exceptions.HTTPError as e:
-        error_message_str: str = f"HTTPError getting status for VM {vmid} on {node_name}: {e}"
-        if e.response is not None:
-            error_message_str += f" (Status: {e.response.status_code})"; response_text = getattr(e.response, 'text', '')
-            if e.response.status_code == 500 and "qmp command 'query-status' failed" in response_text: current_status_text = 'error_transitional'
-            elif e.response.status_code == 404: current_status_text = 'not_found'
-            else: print(error_message_str)
-        else: print(error_message_str)
-        PERFORMANCE_HISTORY[vm_key]['status_text'] = current_status_text; vm_perf_history['cpu'].clear(); vm_perf_history['ram'].clear()
-        return {"vmid": vmid, "node": node_name, "status": current_status_text, "cpu_usage_percent": 0.0, "ram_usage_percent": 0.0, "avg_cpu_usage_percent": None, "max_cpu_usage_percent": None, "avg_ram_usage_percent": None, "max_ram_usage_percent": None, "history_count": 0, "diskread_Bps": None, "diskwrite_Bps": None, "netin_Bps": None, "netout_Bps": None}
+        if status.get('status', 'unknown') == 'running': rrd_metrics = get_vm_rrd_metrics(prox_instance, node_name, vmid, timeframe='hour')
+        return record_vm_perf_sample(node_name, vmid, status, rrd_metrics)
+    except ResourceException as e:
+        error_message_str: str = f"ResourceException getting status for VM {vmid} on {node_name}: {e} (Status: {e.status_code})"
+        if e.status_code == 500 and "qmp command 'query-status' failed" in str(e): current_status_text = 'error_transitional'
+        elif e.status_code == 404: current_status_text = 'not_found'
+        else: print(error_message_str); invalidate_proxmox_on_auth_error(e)
+        with PERF_HISTORY_LOCK: vm_perf_history.status_text = current_status_text; vm_perf_history.clear()
+        return {"vmid": vmid, "node": node_name, "status": current_status_text, "cpu_usage_percent": 0.0, "ram_usage_percent": 0.0, "avg_cpu_usage_percent": None,
+                "max_cpu_usage_percent": None, "avg_ram_usage_percent": None, "max_ram_usage_percent": None, "history_count": 0, "diskread_Bps": None, "diskwrite_Bps": None, "netin_Bps": None, "netout_Bps": None}
     except Exception as e:
-        print(f"Generic error getting status for VM {vmid} on {node_name}: {e} (Type: {type(e)})"); PERFORMANCE_HISTORY[vm_key]['status_text'] = 'error_generic'; vm_perf_history['cpu'].clear(); vm_perf_history['ram'].clear()
-        return {"vmid": vmid, "node": node_name, "status": 'error_generic', "cpu_usage_percent": 0.0, "ram_usage_percent": 0.0, "avg_cpu_usage_percent": None, "max_cpu_usage_percent": None, "avg_ram_usage_percent": None, "max_ram_usage_percent": None, "history_count": 0, "diskread_Bps": None, "diskwrite_Bps": None, "netin_Bps": None, "netout_Bps": None}
+        print(f"Generic error getting status for VM {vmid} on {node_name}: {e} (Type: {type(e)})"); invalidate_proxmox_on_auth_error(e)
+        with PERF_HISTORY_LOCK: vm_perf_history.status_text = 'error_generic'; vm_perf_history.clear()
+        return {"vmid": vmid, "node": node_name, "status": 'error_generic', "cpu_usage_percent": 0.0, "ram_usage_percent": 0.0, "avg_cpu_usage_percent": None,
+                "max_cpu_usage_percent": None, "avg_ram_usage_percent": None, "max_ram_usage_percent": None, "history_count": 0, "diskread_Bps": None, "diskwrite_Bps": None, "netin_Bps": None, "netout_Bps": None}
+
+def fetch_bulk_guest_rows(prox_instance: ProxmoxAPI) -> List[Dict[str, Any]]:
+    """Tüm QEMU VM ve LXC konteynerlerinin anlık satırlarını (cpu, mem, maxmem, disk/ağ sayaçları, uptime) toplu olarak alır.
+
+    Varsayılan olarak tek bir /cluster/resources?type=vm çağrısı yapılır; LIVE_SAMPLING_MODE 'nodes' ise node başına
+    /nodes/{node}/qemu ve /nodes/{node}/lxc listeleri kullanılır. Her satırda node ve type alanları bulunur.
+    """
+    if LIVE_SAMPLING_MODE != 'nodes': return [row for row in (prox_instance.cluster.resources.get(type='vm') or []) if row.get('type') in ('qemu', 'lxc') and row.get('vmid') is not None and row.get('node')]
+    rows: List[Dict[str, Any]] = []
+    for node_info in prox_instance.nodes.get():
+        node_name: str = str(node_info['node'])
+        for res_type in ('qemu', 'lxc'):
+            try: rows.extend({**row, 'node': node_name, 'type': res_type} for row in (getattr(prox_instance.nodes(node_name), res_type).get() or []) if row.get('vmid') is not None)
+            except Exception as e: print(f"Node {node_name} {res_type} listesi alınırken hata: {e}"); invalidate_proxmox_on_auth_error(e)
+    return rows
+
+def sample_guest_from_bulk_row(prox_instance: ProxmoxAPI, row: Dict[str, Any]) -> VMDetailType:
+    """Toplu listeden gelen bir misafir satırını (QEMU veya LXC) geçmişe örnek olarak işler.
+
+    Disk/ağ sayaçları COUNTER_RATES ile Bps'e çevrilir. Misafir başına çağrı yalnızca satırda eksik alan varsa yapılır:
+    cpu/mem/maxmem yoksa status.current, sayaçlar hâlâ yoksa rrddata'nın son noktası kullanılır.
+    """
+    node_name: str = str(row['node']); vmid: int = int(row['vmid']); res_type: str = 'lxc' if row.get('type') == 'lxc' else 'qemu'; status: Dict[str, Any] = row
+    if row.get('status') == 'running' and any(row.get(field) is None for field in ('cpu', 'mem', 'maxmem')):
+        try: status = {**row, **(getattr(prox_instance.nodes(node_name), res_type)(vmid).status.current.get() or {})}
+        except Exception as e: print(f"{res_type} {vmid} ({node_name}) için status.current alınamadı: {e}")
+    rates: ProcessedRRDValuesType = {}
+    if status.get('status') != 'running': COUNTER_RATES.forget((node_name, vmid))
+    elif all(status.get(field) is not None for field in BULK_COUNTER_FIELDS):
+        counter_rates: Dict[str, Optional[float]] = COUNTER_RATES.update((node_name, vmid), time.monotonic(), {field: float(status[field]) for field in BULK_COUNTER_FIELDS})
+        rates = {f"{field}_Bps": counter_rates[field] for field in BULK_COUNTER_FIELDS}
+    else: rates = {key: value for key, value in get_vm_rrd_metrics(prox_instance, node_name, vmid, 'hour', res_type).items() if key.endswith('_Bps')}
+    return record_vm_perf_sample(node_name, vmid, status, rates)
+
+def _config_change_marker(res_item: Dict[str, Any]) -> str:
+    # /cluster/resources ve /nodes/{node}/qemu listeleri config digest'ini döndürmez; varsa digest'i,
+    # yoksa config'ten türetilen alanları (maxcpu/cpus, maxmem, maxdisk, ad, kilit, etiket) değişim işareti olarak kullan.
+    if res_item.get('digest'): return str(res_item['digest'])
+    return "|".join(str(res_item.get(k, '')) for k in ('node', 'name', 'maxcpu', 'cpus', 'maxmem', 'maxdisk', 'lock', 'tags', 'template'))
 
-def get_all_vms_and_containers_with_initial_perf(prox_instance: ProxmoxAPI) -> List[VMDetailType]:
-    global CACHED_VM_CONFIGS, PERFORMANCE_HISTORY;
+def refresh_vm_config_if_changed(prox_instance: ProxmoxAPI, node_name: str, vmid: int, res_type: str, res_item: Dict[str, Any]) -> VMConfigValueType:
+    """CACHED_VM_CONFIGS girdisini döndürür; config.get() yalnızca değişim işareti oynadığında veya girdi eskidiğinde çağrılır."""
+    vmid_str: str = str(vmid); marker: str = _config_change_marker(res_item); name: str = str(res_item.get('name') or (f"vm-{vmid}" if res_type == 'qemu' else f"ct-{vmid}"))
+    cached: Optional[VMConfigValueType] = CACHED_VM_CONFIGS.get(vmid_str); now: float = time.time() # Girdiler worker'lar arasında paylaşılabildiği için duvar saati
+    if cached and cached.get('config_marker') == marker and cached.get('node') == node_name and now - float(cached.get('fetched_at') or 0) < CONFIG_CACHE_MAX_AGE_SECONDS:
+        CONFIG_CACHE_STATS["hits"] += 1
+        if cached.get('name') != name: cached = {**cached, 'name': name}; CACHED_VM_CONFIGS[vmid_str] = cached
+        return cached
+    CONFIG_CACHE_STATS["misses"] += 1
+    if res_type != 'qemu':
+        # LXC için config çağrısı gerekmez: liste satırındaki maxcpu/cpus ve maxmem, config'teki cores ve memory değerlerini yansıtır.
+        vcpu_raw: Any = res_item.get('maxcpu', res_item.get('cpus')); maxmem_raw: Any = res_item.get('maxmem')
+        entry: VMConfigValueType = {'node': node_name, 'name': name, 'type': 'lxc', 'current_vcpu': int(vcpu_raw) if vcpu_raw else None,
+                                    'current_ram_mb': int(maxmem_raw) // (1024 * 1024) if maxmem_raw else None, 'digest': None, 'config_marker': marker, 'fetched_at': now}
+        CACHED_VM_CONFIGS[vmid_str] = entry; return entry
+    current_config_raw: Dict[str, Any] = {}
+    try: current_config_raw = prox_instance.nodes(node_name).qemu(vmid).config.get()
+    except Exception as conf_e:
+        print(f"Could not get config for VM {vmid} on {node_name}: {conf_e}")
+        if cached and cached.get('node') == node_name:
+            if cached.get('name') != name: cached = {**cached, 'name': name}; CACHED_VM_CONFIGS[vmid_str] = cached
+            return cached
+    entry = {'node': node_name, 'name': name, 'current_vcpu': current_config_raw.get('cores'), 'current_ram_mb': current_config_raw.get('memory'), 'type': 'qemu', 'digest': current_config_raw.get('digest'), 'config_marker': marker, 'fetched_at': now}
+    CACHED_VM_CONFIGS[vmid_str] = entry; return entry
+
+def _prune_cached_vm_configs(seen_vmids: set[str]) -> None:
+    stale_vmids: List[str] = [k for k in CACHED_VM_CONFIGS if k not in seen_vmids]; CACHED_VM_CONFIGS.delete_many(stale_vmids); CONFIG_CACHE_STATS["evictions"] += len(stale_vmids)
+
+def _build_guest_detail(node_name: str, vm_id: int, vm_name: str, vm_status: str, vm_config: VMConfigValueType, res_type: str = 'qemu') -> VMDetailType:
+    return {"node": node_name, "vmid": vm_id, "name": vm_name, "type": res_type, "status": vm_status, "is_underutilized": False, "right_sizing_suggestion": "",
+            "current_vcpu": vm_config.get('current_vcpu'), "current_ram_mb": vm_config.get('current_ram_mb')}
+
+def get_inventory_from_cluster_resources(prox_instance: ProxmoxAPI, record_samples: bool = True) -> List[VMDetailType]:
+    """Tüm misafir listesini, temel durumu ve (record_samples ise) QEMU/LXC performans örneklerini tek bir /cluster/resources?type=vm çağrısıyla oluşturur."""
+    all_resources_details: List[VMDetailType] = []; seen_vmids: set[str] = set()
+    resources: List[Dict[str, Any]] = prox_instance.cluster.resources.get(type='vm')
+    for res_item in sorted(resources, key=lambda r: (str(r.get('node', '')), r.get('type') != 'qemu', int(r.get('vmid', 0)))):
+        res_type: str = str(res_item.get('type', '')); node_name: str = str(res_item.get('node', ''))
+        if res_type not in ('qemu', 'lxc') or res_item.get('vmid') is None or not node_name: continue
+        vm_id: int = int(res_item['vmid']); seen_vmids.add(str(vm_id))
+        vm_config: VMConfigValueType = refresh_vm_config_if_changed(prox_instance, node_name, vm_id, res_type, res_item); vm_name: str = str(vm_config.get('name'))
+        vm_detail: VMDetailType = _build_guest_detail(node_name, vm_id, vm_name, str(res_item.get('status', 'unknown')), vm_config, res_type)
+        vm_detail.update(sample_guest_from_bulk_row(prox_instance, res_item) if record_samples else _latest_collected_perf(vm_id)); vm_detail['name'] = vm_name
+        all_resources_details.append(calculate_right_sizing_suggestions(vm_detail))
+    _prune_cached_vm_configs(seen_vmids)
+    return all_resources_details
+
+def get_inventory_by_node_walk(prox_instance: ProxmoxAPI, record_samples: bool = True) -> List[VMDetailType]:
+    all_resources_details: List[VMDetailType] = []; seen_vmids: set[str] = set(); failed_nodes: set[str] = set()
+    nodes: List[Dict[str, Any]] = prox_instance.nodes.get()
+    for node_info in nodes:
+        node_name: str = node_info['node']
+        try:
+            vms_on_node: List[Dict[str, Any]] = prox_instance.nodes(node_name).qemu.get()
+            for vm_item in vms_on_node:
+                vm_id: int = vm_item['vmid']; seen_vmids.add(str(vm_id)); _ensure_perf_history((node_name, vm_id))
+                vm_status_basic: str = vm_item.get('status', 'unknown'); vm_config: VMConfigValueType = refresh_vm_config_if_changed(prox_instance, node_name, vm_id, 'qemu', {**vm_item, 'node': node_name})
+                vm_detail: VMDetailType = _build_guest_detail(node_name, vm_id, str(vm_config.get('name')), vm_status_basic, vm_config)
+                perf_data: Optional[VMDetailType] = sample_guest_from_bulk_row(prox_instance, {**vm_item, 'node': node_name, 'type': 'qemu'}) if record_samples else {'status': vm_status_basic, **_latest_collected_perf(vm_id)}
+                if perf_data: vm_detail.update(perf_data); vm_detail = calculate_right_sizing_suggestions(vm_detail)
+                all_resources_details.append(vm_detail)
+        except Exception as e_qemu: failed_nodes.add(node_name); print(f"Node {node_name} QEMU VM'leri alınırken hata: {e_qemu}")
+        try:
+            containers_on_node: List[Dict[str, Any]] = prox_instance.nodes(node_name).lxc.get()
+            for ct_item in containers_on_node:
+                ct_id: int = ct_item['vmid']; seen_vmids.add(str(ct_id)); ct_config: VMConfigValueType = refresh_vm_config_if_changed(prox_instance, node_name, ct_id, 'lxc', {**ct_item, 'node': node_name})
+                ct_status_basic: str = ct_item.get('status', 'unknown'); ct_detail: VMDetailType = _build_guest_detail(node_name, ct_id, str(ct_config.get('name')), ct_status_basic, ct_config, 'lxc')
+                ct_detail.update(sample_guest_from_bulk_row(prox_instance, {**ct_item, 'node': node_name, 'type': 'lxc'}) if record_samples else {'status': ct_status_basic, **_latest_collected_perf(ct_id)})
+                ct_detail['name'] = str(ct_config.get('name'))
+                all_resources_details.append(calculate_right_sizing_suggestions(ct_detail))
+        except Exception as e_lxc: failed_nodes.add(node_name); print(f"Node {node_name} LXC konteynerleri alınırken hata: {e_lxc}")
+    # Listesi alınamayan node'un misafirleri silinmiş sayılmaz; önbellekteki config'leri bir sonraki başarılı tura kadar korunur.
+    seen_vmids.update(vmid_str for vmid_str, cached_config in CACHED_VM_CONFIGS.items() if cached_config.get('node') in failed_nodes)
+    _prune_cached_vm_configs(seen_vmids)
+    return all_resources_details
+
+def _latest_collected_perf(vmid: int) -> VMDetailType:
+    collected: Optional[Dict[str, VMDetailType]] = METRICS_COLLECTOR.latest_payload()
+    return dict(collected.get(str(vmid), {})) if collected else {}
+
+def get_all_vms_and_containers_with_initial_perf(prox_instance: ProxmoxAPI, record_samples: Optional[bool] = None) -> List[VMDetailType]:
+    # Arka plan toplayıcı çalışıyorsa geçmişe yalnızca o örnek ekler; sayfa yüklemeleri son toplanan değerleri kullanır.
     if not prox_instance: return []
-    all_resources_details: List[VMDetailType] = []; CACHED_VM_CONFIGS.clear()
+    if record_samples is None: record_samples = METRICS_COLLECTOR.latest_payload() is None
     try:
-        nodes: List[Dict[str, Any]] = prox_instance.nodes.get()
-        for node_info in nodes:
-            node_name: str = node_info['node']
-            try:
-                vms_on_node: List[Dict[str, Any]] = prox_instance.nodes(node_name).qemu.get()
-                for vm_item in vms_on_node:
-                    vm_id: int = vm_item['vmid']; vm_key: VMKeyType = (node_name, vm_id)
-                    if vm_key not in PERFORMANCE_HISTORY: PERFORMANCE_HISTORY[vm_key] = {'history': {'cpu': deque(maxlen=HISTORY_MAX_LEN), 'ram': deque(maxlen=HISTORY_MAX_LEN)}, 'status_text': 'unknown'}
-                    vm_status_basic: str = vm_item.get('status', 'unknown'); vm_name_basic: str = vm_item.get('name', f"vm-{vm_id}"); current_config_raw: Dict[str, Any] = {}
-                    try: current_config_raw = prox_instance.nodes(node_name).qemu(vm_id).config.get()
-                    except Exception as conf_e: print(f"Could not get config for VM {vm_id} on {node_name}: {conf_e}")
-                    current_vcpu: Optional[int] = current_config_raw.get('cores'); current_ram_mb: Optional[int] = current_config_raw.get('memory')
-                    CACHED_VM_CONFIGS[str(vm_id)] = {'node': node_name, 'name': vm_name_basic, 'current_vcpu': current_vcpu, 'current_ram_mb': current_ram_mb, 'type': 'qemu'}
-                    vm_detail: VMDetailType = {"node": node_name, "vmid": vm_id, "name": vm_name_basic, "type": "qemu", "status": vm_status_basic, "is_underutilized": False, "right_sizing_suggestion": "", "current_vcpu": current_vcpu, "current_ram_mb": current_ram_mb}
-                    perf_data: Optional[VMDetailType] = get_vm_current_status(prox_instance, node_name, vm_id)
-                    if perf_data: vm_detail.update(perf_data); vm_detail = calculate_right_sizing_suggestions(vm_detail)
-                    all_resources_details.append(vm_detail)
-            except Exception as e_qemu: print(f"Node {node_name} QEMU VM'leri alınırken hata: {e_qemu}")
-            try:
-                containers_on_node: List[Dict[str, Any]] = prox_instance.nodes(node_name).lxc.get()
-                for ct_item in containers_on_node:
-                    ct_id: int = ct_item['vmid']; ct_name: str = ct_item.get('name', f"ct-{ct_id}")
-                    CACHED_VM_CONFIGS[str(ct_id)] = {'node': node_name, 'name': ct_name, 'type': 'lxc', 'current_vcpu': None, 'current_ram_mb': None}
-                    all_resources_details.append({"node": node_name, "vmid": ct_id, "name": ct_name, "type": "lxc", "status": ct_item.get('status', 'unknown')})
-            except Exception as e_lxc: print(f"Node {node_name} LXC konteynerleri alınırken hata: {e_lxc}")
-        return all_resources_details
-    except Exception as e: print(f"VM/CT listesi alınırken genel hata: {str(e)}"); return []
+        if INVENTORY_MODE == 'nodes': return get_inventory_by_node_walk(prox_instance, record_samples)
+        return get_inventory_from_cluster_resources(prox_instance, record_samples)
+    except Exception as e: print(f"VM/CT listesi alınırken genel hata: {str(e)}"); invalidate_proxmox_on_auth_error(e); return []
 
 def calculate_right_sizing_suggestions(vm_detail: VMDetailType) -> VMDetailType:
     avg_cpu_usage: Optional[float] = vm_detail.get("avg_cpu_usage_percent"); avg_ram_usage: Optional[float] = vm_detail.get("avg_ram_usage_percent"); history_count: int = vm_detail.get("history_count", 0)
@@ -180,7 +525,12 @@ def calculate_right_sizing_suggestions(vm_detail: VMDetailType) -> VMDetailType:
     except (ValueError, TypeError): pass
     vm_detail["is_underutilized"] = False; vm_detail["right_sizing_suggestion"] = ""
     if vm_detail.get("status") != "running": return vm_detail
-    if avg_cpu_usage is not None and avg_ram_usage is not None and history_count >= (HISTORY_MAX_LEN / 2.0):
+    # Filo raporu bu VM için yeterli RRD örneği içeriyorsa yüzdelik tabanlı öneri kullanılır; yoksa bellek içi ortalamalara dönülür.
+    report_entry: Optional[Dict[str, Any]] = RIGHT_SIZING_REPORTER.entry_for(str(vm_detail.get("node")), int(vm_detail["vmid"])) if vm_detail.get("vmid") is not None else None
+    if report_entry and report_entry.get("has_enough_samples"):
+        vm_detail["is_underutilized"] = report_entry["cpu_action"] < 0 or report_entry["ram_action"] < 0; vm_detail["right_sizing_suggestion"] = report_entry["right_sizing_suggestion"] if vm_detail["is_underutilized"] else ""
+        return vm_detail
+    if avg_cpu_usage is not None and avg_ram_usage is not None and history_count >= RIGHT_SIZING_MIN_SAMPLES:
         suggestions: List[str] = []
         if current_vcpu_int is not None and current_vcpu_int > MIN_VCPU and avg_cpu_usage < CPU_SUGGESTION_THRESHOLD_PERCENT:
             suggested_vcpu: int = max(MIN_VCPU, current_vcpu_int - 1)
@@ -213,141 +563,714 @@ def get_snapshots_for_resource(prox_instance: ProxmoxAPI, node_name: str, vmid:
                 if snapshot_date_obj:
                     if snapshot_date_obj > max_date_obj: add_snapshot = False
                 elif str(snap_info.get('name', '')).lower() != 'current': add_snapshot = False
-            if add_snapshot: snapshots_data.append({"node": node_name, "vmid": vmid, "resource_type": resource_type, "snap_name": snap_info.get('name', 'UnknownSnapName'), "description": snap_info.get('description', ''), "parent": snap_info.get('parent'), "vmstate": bool(snap_info.get('vmstate', False)), "create_time_unix": create_time_unix, "create_time_iso": create_time_iso})
+            if add_snapshot: snapshots_data.append({"node": node_name, "vmid": vmid, "resource_type": resource_type, "snap_name": snap_info.get('name', 'UnknownSnapName'),
+                                                    "description": snap_info.get('description', ''), "parent": snap_info.get('parent'),
+                                                    "vmstate": bool(snap_info.get('vmstate', False)), "create_time_unix": create_time_unix, "create_time_iso": create_time_iso})
         if snapshots_data: snapshots_data.sort(key=lambda x: (x.get('create_time_unix') is None, x.get('create_time_unix', float('inf'))))
-    except requests.exceptions.HTTPError as e:
-        error_text_str: str = ""; response_status_code: Optional[int] = None; response_text_content: str = ''
-        if e.response is not None: error_text_str = str(e.response.text).lower() if e.response.text else ""; response_status_code = e.response.status_code; response_text_content = e.response.text
-        else: error_text_str = str(e).lower()
-        if not ("no snapshots found" in error_text_str or "does not exist" in error_text_str or "no such file or directory" in error_text_str or (response_status_code == 500 and "no configuration file" in response_text_content) or (response_status_code == 400 and "not a snapshot name" in response_text_content)):
-            print(f"Snapshot'lar alınırken HTTPError (N: {node_name}, ID: {vmid}, T: {resource_type}): {e}")
-            if response_status_code is not None: print(f"API Yanıtı: {response_status_code} - {response_text_content}")
+    except ResourceException as e:
+        error_text_str: str = str(e).lower()
+        if not ("no snapshots found" in error_text_str or "does not exist" in error_text_str or "no such file or directory" in error_text_str
+                or (e.status_code == 500 and "no configuration file" in error_text_str) or (e.status_code == 400 and "not a snapshot name" in error_text_str)):
+            print(f"Snapshot'lar alınırken ResourceException (N: {node_name}, ID: {vmid}, T: {resource_type}): {e}"); invalidate_proxmox_on_auth_error(e)
     except Exception as e:
-        print(f"Snapshot'lar alınırken Genel Hata (N: {node_name}, ID: {vmid}, T: {resource_type}): {e} (Type: {type(e)})")
-        if hasattr(e, 'response') and e.response and hasattr(e.response, 'status_code'): print(f"API Yanıtı: {e.response.status_code} - {e.response.text}") # type: ignore
+        print(f"Snapshot'lar alınırken Genel Hata (N: {node_name}, ID: {vmid}, T: {resource_type}): {e} (Type: {type(e)})"); invalidate_proxmox_on_auth_error(e)
+        api_response: Optional[requests.Response] = getattr(e, 'response', None)
+        if api_response is not None: print(f"API Yanıtı: {api_response.status_code} - {api_response.text}")
     return snapshots_data
 
-def get_all_snapshots_up_to_date(prox_instance: ProxmoxAPI, all_resources_list: List[VMDetailType], max_date_str: Optional[str] = None) -> List[SnapshotDetailType]:
-    if not prox_instance or not all_resources_list: return []
+NODE_FETCH_EXECUTOR: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=SNAPSHOT_FETCH_WORKERS, thread_name_prefix="pveguard-fetch")
+
+def map_per_node_bounded(res_keys: List[ResourceKeyType], fetch_fn: Callable[[ResourceKeyType], Any], error_label: str, on_node_done: Optional[Callable[[str], None]] = None) -> Dict[ResourceKeyType, Any]:
+    """fetch_fn'i her (node, vmid, type) anahtarı için ortak thread havuzunda çalıştırır ve sonuçları anahtarla döndürür.
+
+    Toplamda SNAPSHOT_FETCH_WORKERS, node başına SNAPSHOT_FETCH_PER_NODE eşzamanlılık uygulanır; yavaş bir node'un kuyruğu
+    yalnızca kendi payını tüketir, diğer node'ların işleri beklemez. Hata veren anahtarlar sonuçta yer almaz.
+    `on_node_done` verilirse bir node'un tüm işleri bittiğinde node adıyla çağrılır.
+    """
+    results: Dict[ResourceKeyType, Any] = {}; pending_by_node: Dict[str, deque] = {}
+    for res_key in res_keys: pending_by_node.setdefault(res_key[0], deque()).append(res_key)
+    in_flight_by_node: Dict[str, int] = {node: 0 for node in pending_by_node}; in_flight: Dict[Future, ResourceKeyType] = {}
+    def submit_ready() -> None:
+        for node, pending in pending_by_node.items():
+            while pending and in_flight_by_node[node] < SNAPSHOT_FETCH_PER_NODE and len(in_flight) < SNAPSHOT_FETCH_WORKERS:
+                res_key_submit: ResourceKeyType = pending.popleft(); in_flight_by_node[node] += 1
+                in_flight[NODE_FETCH_EXECUTOR.submit(run_in_request_context(fetch_fn), res_key_submit)] = res_key_submit
+    submit_ready()
+    while in_flight:
+        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        for future in done:
+            res_key_done: ResourceKeyType = in_flight.pop(future); in_flight_by_node[res_key_done[0]] -= 1
+            try: results[res_key_done] = future.result()
+            except Exception as e: print(f"{error_label} hatası (N: {res_key_done[0]}, ID: {res_key_done[1]}): {e}")
+            if on_node_done and not pending_by_node[res_key_done[0]] and not in_flight_by_node[res_key_done[0]]: on_node_done(res_key_done[0])
+        submit_ready()
+    return results
+
+def collect_snapshots_for_resources(prox_instance: ProxmoxAPI, all_resources_list: List[VMDetailType], on_node_done: Optional[Callable[[str], None]] = None) -> Dict[ResourceKeyType, List[SnapshotDetailType]]:
+    """Her misafir için tek bir snapshot.get() yapar ('current' girdisi dahil) ve sonuçları (node, vmid, type) anahtarıyla döndürür."""
+    if not prox_instance or not all_resources_list: return {}
+    res_keys: List[ResourceKeyType] = [(str(res['node']), int(res['vmid']), str(res['type'])) for res in all_resources_list]
+    results: Dict[ResourceKeyType, List[SnapshotDetailType]] = {res_key: [] for res_key in res_keys}
+    results.update(map_per_node_bounded(res_keys, lambda res_key: get_snapshots_for_resource(prox_instance, res_key[0], res_key[1], res_key[2], None), "Snapshot toplama", on_node_done))
+    return results
+
+class SnapshotIndex:
+    """Misafir başına snapshot listelerini ('current' dahil) değişim işaretleriyle tutan artımlı dizin.
+
+    İşaret; misafirin config işareti/digest'i ile /cluster/tasks içindeki son snapshot görevinin (oluşturma, silme, geri alma)
+    UPID'inden oluşur. Yenilemede işareti değişmeyen ve SNAPSHOT_INDEX_MAX_AGE_SECONDS'tan yeni girdiler yeniden sorgulanmaz;
+    görev listesi alınamazsa tüm misafirler sorgulanır. Bu uygulama üzerinden yapılan silmeler dizine doğrudan işlenir.
+    Paylaşılan bir `state_backend` verilirse silmeler SNAPSHOT_INDEX_EVENTS_NAMESPACE'e de yazılır; diğer worker'lar
+    sync_shared() ile bu misafirlerin girdisini düşürür ve sürümü artırır, böylece önbellekteki katalogları silineni göstermez.
+    """
+
+    def __init__(self, max_age_seconds: float, state_backend: Optional[StateBackend] = None) -> None:
+        self.max_age_seconds: float = max_age_seconds; self._lock: threading.Lock = threading.Lock()
+        self._entries: Dict[ResourceKeyType, Dict[str, Any]] = {}; self.generation: int = 0 # Dizin içeriği her değiştiğinde artar
+        self.state_backend: Optional[StateBackend] = state_backend if state_backend is not None and state_backend.shared else None
+        self.origin: str = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"; self._shared_version: int = 0; self._seen_events: Dict[str, Any] = {}
+        self.stats: Dict[str, int] = {"refreshes": 0, "hits": 0, "misses": 0, "evictions": 0, "local_updates": 0, "shared_invalidations": 0}
+
+    def sync_shared(self) -> None:
+        """Başka worker'ların yayımladığı silmeleri uygular: ilgili misafirin girdisi düşürülür ve bir sonraki yenilemede yeniden sorgulanır."""
+        if self.state_backend is None: return
+        try:
+            shared_version: int = self.state_backend.version(SNAPSHOT_INDEX_EVENTS_NAMESPACE)
+            if shared_version == self._shared_version: return
+            events: Dict[str, Any] = self.state_backend.get_all(SNAPSHOT_INDEX_EVENTS_NAMESPACE)
+        except Exception as e: print(f"Paylaşılan snapshot dizini olayları okunamadı: {e}"); return
+        with self._lock:
+            for guest_id, event in events.items():
+                if self._seen_events.get(guest_id) == event: continue
+                self._seen_events[guest_id] = event
+                if event.get('origin') == self.origin: continue
+                node_name, resource_type, vmid_str = guest_id.split('/')
+                if self._entries.pop((node_name, int(vmid_str), resource_type), None) is not None: self.stats["shared_invalidations"] += 1
+                self.generation += 1
+            self._shared_version = shared_version
+
+    def current_generation(self) -> int:
+        self.sync_shared()
+        return self.generation
+
+    @staticmethod
+    def _latest_snapshot_tasks(prox_instance: ProxmoxAPI) -> Optional[Dict[int, str]]:
+        try: tasks: List[Dict[str, Any]] = prox_instance.cluster.tasks.get() or []
+        except Exception as e: print(f"Görev listesi alınamadı, tüm snapshot listeleri yeniden sorgulanacak: {e}"); invalidate_proxmox_on_auth_error(e); return None
+        latest: Dict[int, Tuple[int, str, str]] = {}
+        for task in tasks:
+            if task.get('type') not in SNAPSHOT_TASK_TYPES or not str(task.get('id', '')).isdigit(): continue
+            vmid: int = int(task['id']); upid: str = str(task.get('upid', '')); starttime: int = int(task.get('starttime') or 0)
+            if vmid not in latest or (starttime, upid) > latest[vmid][:2]: latest[vmid] = (starttime, upid, upid if task.get('endtime') else f"{upid}:running")
+        return {vmid: task_marker for vmid, (_, _, task_marker) in latest.items()}
+
+    @staticmethod
+    def _config_marker(vmid: int) -> str:
+        vm_config: VMConfigValueType = CACHED_VM_CONFIGS.get(str(vmid)) or {}
+        return f"{vm_config.get('config_marker', '')}|{vm_config.get('digest') or ''}"
+
+    def refresh(self, prox_instance: ProxmoxAPI, all_resources_list: List[VMDetailType], on_node_done: Optional[Callable[[str, int], None]] = None) -> Dict[ResourceKeyType, List[SnapshotDetailType]]:
+        """Yalnızca işareti değişen misafirlerin snapshot listesini çeker ve tüm misafirler için dizindeki listelerin kopyalarını döndürür.
+
+        `on_node_done(node, sorgulanan_misafir_sayısı)` her node'un listeleri hazır olduğunda çağrılır; tamamen dizinden karşılanan node'lar için hemen.
+        """
+        if not prox_instance or not all_resources_list: return {}
+        self.sync_shared(); task_markers: Optional[Dict[int, str]] = self._latest_snapshot_tasks(prox_instance); now: float = time.monotonic()
+        res_by_key: Dict[ResourceKeyType, VMDetailType] = {(str(res['node']), int(res['vmid']), str(res['type'])): res for res in all_resources_list}
+        stale_resources: List[VMDetailType] = []
+        with self._lock:
+            self.stats["refreshes"] += 1
+            for res_key, res in res_by_key.items():
+                entry: Optional[Dict[str, Any]] = self._entries.get(res_key)
+                if (task_markers is not None and entry and entry['config_marker'] == self._config_marker(res_key[1]) and entry['task_marker'] == task_markers.get(res_key[1], '')
+                        and now - entry['fetched_at'] < self.max_age_seconds): self.stats["hits"] += 1
+                else: self.stats["misses"] += 1; stale_resources.append(res)
+        stale_count_by_node: Dict[str, int] = {}
+        for res in stale_resources: stale_count_by_node[str(res['node'])] = stale_count_by_node.get(str(res['node']), 0) + 1
+        if on_node_done:
+            for node_name in dict.fromkeys(res_key[0] for res_key in res_by_key):
+                if node_name not in stale_count_by_node: on_node_done(node_name, 0)
+        fetched: Dict[ResourceKeyType, List[SnapshotDetailType]] = collect_snapshots_for_resources(prox_instance, stale_resources, (lambda node_name: on_node_done(node_name, stale_count_by_node[node_name])) if on_node_done else None)
+        with self._lock:
+            for res_key, snapshots in fetched.items():
+                # Proxmox her misafir için 'current' girdisini döndürür; boş liste sorgunun başarısız olduğunu gösterir ve dizine yazılmaz.
+                previous: Optional[Dict[str, Any]] = self._entries.get(res_key)
+                if previous is None or previous["snapshots"] != snapshots: self.generation += 1
+                if snapshots: self._entries[res_key] = {"snapshots": snapshots, "config_marker": self._config_marker(res_key[1]), "task_marker": (task_markers or {}).get(res_key[1], ''), "fetched_at": now}
+                else: self._entries.pop(res_key, None)
+            for res_key in [k for k in self._entries if k not in res_by_key]: del self._entries[res_key]; self.stats["evictions"] += 1; self.generation += 1
+            return {res_key: [dict(snap) for snap in self._entries[res_key]["snapshots"]] if res_key in self._entries else [] for res_key in res_by_key}
+
+    def apply_snapshot_deleted(self, node_name: str, resource_type: str, vmid: int, snap_name: str, upid: Optional[str]) -> None:
+        """Başarıyla silinen snapshot'ı dizinden çıkarır; Proxmox'un yaptığı gibi çocuklarını silinenin ebeveynine bağlar."""
+        with self._lock: self._remove_deleted_locked((node_name, vmid, resource_type), snap_name, upid)
+        if self.state_backend is not None: # Misafir bu worker'ın dizininde olmasa da diğerlerinde olabilir
+            try: self.state_backend.put(SNAPSHOT_INDEX_EVENTS_NAMESPACE, f"{node_name}/{resource_type}/{vmid}", {"origin": self.origin, "snap_name": snap_name, "upid": upid, "at": time.time()})
+            except Exception as e: print(f"Snapshot silme olayı paylaşılan depoya yazılamadı ({node_name}/{vmid}/{snap_name}): {e}")
+
+    def _remove_deleted_locked(self, res_key: ResourceKeyType, snap_name: str, upid: Optional[str]) -> None:
+        entry: Optional[Dict[str, Any]] = self._entries.get(res_key)
+        if not entry: return
+        deleted: Optional[SnapshotDetailType] = next((snap for snap in entry["snapshots"] if snap.get('snap_name') == snap_name), None)
+        if deleted is None: return
+        for snap in entry["snapshots"]:
+            if snap.get('parent') == snap_name: snap['parent'] = deleted.get('parent')
+        entry["snapshots"] = [snap for snap in entry["snapshots"] if snap is not deleted]
+        # Silme görevi bu misafirin en son snapshot görevi olduğundan işaret güncellenir; sonraki yenileme misafiri yeniden sorgulamaz.
+        if upid: entry["task_marker"] = upid
+        self.stats["local_updates"] += 1; self.generation += 1
+
+SNAPSHOT_INDEX: SnapshotIndex = SnapshotIndex(SNAPSHOT_INDEX_MAX_AGE_SECONDS, STATE_BACKEND)
+
+def flatten_snapshots_without_current(all_resources_list: List[VMDetailType], snapshots_by_resource: Dict[ResourceKeyType, List[SnapshotDetailType]]) -> List[SnapshotDetailType]:
     all_snapshots: List[SnapshotDetailType] = []
     for res in all_resources_list:
-        node: str = str(res['node']); vmid: int = int(res['vmid']); res_type: str = str(res['type']); res_name: Optional[Any] = res.get('name'); vm_status: str = str(res.get('status', 'unknown'))
-        resource_snapshots: List[SnapshotDetailType] = get_snapshots_for_resource(prox_instance, node, vmid, res_type, max_date_str)
-        for snap in resource_snapshots:
+        vmid: int = int(res['vmid']); res_type: str = str(res['type']); res_name: Optional[Any] = res.get('name'); vm_status: str = str(res.get('status', 'unknown'))
+        for snap in snapshots_by_resource.get((str(res['node']), vmid, res_type), []):
             if str(snap.get('snap_name', '')).lower() == 'current': continue
             snap['resource_name'] = str(res_name) if res_name else f"{res_type}-{vmid}"; snap['vm_status'] = vm_status; all_snapshots.append(snap)
     return all_snapshots
 
+class SnapshotCatalogCache:
+    """Eskilik eşiği (old_days) başına en son kurulan SnapshotCatalog'u tutar.
+
+    Katalog; snapshot dizininin sürümü ile misafir ad/durum imzası değişmedikçe ve SNAPSHOT_CATALOG_MAX_AGE_SECONDS'tan
+    yeniyse yeniden kurulmaz. Taze bir katalog varken /api/snapshots sayfaları Proxmox'a hiç gidilmeden sunulur.
+    """
+
+    def __init__(self, max_age_seconds: float, max_variants: int = 8) -> None:
+        self.max_age_seconds: float = max_age_seconds; self.max_variants: int = max(1, max_variants); self._lock: threading.Lock = threading.Lock()
+        self._catalogs: "OrderedDict[int, Tuple[Tuple[Any, ...], float, SnapshotCatalog]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "builds": 0}
+
+    @staticmethod
+    def _signature(all_resources_list: List[VMDetailType]) -> Tuple[Any, ...]:
+        return (SNAPSHOT_INDEX.current_generation(), tuple((str(res['node']), int(res['vmid']), str(res['type']), res.get('name'), res.get('status')) for res in all_resources_list))
+
+    def _fresh_locked(self, old_days: int, generation: int, signature: Optional[Tuple[Any, ...]]) -> Optional[SnapshotCatalog]:
+        cached_entry: Optional[Tuple[Tuple[Any, ...], float, SnapshotCatalog]] = self._catalogs.get(old_days)
+        if cached_entry is None or cached_entry[0][0] != generation or (signature is not None and cached_entry[0] != signature) or time.monotonic() - cached_entry[1] >= self.max_age_seconds: self.stats["misses"] += 1; return None
+        self.stats["hits"] += 1; self._catalogs.move_to_end(old_days); return cached_entry[2]
+
+    def cached(self, old_days: int) -> Optional[SnapshotCatalog]:
+        """Taze ve snapshot dizini o zamandan beri değişmemiş katalog; yoksa None."""
+        generation: int = SNAPSHOT_INDEX.current_generation()
+        with self._lock: return self._fresh_locked(old_days, generation, None)
+
+    def get(self, all_resources_list: List[VMDetailType], snapshots_by_resource: Dict[ResourceKeyType, List[SnapshotDetailType]], old_days: int) -> SnapshotCatalog:
+        """`snapshots_by_resource` (SNAPSHOT_INDEX.refresh çıktısı) için kataloğu döndürür; gerekiyorsa analiz edip yeniden kurar."""
+        signature: Tuple[Any, ...] = self._signature(all_resources_list)
+        with self._lock:
+            catalog: Optional[SnapshotCatalog] = self._fresh_locked(old_days, signature[0], signature)
+            if catalog is not None: return catalog
+        flatten_snapshots_without_current(all_resources_list, snapshots_by_resource) # resource_name ve vm_status alanlarını ekler
+        now_ts: float = time.time(); catalog = SnapshotCatalog(analyze_snapshots(snapshots_by_resource, now_ts, old_days), now_ts, old_days)
+        with self._lock:
+            self._catalogs[old_days] = (signature, time.monotonic(), catalog); self._catalogs.move_to_end(old_days); self.stats["builds"] += 1
+            while len(self._catalogs) > self.max_variants: self._catalogs.popitem(last=False)
+        return catalog
+
+SNAPSHOT_CATALOGS: SnapshotCatalogCache = SnapshotCatalogCache(SNAPSHOT_CATALOG_MAX_AGE_SECONDS)
+
+def parse_max_date_cutoff(max_date_str: Optional[str]) -> Optional[float]:
+    """'YYYY-MM-DD' gününün bitişini (ertesi gün 00:00 UTC) Unix zamanı olarak döndürür; boş veya geçersizse None."""
+    if not max_date_str: return None
+    try: return (datetime.strptime(max_date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)).timestamp()
+    except ValueError: return None
+
+def parse_old_days_arg(raw_value: Optional[str]) -> int:
+    try: old_days: int = int(raw_value if raw_value is not None else '30')
+    except (ValueError, TypeError): return 30
+    return 30 if old_days < -1 else old_days
+
+def get_all_snapshots_up_to_date(prox_instance: ProxmoxAPI, all_resources_list: List[VMDetailType], max_date_str: Optional[str] = None) -> List[SnapshotDetailType]:
+    if not prox_instance or not all_resources_list: return []
+    all_snapshots: List[SnapshotDetailType] = flatten_snapshots_without_current(all_resources_list, SNAPSHOT_INDEX.refresh(prox_instance, all_resources_list))
+    if max_date_str:
+        try: max_date_obj: DateType = datetime.strptime(max_date_str, "%Y-%m-%d").date()
+        except ValueError: return all_snapshots
+        all_snapshots = [s for s in all_snapshots if not s.get('create_time_unix') or datetime.fromtimestamp(s['create_time_unix'], tz=timezone.utc).date() <= max_date_obj]
+    return all_snapshots
+
+def build_live_performance_payload(prox_conn: ProxmoxAPI) -> Dict[str, VMDetailType]:
+    """Bilinen tüm misafirler için birer örnek alır ve /api/live_vm_performance yanıtını oluşturur.
+
+    Varsayılan toplu örneklemede QEMU VM'ler ve LXC konteynerler tek bir liste yanıtından (bkz. fetch_bulk_guest_rows) örneklenir;
+    listede bulunmayan misafir 'not_found' sayılır. LIVE_SAMPLING_MODE 'per_vm' ise yalnızca QEMU VM'ler için eski
+    VM başına status.current + rrddata yolu kullanılır.
+    """
+    live_performance_data_response: Dict[str, VMDetailType] = {}
+    bulk_rows: Optional[Dict[str, Dict[str, Any]]] = None
+    if LIVE_SAMPLING_MODE != 'per_vm':
+        bulk_rows = {str(row['vmid']): row for row in fetch_bulk_guest_rows(prox_conn)}
+        COUNTER_RATES.retain({(str(row['node']), int(row['vmid'])) for row in bulk_rows.values()})
+    for vmid_str_api, vm_config_api in list(CACHED_VM_CONFIGS.items()):
+        if bulk_rows is None and vm_config_api.get('type') != 'qemu': continue
+        bulk_row: Optional[Dict[str, Any]] = bulk_rows.get(vmid_str_api) if bulk_rows is not None else None
+        node_name_api: str = str(bulk_row['node'] if bulk_row else vm_config_api.get('node')); vmid_int_api: int = int(vmid_str_api); vm_key_api: VMKeyType = (node_name_api, vmid_int_api)
+        vm_perf_hist_api: VMPerformanceHistory = _ensure_perf_history(vm_key_api); perf_data_api: Optional[VMDetailType] = None
+        if bulk_rows is None: perf_data_api = get_vm_current_status(prox_conn, node_name_api, vmid_int_api)
+        elif bulk_row is None:
+            with PERF_HISTORY_LOCK: vm_perf_hist_api.status_text = 'not_found'
+        else:
+            try: perf_data_api = sample_guest_from_bulk_row(prox_conn, bulk_row)
+            except Exception as e:
+                print(f"Misafir {vmid_int_api} ({node_name_api}) örneklenirken hata: {e}")
+                with PERF_HISTORY_LOCK: vm_perf_hist_api.status_text = 'error_generic'
+        if perf_data_api:
+            history_count_val_api = perf_data_api.get('history_count', 0)
+            with PERF_HISTORY_LOCK:
+                cpu_history_copy: List[float] = vm_perf_hist_api.series['cpu'].values(SPARKLINE_POINTS); ram_history_copy: List[float] = vm_perf_hist_api.series['ram'].values(SPARKLINE_POINTS)
+                history_seq: int = vm_perf_hist_api.seq
+            api_vm_data_dict: VMDetailType = {'type': vm_config_api.get('type'), 'node': node_name_api, 'status': perf_data_api.get('status'),
+                                              'cpu_usage_percent': perf_data_api.get('cpu_usage_percent'), 'ram_usage_percent': perf_data_api.get('ram_usage_percent'),
+                                              'avg_cpu_usage_percent': perf_data_api.get('avg_cpu_usage_percent'),
+                                              'max_cpu_usage_percent': perf_data_api.get('max_cpu_usage_percent'),
+                                              'avg_ram_usage_percent': perf_data_api.get('avg_ram_usage_percent'),
+                                              'max_ram_usage_percent': perf_data_api.get('max_ram_usage_percent'), 'cpu_history': cpu_history_copy, 'ram_history': ram_history_copy,
+                                              'diskread_Bps': perf_data_api.get('diskread_Bps'), 'diskwrite_Bps': perf_data_api.get('diskwrite_Bps'),
+                                              'netin_Bps': perf_data_api.get('netin_Bps'), 'netout_Bps': perf_data_api.get('netout_Bps'), 'history_count': history_count_val_api, 'history_seq': history_seq}
+            temp_suggestion_data_api: VMDetailType = {**api_vm_data_dict, 'node': node_name_api, 'vmid': vmid_int_api, 'current_vcpu': vm_config_api.get('current_vcpu'), 'current_ram_mb': vm_config_api.get('current_ram_mb')}
+            updated_suggestion_data_api: VMDetailType = calculate_right_sizing_suggestions(temp_suggestion_data_api)
+            api_vm_data_dict['is_underutilized'] = updated_suggestion_data_api.get('is_underutilized', False); api_vm_data_dict['right_sizing_suggestion'] = updated_suggestion_data_api.get('right_sizing_suggestion', '')
+            live_performance_data_response[vmid_str_api] = api_vm_data_dict
+        else:
+            error_status_api: str = vm_perf_hist_api.status_text or 'error_unknown'
+            live_performance_data_response[vmid_str_api] = {'type': vm_config_api.get('type'), 'node': node_name_api, 'status': error_status_api, 'cpu_usage_percent': 0.0,
+                                                            'ram_usage_percent': 0.0, 'avg_cpu_usage_percent': None, 'max_cpu_usage_percent': None, 'avg_ram_usage_percent': None,
+                                                            'max_ram_usage_percent': None, 'is_underutilized': False, 'right_sizing_suggestion': '', 'cpu_history': [],
+                                                            'ram_history': [], 'diskread_Bps': None, 'diskwrite_Bps': None, 'netin_Bps': None, 'netout_Bps': None, 'history_count': 0, 'history_seq': vm_perf_hist_api.seq}
+            if error_status_api not in ['running', 'stopped']:
+                with PERF_HISTORY_LOCK: vm_perf_hist_api.clear()
+    return live_performance_data_response
+
+class RightSizingReporter:
+    """Filo genelindeki yüzdelik tabanlı sağ boyutlandırma raporunu üretir ve RIGHT_SIZING_REPORT_INTERVAL_SECONDS boyunca önbellekte tutar.
+
+    Tüm QEMU VM ve LXC misafirlerinin 'day' ve 'week' RRD verisi node başına sınırlı eşzamanlılıkla çekilir, p50/p95/p99 değerleri
+    tek bir NumPy matrisi üzerinde hesaplanır. Yenileme arka planda yapılır; istekler her zaman son tamamlanmış raporu okur.
+    Rapor durum deposunda tutulur; paylaşılan depoda bir worker'ın ürettiği rapor diğerlerinin önerilerinde de kullanılır.
+    """
+
+    def __init__(self, policy: RightSizingPolicy, interval_seconds: float, state_backend: StateBackend) -> None:
+        self.policy: RightSizingPolicy = policy; self.interval_seconds: float = interval_seconds; self.state_backend: StateBackend = state_backend
+        self._lock: threading.Lock = threading.Lock(); self._refresh_lock: threading.Lock = threading.Lock()
+        self._entries_report: Optional[Dict[str, Any]] = None; self._entries: Dict[VMKeyType, Dict[str, Any]] = {}; self._last_attempt_monotonic: float = -math.inf
+        self.stats: Dict[str, Any] = {"refreshes": 0, "failures": 0, "last_duration_ms": None}
+
+    def is_stale(self) -> bool:
+        if time.monotonic() - self._last_attempt_monotonic < self.interval_seconds: return False # Başarısız denemeden sonra da bir aralık beklenir
+        report: Optional[Dict[str, Any]] = self.latest_report()
+        return report is None or time.time() - float(report.get("generated_ts") or 0) >= self.interval_seconds
+
+    def entry_for(self, node_name: str, vmid: int) -> Optional[Dict[str, Any]]:
+        report: Optional[Dict[str, Any]] = self.latest_report()
+        if report is None: return None
+        with self._lock:
+            if self._entries_report is not report: self._entries = {(row['node'], row['vmid']): row for row in report["guests"]}; self._entries_report = report
+            return self._entries.get((node_name, vmid))
+
+    def latest_report(self) -> Optional[Dict[str, Any]]:
+        return self.state_backend.get("reports", "right_sizing")
+
+    def refresh(self, prox_conn: ProxmoxAPI) -> Optional[Dict[str, Any]]:
+        if not self._refresh_lock.acquire(blocking=False):
+            with self._refresh_lock: return self.latest_report() # Süren yenilemeyi bekle, ikinciyi başlatma
+        try:
+            started_at: float = time.monotonic()
+            guests: List[Dict[str, Any]] = []
+            with PERF_HISTORY_LOCK: status_texts: Dict[VMKeyType, str] = {vm_key: entry.status_text for vm_key, entry in PERFORMANCE_HISTORY.items()} # Toplayıcı aynı anda yazabilir
+            for vmid_str, vm_config in list(CACHED_VM_CONFIGS.items()):
+                if vm_config.get('type') not in ('qemu', 'lxc'): continue
+                node_name: str = str(vm_config.get('node')); status_text: Optional[str] = status_texts.get((node_name, int(vmid_str)))
+                guests.append({"node": node_name, "vmid": int(vmid_str), "type": vm_config.get('type'), "name": vm_config.get('name'),
+                               "status": status_text if status_text is not None else _latest_collected_perf(int(vmid_str)).get('status', 'unknown'),
+                               "current_vcpu": vm_config.get('current_vcpu'), "current_ram_mb": vm_config.get('current_ram_mb')})
+            res_keys: List[ResourceKeyType] = [(guest['node'], guest['vmid'], guest['type']) for guest in guests]
+            week_weight: int = RRD_STEP_SECONDS['week'] // RRD_STEP_SECONDS['day']
+            def fetch_utilization(res_key: ResourceKeyType) -> Tuple[List[float], List[float]]:
+                day_rows: List[Dict[str, Any]] = get_cached_rrd_data(prox_conn, res_key[0], res_key[1], 'day', resource_type=res_key[2])
+                week_rows: List[Dict[str, Any]] = get_cached_rrd_data(prox_conn, res_key[0], res_key[1], 'week', resource_type=res_key[2])
+                return merge_rrd_utilization(day_rows, week_rows, week_weight)
+            utilization: Dict[ResourceKeyType, Tuple[List[float], List[float]]] = map_per_node_bounded(res_keys, fetch_utilization, "Sağ boyutlandırma RRD")
+            rows: List[Dict[str, Any]] = build_right_sizing_report(guests, [utilization.get(res_key, ([], []))[0] for res_key in res_keys], [utilization.get(res_key, ([], []))[1] for res_key in res_keys], self.policy)
+            duration_ms: float = round((time.monotonic() - started_at) * 1000, 1)
+            report: Dict[str, Any] = {"generated_at": datetime.now(timezone.utc).isoformat(), "generated_ts": time.time(), "duration_ms": duration_ms, "policy": self.policy.as_dict(), "guests": rows,
+                                      "summary": {"guests": len(rows), "downsize": sum(1 for row in rows if row['cpu_action'] < 0 or row['ram_action'] < 0),
+                                                  "upsize": sum(1 for row in rows if row['cpu_action'] > 0 or row['ram_action'] > 0), "insufficient_samples": sum(1 for row in rows if not row['has_enough_samples'])}}
+            self.state_backend.put("reports", "right_sizing", report); self._last_attempt_monotonic = time.monotonic()
+            self.stats["refreshes"] += 1; self.stats["last_duration_ms"] = duration_ms
+            return report
+        except Exception as e:
+            self.stats["failures"] += 1; self._last_attempt_monotonic = time.monotonic(); invalidate_proxmox_on_auth_error(e)
+            print(f"Sağ boyutlandırma raporu oluşturulamadı: {e}"); return self.latest_report()
+        finally: self._refresh_lock.release()
+
+    def refresh_in_background(self, prox_conn: ProxmoxAPI) -> None:
+        if self._refresh_lock.locked(): return
+        threading.Thread(target=self.refresh, args=(prox_conn,), name="pveguard-rightsizing", daemon=True).start()
+
+RIGHT_SIZING_REPORTER: RightSizingReporter = RightSizingReporter(RIGHT_SIZING_POLICY, RIGHT_SIZING_REPORT_INTERVAL_SECONDS, STATE_BACKEND)
+
+class MetricsCollector:
+    """Tüm QEMU VM ve LXC konteynerlerinin performans örneklerini sabit aralıklarla toplayan arka plan thread'i.
+
+    HTTP uç noktaları upstream'e gitmez, latest_payload() ile son tamamlanan turun sonucunu O(1) okur.
+    Turlar sabit bir takvime göre (başlangıç + n * aralık) planlanır; jitter birden fazla örneğin aynı anda
+    vurmasını önler, hatalarda bekleme süresi METRICS_COLLECTOR_MAX_BACKOFF_SECONDS'a kadar katlanarak artar.
+    Birden fazla worker aynı durum deposunu paylaşıyorsa yalnızca COLLECTOR_LEASE_NAME kirasını tutan lider örnek toplar ve
+    her turu depoya yayımlar; diğerleri son yayımlanan turu kısa aralıklarla okur ve lider düşerse kirayı devralır.
+    """
+
+    def __init__(self, interval_seconds: float, jitter_seconds: float, max_backoff_seconds: float, state_backend: StateBackend) -> None:
+        self.interval_seconds: float = interval_seconds; self.jitter_seconds: float = jitter_seconds; self.max_backoff_seconds: float = max_backoff_seconds
+        self.state_backend: StateBackend = state_backend; self.lease_seconds: float = max(30.0, 4 * interval_seconds); self.follower_poll_seconds: float = min(1.0, interval_seconds / 2)
+        self._state_lock: threading.Lock = threading.Lock(); self._run_lock: threading.Lock = threading.Lock(); self._stop_event: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None; self._latest: Optional[Dict[str, VMDetailType]] = None; self.latest_at: Optional[float] = None
+        self._update_condition: threading.Condition = threading.Condition(); self.version: int = 0; self.boot_id: str = f"{int(time.time()):x}-{os.getpid():x}"
+        self.owner_id: str = f"{socket.gethostname()}:{os.getpid()}:{self.boot_id}"; self.is_leader: bool = False; self.payload_origin: str = self.boot_id
+        self.consecutive_failures: int = 0; self.stats: Dict[str, Any] = {"ticks": 0, "failures": 0, "last_duration_ms": None}; self._last_rollup_at: float = 0.0
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._state_lock:
+            if self.is_running(): return
+            self._stop_event.clear(); self._thread = threading.Thread(target=self._loop, name="pveguard-metrics", daemon=True); self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop_event.set()
+        if self._thread is not None: self._thread.join(timeout)
+        if self.is_leader: self.state_backend.release_lease(COLLECTOR_LEASE_NAME, self.owner_id); self.is_leader = False
+
+    def latest_payload(self) -> Optional[Dict[str, VMDetailType]]:
+        if self._latest is None and self.state_backend.shared and not self.is_leader: self._follow_published() # Başka bir worker'ın turu varsa onu kullan
+        return self._latest
+
+    def latest_with_version(self) -> Tuple[int, Optional[Dict[str, VMDetailType]]]:
+        with self._update_condition: return self.version, self._latest
+
+    def wait_for_update(self, after_version: int, timeout: float) -> Tuple[int, Optional[Dict[str, VMDetailType]]]:
+        with self._update_condition:
+            self._update_condition.wait_for(lambda: self.version > after_version, timeout=timeout)
+            return self.version, self._latest
+
+    def run_once(self) -> bool:
+        with self._run_lock:
+            try: self.is_leader = self.state_backend.try_acquire_lease(COLLECTOR_LEASE_NAME, self.owner_id, self.lease_seconds)
+            except Exception as e: print(f"Metrik toplayıcı kirası alınamadı: {e}"); self.is_leader = False
+            if not self.is_leader: return self._follow_published()
+            started_at: float = time.monotonic()
+            try:
+                prox_conn: Optional[ProxmoxAPI] = connect_to_proxmox()
+                if not prox_conn: raise ConnectionError("Proxmox VE sunucusuna bağlanılamadı.")
+                if not CACHED_VM_CONFIGS: get_all_vms_and_containers_with_initial_perf(prox_conn, record_samples=False)
+                payload: Dict[str, VMDetailType] = build_live_performance_payload(prox_conn); self._publish(payload)
+                if TIMESERIES_STORE is not None: self._persist_samples(TIMESERIES_STORE)
+                if RIGHT_SIZING_REPORTER.is_stale(): RIGHT_SIZING_REPORTER.refresh_in_background(prox_conn)
+                self.latest_at = time.time(); self.consecutive_failures = 0
+                self.stats["ticks"] += 1; self.stats["last_duration_ms"] = round((time.monotonic() - started_at) * 1000, 1)
+                return True
+            except Exception as e:
+                self.consecutive_failures += 1; self.stats["failures"] += 1; invalidate_proxmox_on_auth_error(e)
+                print(f"Metrik toplayıcı turu başarısız ({self.consecutive_failures}. ardışık hata): {e}"); return False
+
+    def _publish(self, payload: Dict[str, VMDetailType]) -> None:
+        # Sürüm, önceki liderin yayımladığı sürümün üzerinden devam eder; böylece izleyicilerin sürümü lider değişse de geri gitmez.
+        previous: Optional[Dict[str, Any]] = self.state_backend.get("live", "latest"); version: int = max(self.version, int(previous["version"]) if previous else 0) + 1
+        self.state_backend.put("live", "latest", {"version": version, "origin": self.boot_id, "published_at": time.time(), "payload": payload})
+        with self._update_condition: self._latest = payload; self.version = version; self.payload_origin = self.boot_id; self._update_condition.notify_all()
+
+    def _follow_published(self) -> bool:
+        """Kira başka bir süreçteyken upstream'e gitmeden liderin yayımladığı son turu alır; henüz tur yoksa False döner."""
+        try: published: Optional[Dict[str, Any]] = self.state_backend.get("live", "latest")
+        except Exception as e: print(f"Paylaşılan metrik turu okunamadı: {e}"); return False
+        if published is None: return False
+        if int(published["version"]) != self.version or published["origin"] != self.payload_origin:
+            with self._update_condition: self._latest = published["payload"]; self.version = int(published["version"]); self.payload_origin = str(published["origin"]); self._update_condition.notify_all()
+            self.latest_at = float(published.get("published_at") or time.time())
+        return True
+
+    def _persist_samples(self, store: SQLiteTimeSeriesStore) -> None:
+        try:
+            store.flush()
+            if time.monotonic() - self._last_rollup_at >= TIMESERIES_ROLLUP_INTERVAL_SECONDS: store.rollup(); self._last_rollup_at = time.monotonic()
+        except Exception as e: print(f"Zaman serisi deposu güncellenemedi: {e}")
+
+    def _loop(self) -> None:
+        next_run_at: float = time.monotonic()
+        while not self._stop_event.is_set():
+            ok: bool = self.run_once(); now: float = time.monotonic()
+            if not self.is_leader: self._stop_event.wait(self.follower_poll_seconds); next_run_at = time.monotonic(); continue
+            if ok:
+                next_run_at += self.interval_seconds
+                if next_run_at <= now: next_run_at = now + self.interval_seconds
+            else: next_run_at = now + min(self.max_backoff_seconds, self.interval_seconds * (2 ** min(self.consecutive_failures, 16)))
+            self._stop_event.wait(max(0.0, next_run_at - now + random.uniform(0.0, self.jitter_seconds)))
+
+METRICS_COLLECTOR: MetricsCollector = MetricsCollector(METRICS_COLLECTOR_INTERVAL_SECONDS, METRICS_COLLECTOR_JITTER_SECONDS, METRICS_COLLECTOR_MAX_BACKOFF_SECONDS, STATE_BACKEND)
+
+def diff_live_performance_payloads(previous: Dict[str, VMDetailType], current: Dict[str, VMDetailType]) -> Dict[str, Any]:
+    """İki /api/live_vm_performance yükü arasındaki farkı döndürür: yalnızca değişen VM'ler ve alanlar.
+
+    Geçmiş dizileri, history_seq artışı kayan pencereyle tutarlıysa yalnızca yeni noktalar olarak ('<alan>_append'),
+    aksi halde (geçmiş sıfırlandıysa) tam dizi olarak gönderilir.
+    """
+    changed: Dict[str, Dict[str, Any]] = {}; removed: List[str] = [vmid for vmid in previous if vmid not in current]
+    for vmid, vm_data in current.items():
+        old_data: Optional[VMDetailType] = previous.get(vmid)
+        if old_data is None: changed[vmid] = vm_data; continue
+        fields: Dict[str, Any] = {key: value for key, value in vm_data.items() if key not in LIVE_HISTORY_FIELDS and old_data.get(key) != value}
+        new_points: int = int(vm_data.get('history_seq') or 0) - int(old_data.get('history_seq') or 0)
+        for history_field in LIVE_HISTORY_FIELDS:
+            new_history: List[float] = vm_data.get(history_field) or []; old_history: List[float] = old_data.get(history_field) or []
+            kept: int = len(new_history) - new_points
+            if new_history == old_history and new_points == 0: continue
+            if 0 <= new_points and 0 <= kept <= len(old_history) and len(new_history) == min(len(old_history) + new_points, SPARKLINE_POINTS) and new_history[:kept] == old_history[len(old_history) - kept:]:
+                if new_points: fields[f"{history_field}_append"] = new_history[kept:]
+            else: fields[history_field] = new_history
+        if fields: changed[vmid] = fields
+    return {"changed": changed, "removed": removed}
+
+def _format_sse_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    return (f"id: {event_id}\n" if event_id is not None else "") + f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def snapshot_performance_history() -> Dict[VMKeyType, Dict[str, Any]]:
+    # Toplayıcının son turu varsa sparkline'lar ondan okunur; paylaşılan durumda tur başka bir worker'da toplanmış olabilir.
+    collected: Optional[Dict[str, VMDetailType]] = METRICS_COLLECTOR.latest_payload()
+    if collected is not None: return {(str(vm_data.get('node')), int(vmid_str)): {'history': {'cpu': vm_data.get('cpu_history') or [], 'ram': vm_data.get('ram_history') or []},
+                                                                                  'status_text': vm_data.get('status')} for vmid_str, vm_data in collected.items()}
+    with PERF_HISTORY_LOCK:
+        return {vm_key: {'history': {name: series.values(SPARKLINE_POINTS) for name, series in entry.series.items()}, 'status_text': entry.status_text} for vm_key, entry in PERFORMANCE_HISTORY.items()}
+
+class DashboardPage:
+    """index() şablonunun verisi; her bölüm şablonda ilk kez erişildiğinde hesaplanır.
+
+    Şablon yukarıdan aşağı üretildiği için akışlı çizimde (stream_template) sayfa başlığı ve filtre formu hiçbir Proxmox çağrısı
+    beklenmeden, VM tablosu envanter gelince gönderilir. Snapshot bölümü node'lar tamamlandıkça ilerleme satırları üretir,
+    ardından tablo ve snapshot'a bağlı uyarılar gelir. Tamponlu çizimde aynı nesne sırayla tüketilir.
+    """
+
+    def __init__(self, prox_conn: Optional[ProxmoxAPI], old_days: int, idle_days: int, max_date: Optional[str], sort_by: str, order: str) -> None:
+        self.prox_conn: Optional[ProxmoxAPI] = prox_conn; self.old_days: int = old_days; self.idle_days: int = idle_days
+        self.max_date: Optional[str] = max_date; self.sort_by: str = sort_by; self.order: str = order
+        self.error: Optional[str] = None if prox_conn else "Proxmox VE sunucusuna bağlanılamadı."
+        self._all_resources: Optional[List[VMDetailType]] = None; self._snapshot_view: Optional[Dict[str, Any]] = None
+
+    def _fail(self, e: Exception) -> None:
+        print(f"Ana sayfada veri alınırken hata: {e}, {type(e)}"); traceback.print_exc(); self.error = f"Veri alınırken bir hata oluştu: {str(e)}"
+
+    @property
+    def all_resources(self) -> List[VMDetailType]:
+        if self._all_resources is None:
+            self._all_resources = []
+            if self.prox_conn and not self.error:
+                try: self._all_resources = get_all_vms_and_containers_with_initial_perf(self.prox_conn)
+                except Exception as e: self._fail(e)
+            if self.prox_conn and METRICS_COLLECTOR_ENABLED: METRICS_COLLECTOR.start()
+        return self._all_resources
+
+    @property
+    def all_qemu_vms(self) -> List[VMDetailType]:
+        return [vm for vm in self.all_resources if vm.get('type') == 'qemu']
+
+    @property
+    def underutilized_vms_count(self) -> int:
+        return sum(1 for vm in self.all_qemu_vms if vm.get('is_underutilized'))
+
+    @property
+    def performance_history(self) -> Dict[VMKeyType, Dict[str, Any]]:
+        self.all_resources # Envanter örnekleri geçmişe işlendikten sonra okunmalı
+        return snapshot_performance_history()
+
+    def snapshot_progress(self) -> Iterator[Dict[str, Any]]:
+        """Snapshot dizinini ayrı bir thread'de tazeler ve her node hazır oldukça {'node', 'fetched'} üretir; bitince görünümü kurar."""
+        if self._snapshot_view is not None: return
+        resources: List[VMDetailType] = self.all_resources; snapshots_by_resource: Dict[ResourceKeyType, List[SnapshotDetailType]] = {}
+        if self.prox_conn and resources and not self.error:
+            events: "queue.Queue[Optional[Tuple[str, int]]]" = queue.Queue(); outcome: Dict[str, Any] = {}; prox_conn: ProxmoxAPI = self.prox_conn
+            def run_refresh() -> None:
+                try: outcome["snapshots"] = SNAPSHOT_INDEX.refresh(prox_conn, resources, on_node_done=lambda node_name, fetched: events.put((node_name, fetched)))
+                except Exception as e: outcome["error"] = e
+                finally: events.put(None)
+            threading.Thread(target=run_in_request_context(run_refresh), name="pveguard-dashboard-snapshots", daemon=True).start()
+            while (event := events.get()) is not None: yield {"node": event[0], "fetched": event[1]}
+            if "error" in outcome: self._fail(outcome["error"])
+            else: snapshots_by_resource = outcome["snapshots"]
+        self._snapshot_view = self._build_snapshot_view(resources, snapshots_by_resource)
+
+    def _build_snapshot_view(self, resources: List[VMDetailType], snapshots_by_resource: Dict[ResourceKeyType, List[SnapshotDetailType]]) -> Dict[str, Any]:
+        view: Dict[str, Any] = {"snapshots": [], "next_cursor": None, "total": 0, "orphaned_old_root_snapshot_count": 0, "old_snapshots_count": 0, "stopped_vm_old_snapshots_count": 0, "idle_vmids": []}
+        if self.error or not resources: return view
+        try:
+            snapshot_catalog: SnapshotCatalog = SNAPSHOT_CATALOGS.get(resources, snapshots_by_resource, self.old_days); max_date_cutoff_ts: Optional[float] = parse_max_date_cutoff(self.max_date)
+            view["orphaned_old_root_snapshot_count"] = snapshot_catalog.count('orphaned', max_date_cutoff_ts)
+            view["old_snapshots_count"] = snapshot_catalog.count('old_other', max_date_cutoff_ts); view["stopped_vm_old_snapshots_count"] = snapshot_catalog.count('stopped_vm_old', max_date_cutoff_ts)
+            view["idle_vmids"] = [int(vm['vmid']) for vm in self.all_qemu_vms if str(vm.get('status','')).lower() == 'stopped'
+                                  and snapshot_catalog.analysis.is_idle((str(vm.get('node')), int(vm['vmid']), 'qemu'), snapshot_catalog.now_ts, self.idle_days)]
+            # İlk sayfa sunucuda çizilir; kalan sayfalar tabloya /api/snapshots üzerinden imleçle yüklenir.
+            snapshot_page: Dict[str, Any] = snapshot_catalog.query(sort_by=self.sort_by, order='desc' if self.order == 'desc' else 'asc', limit=SNAPSHOT_PAGE_SIZE, max_date_ts=max_date_cutoff_ts)
+            view.update({"snapshots": snapshot_page["items"], "next_cursor": snapshot_page["next_cursor"], "total": snapshot_page["total"] or 0})
+        except Exception as e: self._fail(e)
+        return view
+
+    @property
+    def snapshot_view(self) -> Dict[str, Any]:
+        if self._snapshot_view is None:
+            for _ in self.snapshot_progress(): pass
+        return self._snapshot_view or {}
+
+TELEMETRY.register_cache("rrd", lambda: RRD_CACHE_STATS)
+TELEMETRY.register_cache("vm_config", lambda: CONFIG_CACHE_STATS)
+TELEMETRY.register_cache("snapshot_index", lambda: SNAPSHOT_INDEX.stats)
+TELEMETRY.register_cache("snapshot_catalog", lambda: SNAPSHOT_CATALOGS.stats)
+TELEMETRY.register_cache("proxmox_client", lambda: PROXMOX_POOL.stats, misses_key="logins")
+TELEMETRY.register_component("proxmox_client_pool", PROXMOX_POOL.snapshot_stats)
+TELEMETRY.register_component("metrics_collector", lambda: {**METRICS_COLLECTOR.stats, "is_leader": METRICS_COLLECTOR.is_leader, "consecutive_failures": METRICS_COLLECTOR.consecutive_failures, "version": METRICS_COLLECTOR.version})
+TELEMETRY.register_component("right_sizing_reporter", lambda: RIGHT_SIZING_REPORTER.stats)
+TELEMETRY.register_component("snapshot_delete_queue", SNAPSHOT_DELETE_QUEUE.snapshot_stats)
+if TIMESERIES_STORE is not None:
+    OPEN_TIMESERIES_STORE: SQLiteTimeSeriesStore = TIMESERIES_STORE
+    TELEMETRY.register_component("timeseries_store", lambda: OPEN_TIMESERIES_STORE.stats)
+if isinstance(STATE_BACKEND, SQLiteStateBackend):
+    SQLITE_STATE_BACKEND: SQLiteStateBackend = STATE_BACKEND
+    TELEMETRY.register_cache("state_backend", lambda: SQLITE_STATE_BACKEND.stats, hits_key="cache_hits", misses_key="reads")
+    TELEMETRY.register_component("state_backend", lambda: SQLITE_STATE_BACKEND.stats)
+
+@app.before_request
+def start_request_telemetry() -> None:
+    g.request_timing = RequestTiming(); CURRENT_REQUEST_TIMING.set(g.request_timing)
+
+@app.after_request
+def finish_request_telemetry(response: Response) -> Response:
+    timing: Optional[RequestTiming] = g.get('request_timing')
+    if timing is None: return response
+    endpoint: str = request.endpoint or 'unmatched'; method: str = request.method
+    # Akış yanıtlarında başlıklar gövdeden önce gider; Server-Timing o anki kısmi değerleri yanıltıcı olacağı için eklenmez.
+    if SERVER_TIMING_ENABLED and not response.is_streamed: response.headers['Server-Timing'] = TELEMETRY.server_timing_header(timing)
+    response.call_on_close(lambda: TELEMETRY.observe_route(endpoint, method, response.status_code, timing)) # Akış yanıtları gövde bitince ölçülür
+    return response
+
 @app.route('/', methods=['GET'])
-def index() -> str:
-    prox_conn: Optional[ProxmoxAPI] = connect_to_proxmox(); snapshots_list_final: List[SnapshotDetailType] = []; all_qemu_vms_with_state_for_template: List[VMDetailType] = []; error_message: Optional[str] = None
-    underutilized_vms_count: int = 0; idle_vms_count: int = 0; orphaned_old_root_snapshot_count: int = 0
+def index() -> Any:
+    """Gösterge paneli; varsayılan olarak akışlı çizilir (?stream=0 veya PVEGUARD_STREAM_DASHBOARD=False ile tek parça)."""
+    prox_conn: Optional[ProxmoxAPI] = connect_to_proxmox()
     max_date_filter_req: Optional[str] = request.args.get('max_date'); sort_by_req: str = request.args.get('sort_by', 'date'); order_req: str = request.args.get('order', 'desc')
-    old_snapshot_days_threshold_val: int; idle_vm_threshold_days_val: int
-    try: old_snapshot_days_threshold_val = int(request.args.get('old_days', '30')); old_snapshot_days_threshold_val = 30 if old_snapshot_days_threshold_val < -1 else old_snapshot_days_threshold_val
-    except (ValueError, TypeError): old_snapshot_days_threshold_val = 30
+    old_snapshot_days_threshold_val: int = parse_old_days_arg(request.args.get('old_days')); idle_vm_threshold_days_val: int
     try: idle_vm_threshold_days_val = int(request.args.get('idle_days', '60')); idle_vm_threshold_days_val = 60 if idle_vm_threshold_days_val < 0 else idle_vm_threshold_days_val
     except (ValueError, TypeError): idle_vm_threshold_days_val = 60
     current_params: Dict[str, Union[str, int]] = {'max_date': max_date_filter_req or '', 'sort_by': sort_by_req, 'order': order_req, 'old_days': old_snapshot_days_threshold_val, 'idle_days': idle_vm_threshold_days_val}
-    if prox_conn:
-        try:
-            all_resources_with_initial_perf: List[VMDetailType] = get_all_vms_and_containers_with_initial_perf(prox_conn)
-            all_qemu_vms_with_state_for_template = [vm for vm in all_resources_with_initial_perf if vm.get('type') == 'qemu']
-            snapshots_list_raw_unfiltered_no_current: List[SnapshotDetailType] = get_all_snapshots_up_to_date(prox_conn, all_resources_with_initial_perf, None)
-            now_utc: datetime = datetime.now(timezone.utc); snapshots_by_vm_key_type = Tuple[str, int, str]; snapshots_by_vm: Dict[snapshots_by_vm_key_type, List[SnapshotDetailType]] = {}
-            for snap_raw in snapshots_list_raw_unfiltered_no_current:
-                node_for_key = str(snap_raw['node']); vmid_for_key = int(snap_raw['vmid']); type_for_key = str(snap_raw['resource_type']); vm_key_snap: snapshots_by_vm_key_type = (node_for_key, vmid_for_key, type_for_key)
-                if vm_key_snap not in snapshots_by_vm: snapshots_by_vm[vm_key_snap] = []
-                snap: SnapshotDetailType = snap_raw.copy(); snap['is_old'] = False; snap['is_on_stopped_vm_and_old'] = False; snap['is_orphaned_old_root'] = False
-                snap_create_time: Optional[int] = snap.get('create_time_unix')
-                if snap_create_time:
-                    age: timedelta = now_utc - datetime.fromtimestamp(snap_create_time, tz=timezone.utc)
-                    if old_snapshot_days_threshold_val == -1 or age.days > old_snapshot_days_threshold_val:
-                        snap['is_old'] = True
-                        if str(snap.get('vm_status', '')).lower() == 'stopped': snap['is_on_stopped_vm_and_old'] = True
-                snapshots_by_vm[vm_key_snap].append(snap)
-            original_snapshots_for_current_check_key_type = Tuple[str, int, str]; original_snapshots_for_current_check: Dict[original_snapshots_for_current_check_key_type, List[SnapshotDetailType]] = {}
-            for res_orig in all_resources_with_initial_perf:
-                res_key: original_snapshots_for_current_check_key_type = (str(res_orig['node']), int(res_orig['vmid']), str(res_orig['type']))
-                original_snapshots_for_current_check[res_key] = get_snapshots_for_resource(prox_conn, str(res_orig['node']), int(res_orig['vmid']), str(res_orig['type']), None)
-            for vm_key_tuple_iter, vm_snapshots_list_for_vm in snapshots_by_vm.items():
-                current_snap_from_api_list_iter: List[SnapshotDetailType] = original_snapshots_for_current_check.get(vm_key_tuple_iter, [])
-                current_snap_obj_iter: Optional[SnapshotDetailType] = next((s for s in current_snap_from_api_list_iter if str(s.get('snap_name','')).lower() == 'current'), None)
-                active_ancestors_names_set: set[str] = set(); current_parent_name_str: Optional[str] = None
-                if current_snap_obj_iter and current_snap_obj_iter.get('parent'):
-                    current_parent_name_str = str(current_snap_obj_iter.get('parent')); temp_parent_name_str: Optional[str] = current_parent_name_str
-                    all_snaps_for_this_vm_map_with_current_iter: Dict[str, SnapshotDetailType] = {str(s.get('snap_name','')): s for s in current_snap_from_api_list_iter if s.get('snap_name')}
-                    while temp_parent_name_str and temp_parent_name_str in all_snaps_for_this_vm_map_with_current_iter:
-                        active_ancestors_names_set.add(temp_parent_name_str); parent_obj_iter: Optional[SnapshotDetailType] = all_snaps_for_this_vm_map_with_current_iter.get(temp_parent_name_str)
-                        if not parent_obj_iter: break
-                        temp_parent_name_str = str(parent_obj_iter.get('parent')) if parent_obj_iter.get('parent') else None
-                for snap_to_check_iter in vm_snapshots_list_for_vm:
-                    if snap_to_check_iter.get('is_old') and not snap_to_check_iter.get('parent'):
-                        snap_name_str_check: str = str(snap_to_check_iter.get('snap_name',''))
-                        if snap_name_str_check != current_parent_name_str and snap_name_str_check not in active_ancestors_names_set:
-                            snap_to_check_iter['is_orphaned_old_root'] = True
-            processed_snapshots_for_display: List[SnapshotDetailType] = []; max_date_obj_filter_val: Optional[DateType] = None
-            if max_date_filter_req:
-                try: max_date_obj_filter_val = datetime.strptime(max_date_filter_req, "%Y-%m-%d").date()
-                except ValueError: max_date_obj_filter_val = None
-            temp_orphaned_count: int = 0
-            for vm_key_from_map_iter_disp, snaps_in_vm_iter_disp in snapshots_by_vm.items():
-                for s_processed_iter_disp in snaps_in_vm_iter_disp:
-                    include_in_final_list_bool_disp: bool = True; s_processed_time_unix_disp: Optional[int] = s_processed_iter_disp.get('create_time_unix')
-                    if max_date_obj_filter_val and s_processed_time_unix_disp:
-                        snap_date_val_disp: DateType = datetime.fromtimestamp(s_processed_time_unix_disp, tz=timezone.utc).date()
-                        if snap_date_val_disp > max_date_obj_filter_val: include_in_final_list_bool_disp = False
-                    if include_in_final_list_bool_disp:
-                        processed_snapshots_for_display.append(s_processed_iter_disp)
-                        if s_processed_iter_disp.get('is_orphaned_old_root'): temp_orphaned_count += 1
-            orphaned_old_root_snapshot_count = temp_orphaned_count; underutilized_vms_count = 0
-            for vm_iter_template_counts in all_qemu_vms_with_state_for_template:
-                if vm_iter_template_counts.get('is_underutilized'): underutilized_vms_count +=1
-                vm_iter_template_counts['is_potentially_idle'] = False
-                if str(vm_iter_template_counts.get('status','')).lower() == 'stopped':
-                    vm_snaps_for_idle_list_counts: List[SnapshotDetailType] = [s_idle_c for s_idle_c in snapshots_list_raw_unfiltered_no_current if str(s_idle_c.get('node')) == str(vm_iter_template_counts.get('node')) and str(s_idle_c.get('vmid')) == str(vm_iter_template_counts.get('vmid')) and s_idle_c.get('create_time_unix') is not None]
-                    if vm_snaps_for_idle_list_counts:
-                        valid_snap_times_counts = [s_val_c['create_time_unix'] for s_val_c in vm_snaps_for_idle_list_counts if s_val_c.get('create_time_unix') is not None]
-                        if valid_snap_times_counts:
-                            latest_snap_time_val_counts: int = max(valid_snap_times_counts)
-                            age_latest_snap_val_counts: timedelta = now_utc - datetime.fromtimestamp(latest_snap_time_val_counts, tz=timezone.utc)
-                            if age_latest_snap_val_counts.days > idle_vm_threshold_days_val: vm_iter_template_counts['is_potentially_idle'] = True
-            idle_vms_count = sum(1 for vm_data_iter_counts in all_qemu_vms_with_state_for_template if vm_data_iter_counts.get('is_potentially_idle'))
-            reverse_order_bool: bool = (order_req == 'desc')
-            if not processed_snapshots_for_display: snapshots_list_final = []
-            else:
-                if sort_by_req == 'name': snapshots_list_final = sorted(processed_snapshots_for_display, key=lambda x_sort: str(x_sort.get('snap_name','')).lower(), reverse=reverse_order_bool)
-                elif sort_by_req == 'resource': snapshots_list_final = sorted(processed_snapshots_for_display, key=lambda x_sort: (str(x_sort.get('resource_name', '')).lower(), x_sort.get('create_time_unix', float('-inf' if reverse_order_bool else 'inf'))), reverse=reverse_order_bool)
-                else: snapshots_list_final = sorted(processed_snapshots_for_display, key=lambda x_sort: (x_sort.get('create_time_unix') is None, x_sort.get('create_time_unix', float('-inf' if reverse_order_bool else 'inf'))), reverse=reverse_order_bool)
-        except Exception as e: print(f"Ana sayfada veri alınırken hata: {e}, {type(e)}"); import traceback; traceback.print_exc(); error_message = f"Veri alınırken bir hata oluştu: {str(e)}"
-    else: error_message = "Proxmox VE sunucusuna bağlanılamadı."
+    dashboard: DashboardPage = DashboardPage(prox_conn, old_snapshot_days_threshold_val, idle_vm_threshold_days_val, max_date_filter_req, sort_by_req, order_req)
     current_params_for_template = {k: (str(v) if v is not None else '') for k, v in current_params.items()}
-    return render_template('index.html', snapshots=snapshots_list_final, all_qemu_vms=all_qemu_vms_with_state_for_template, underutilized_vms_count=underutilized_vms_count, idle_vms_count=idle_vms_count, orphaned_old_root_snapshot_count=orphaned_old_root_snapshot_count, idle_vm_threshold_days=idle_vm_threshold_days_val, cpu_suggestion_threshold=CPU_SUGGESTION_THRESHOLD_PERCENT, ram_suggestion_threshold=RAM_SUGGESTION_THRESHOLD_PERCENT, history_max_len=HISTORY_MAX_LEN, performance_history_data=PERFORMANCE_HISTORY, error=error_message, current_params=current_params_for_template, current_max_date=str(current_params_for_template.get('max_date','')), sort_by=str(current_params_for_template.get('sort_by','date')), order=str(current_params_for_template.get('order','desc')), current_old_days=int(str(current_params_for_template.get('old_days','30'))))
+    template_context: Dict[str, Any] = dict(dashboard=dashboard, idle_vm_threshold_days=idle_vm_threshold_days_val, cpu_suggestion_threshold=CPU_SUGGESTION_THRESHOLD_PERCENT,
+                                            ram_suggestion_threshold=RAM_SUGGESTION_THRESHOLD_PERCENT, sparkline_points=SPARKLINE_POINTS,
+                                            current_params=current_params_for_template, current_max_date=str(current_params_for_template.get('max_date','')),
+                                            sort_by=str(current_params_for_template.get('sort_by','date')), order=str(current_params_for_template.get('order','desc')),
+                                            current_old_days=int(str(current_params_for_template.get('old_days','30'))))
+    if not DASHBOARD_STREAMING or request.args.get('stream', '').lower() in ['false', '0', 'f']: return render_template('index.html', **template_context)
+    get_flashed_messages(with_categories=True) # Flash mesajları başlıklar gönderilmeden oturumdan alınmalı; şablon aynı istekte önbellekten okur
+    response: Response = Response(stream_template('index.html', **template_context), mimetype='text/html')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/snapshots', methods=['GET'])
+def api_snapshots() -> Any:
+    """İmleçli snapshot sayfaları.
+
+    Parametreler: sort_by (date|name|resource), order (asc|desc), limit, cursor, node, vmid, type (qemu|lxc), orphaned, stopped_vm,
+    old (true/false bayraklar), older_than_days, max_date (YYYY-MM-DD), old_days ve kataloğu Proxmox'tan tazelemek için refresh.
+    """
+    is_true: Callable[[str], bool] = lambda name: request.args.get(name, '').lower() in ['true', '1', 't']
+    old_days: int = parse_old_days_arg(request.args.get('old_days')); resource_type: Optional[str] = request.args.get('type') or None
+    if resource_type not in (None, 'qemu', 'lxc'): return jsonify({"error": "Geçersiz tür; 'qemu' veya 'lxc' olmalı."}), 400
+    try:
+        limit: int = max(1, min(SNAPSHOT_PAGE_MAX_SIZE, int(request.args.get('limit', SNAPSHOT_PAGE_SIZE))))
+        vmid: Optional[int] = int(request.args['vmid']) if request.args.get('vmid') else None
+        older_than_days: Optional[int] = int(request.args['older_than_days']) if request.args.get('older_than_days') else None
+    except ValueError: return jsonify({"error": "limit, vmid ve older_than_days tam sayı olmalı."}), 400
+    catalog: Optional[SnapshotCatalog] = None if is_true('refresh') else SNAPSHOT_CATALOGS.cached(old_days)
+    if catalog is None:
+        prox_conn: Optional[ProxmoxAPI] = connect_to_proxmox()
+        if not prox_conn: return jsonify({"error": "Proxmox VE sunucusuna bağlanılamadı."}), 503
+        try:
+            all_resources: List[VMDetailType] = get_all_vms_and_containers_with_initial_perf(prox_conn)
+            catalog = SNAPSHOT_CATALOGS.get(all_resources, SNAPSHOT_INDEX.refresh(prox_conn, all_resources), old_days)
+        except Exception as e: print(f"Snapshot kataloğu oluşturulurken hata: {e}"); invalidate_proxmox_on_auth_error(e); return jsonify({"error": f"Snapshot verileri alınamadı: {e}"}), 500
+    flags: Tuple[str, ...] = tuple(flag for flag in ('orphaned', 'stopped_vm', 'old') if is_true(flag))
+    try: page: Dict[str, Any] = catalog.query(sort_by=request.args.get('sort_by', 'date'), order=request.args.get('order', 'desc'), limit=limit, cursor=request.args.get('cursor') or None, node=request.args.get('node') or None,
+                                             vmid=vmid, resource_type=resource_type, flags=flags, older_than_days=older_than_days, max_date_ts=parse_max_date_cutoff(request.args.get('max_date')))
+    except ValueError as e: return jsonify({"error": str(e)}), 400
+    return jsonify({**page, "old_days": old_days, "generated_at": datetime.fromtimestamp(catalog.now_ts, tz=timezone.utc).isoformat()})
 
 @app.route('/api/live_vm_performance', methods=['GET'])
 def api_live_vm_performance() -> Any:
-    global PERFORMANCE_HISTORY, CACHED_VM_CONFIGS; prox_conn: Optional[ProxmoxAPI] = connect_to_proxmox(); live_performance_data_response: Dict[str, VMDetailType] = {}
-    if not prox_conn: return jsonify({"error": "Proxmox VE sunucusuna bağlanılamadı."}), 503
-    vms_to_update_keys: List[VMKeyType] = list(PERFORMANCE_HISTORY.keys())
-    for vm_key_api in vms_to_update_keys:
-        node_name_api, vmid_int_api = vm_key_api; vmid_str_api: str = str(vmid_int_api)
-        if vm_key_api not in PERFORMANCE_HISTORY: PERFORMANCE_HISTORY[vm_key_api] = {'history': {'cpu': deque(maxlen=HISTORY_MAX_LEN), 'ram': deque(maxlen=HISTORY_MAX_LEN)}, 'status_text': 'unknown'}
-        vm_perf_hist_api: PerfCPURAMHistoryType = PERFORMANCE_HISTORY[vm_key_api]['history'] # type: ignore
-        vm_config_api: Optional[VMConfigValueType] = CACHED_VM_CONFIGS.get(vmid_str_api)
-        if not vm_config_api or vm_config_api.get('type') != 'qemu': continue
-        perf_data_api: Optional[VMDetailType] = get_vm_current_status(prox_conn, node_name_api, vmid_int_api)
-        if perf_data_api:
-            history_count_val_api = perf_data_api.get('history_count', 0)
-            api_vm_data_dict: VMDetailType = {'status': perf_data_api.get('status'), 'cpu_usage_percent': perf_data_api.get('cpu_usage_percent'), 'ram_usage_percent': perf_data_api.get('ram_usage_percent'), 'avg_cpu_usage_percent': perf_data_api.get('avg_cpu_usage_percent'), 'max_cpu_usage_percent': perf_data_api.get('max_cpu_usage_percent'), 'avg_ram_usage_percent': perf_data_api.get('avg_ram_usage_percent'), 'max_ram_usage_percent': perf_data_api.get('max_ram_usage_percent'), 'cpu_history': list(vm_perf_hist_api['cpu']), 'ram_history': list(vm_perf_hist_api['ram']), 'diskread_Bps': perf_data_api.get('diskread_Bps'), 'diskwrite_Bps': perf_data_api.get('diskwrite_Bps'), 'netin_Bps': perf_data_api.get('netin_Bps'), 'netout_Bps': perf_data_api.get('netout_Bps')}
-            temp_suggestion_data_api: VMDetailType = {**api_vm_data_dict, 'current_vcpu': vm_config_api.get('current_vcpu'), 'current_ram_mb': vm_config_api.get('current_ram_mb'), 'history_count': history_count_val_api}
-            updated_suggestion_data_api: VMDetailType = calculate_right_sizing_suggestions(temp_suggestion_data_api)
-            api_vm_data_dict['is_underutilized'] = updated_suggestion_data_api.get('is_underutilized', False); api_vm_data_dict['right_sizing_suggestion'] = updated_suggestion_data_api.get('right_sizing_suggestion', '')
-            live_performance_data_response[vmid_str_api] = api_vm_data_dict
-        else:
-            error_status_api: str = str(PERFORMANCE_HISTORY.get(vm_key_api, {}).get('status_text', 'error_unknown'))
-            live_performance_data_response[vmid_str_api] = {'status': error_status_api, 'cpu_usage_percent': 0.0,'ram_usage_percent': 0.0, 'avg_cpu_usage_percent': None, 'max_cpu_usage_percent': None, 'avg_ram_usage_percent': None, 'max_ram_usage_percent': None, 'is_underutilized': False, 'right_sizing_suggestion': '', 'cpu_history': [], 'ram_history': [], 'diskread_Bps': None, 'diskwrite_Bps': None, 'netin_Bps': None, 'netout_Bps': None}
-            if error_status_api not in ['running', 'stopped'] and vm_key_api in PERFORMANCE_HISTORY: vm_perf_hist_api['cpu'].clear(); vm_perf_hist_api['ram'].clear()
-    return jsonify(live_performance_data_response)
+    if METRICS_COLLECTOR_ENABLED:
+        METRICS_COLLECTOR.start(); version, collected = METRICS_COLLECTOR.latest_with_version()
+        if collected is None and METRICS_COLLECTOR.run_once(): version, collected = METRICS_COLLECTOR.latest_with_version()
+        if collected is None and not METRICS_COLLECTOR.is_leader: version, collected = METRICS_COLLECTOR.wait_for_update(version, METRICS_COLLECTOR_INTERVAL_SECONDS) # Liderin ilk turunu bekle
+        if collected is None: return jsonify({"error": "Proxmox VE sunucusuna bağlanılamadı."}), 503
+        response: Response = jsonify(collected); response.set_etag(f"{METRICS_COLLECTOR.payload_origin}-{version}")
+    else:
+        prox_conn: Optional[ProxmoxAPI] = connect_to_proxmox()
+        if not prox_conn: return jsonify({"error": "Proxmox VE sunucusuna bağlanılamadı."}), 503
+        try: response = jsonify(build_live_performance_payload(prox_conn)); response.add_etag()
+        except Exception as e:
+            print(f"Canlı performans verisi alınamadı: {e}"); invalidate_proxmox_on_auth_error(e)
+            return jsonify({"error": "Canlı performans verisi alınamadı."}), 502
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/live_vm_performance/stream', methods=['GET'])
+def api_live_vm_performance_stream() -> Any:
+    """Server-Sent Events: bağlanınca tam 'snapshot', ardından her turda yalnızca değişen VM/alanları içeren 'delta' olayları."""
+    if not METRICS_COLLECTOR_ENABLED: return jsonify({"error": "Canlı akış için arka plan metrik toplayıcı kapalı."}), 503
+    METRICS_COLLECTOR.start()
+    def generate() -> Any:
+        yield "retry: 3000\n\n"
+        version, last_sent = METRICS_COLLECTOR.latest_with_version()
+        if last_sent is None: version, last_sent = METRICS_COLLECTOR.wait_for_update(version, LIVE_STREAM_KEEPALIVE_SECONDS)
+        if last_sent is not None: yield _format_sse_event("snapshot", last_sent, version)
+        stream_deadline: float = time.monotonic() + LIVE_STREAM_MAX_SECONDS
+        while time.monotonic() < stream_deadline:
+            new_version, current = METRICS_COLLECTOR.wait_for_update(version, LIVE_STREAM_KEEPALIVE_SECONDS)
+            if new_version == version or current is None: yield ": keepalive\n\n"; continue
+            if last_sent is None: yield _format_sse_event("snapshot", current, new_version)
+            else:
+                delta: Dict[str, Any] = diff_live_performance_payloads(last_sent, current)
+                if delta["changed"] or delta["removed"]: yield _format_sse_event("delta", delta, new_version)
+            version, last_sent = new_version, current
+    response: Response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'; response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def query_local_metric_history(store: SQLiteTimeSeriesStore, node_name: str, vmid: int, metric_name: str, timeframe: str, cf: str, max_points: Optional[int], require_coverage: bool) -> Optional[Dict[str, Any]]:
+    """Metrik geçmişini yerel zaman serisi deposundan okur; require_coverage ise depo aralığın başını kapsamıyorsa None döner."""
+    series_name: str = METRIC_DS_MAP[metric_name] if metric_name in METRIC_DS_MAP else metric_name
+    series_name = {"cpu": "cpu", "mem": "ram"}.get(series_name, series_name); now: float = time.time(); t0: float = now - TIMEFRAME_SECONDS[timeframe]
+    resolution: str = store.pick_resolution(t0, now, max_points or 2000, METRICS_COLLECTOR_INTERVAL_SECONDS)
+    candidate_resolutions: List[str] = ["raw", "5m", "1h"]; candidate_resolutions = candidate_resolutions[:candidate_resolutions.index(resolution) + 1][::-1]
+    try:
+        earliest: Optional[int] = None
+        for resolution in candidate_resolutions: # Henüz toplanmamış kovalar için bir alt çözünürlüğe düş
+            earliest = store.earliest_timestamp(node_name, vmid, series_name, resolution)
+            if earliest is not None: break
+        bucket_seconds: int = {"raw": int(METRICS_COLLECTOR_INTERVAL_SECONDS), "5m": 300, "1h": 3600}[resolution]
+        if earliest is None or (require_coverage and earliest > t0 + 2 * bucket_seconds): return None
+        points: List[Tuple[int, float]] = store.query(node_name, vmid, series_name, t0, now, resolution, 'max' if cf == 'MAX' else 'avg')
+    except Exception as e: print(f"Yerel metrik geçmişi okunamadı (VM {vmid}, {metric_name}): {e}"); return None
+    labels: List[int] = [ts for ts, _ in points]; values: List[Optional[float]] = [round(value, 2) for _, value in points]; total_points: int = len(labels)
+    if max_points is not None and total_points > max_points: labels, values = downsample_lttb(labels, values, max_points)
+    return {"labels": labels, "values": values, "ds_name_used": series_name, "total_points": total_points, "source": "local", "resolution": resolution}
+
+def recent_history_values(node_name: str, vmid: int, series_name: str) -> List[float]:
+    """Bellek içi kısa geçmiş; örnekleri başka bir worker topluyorsa (bu süreç lider değilse) paylaşılan zaman serisi deposundan okunur."""
+    if METRICS_COLLECTOR.is_running() and not METRICS_COLLECTOR.is_leader and TIMESERIES_STORE is not None:
+        try: return [round(value, 2) for value in TIMESERIES_STORE.load_recent(node_name, vmid, (series_name,), time.time() - HISTORY_MAX_LEN * METRICS_COLLECTOR_INTERVAL_SECONDS, HISTORY_MAX_LEN).get(series_name, [])]
+        except Exception as e: print(f"VM {vmid} kısa geçmişi kalıcı depodan okunamadı: {e}")
+    with PERF_HISTORY_LOCK:
+        vm_history: Optional[VMPerformanceHistory] = PERFORMANCE_HISTORY.get((node_name, vmid))
+        return vm_history.series[series_name].values() if vm_history else []
 
 @app.route('/api/vm_metric_history/<int:vmid>/<metric_name>', methods=['GET'])
 def api_vm_metric_history(vmid: int, metric_name: str) -> Any:
@@ -355,20 +1278,33 @@ def api_vm_metric_history(vmid: int, metric_name: str) -> Any:
     if not prox_conn: return jsonify({"error": "Proxmox bağlantısı kurulamadı"}), 503
     timeframe: str = request.args.get('timeframe', 'hour')
     if timeframe not in ['hour', 'day', 'week', 'month', 'year']: return jsonify({"error": f"Geçersiz zaman aralığı: {timeframe}"}), 400
+    cf: str = request.args.get('cf', 'AVERAGE').upper()
+    if cf not in ['AVERAGE', 'MAX']: return jsonify({"error": f"Geçersiz konsolidasyon fonksiyonu: {cf}"}), 400
+    max_points: Optional[int] = None
+    if request.args.get('max_points'):
+        try: max_points = min(RRD_MAX_POINTS_LIMIT, int(request.args.get('max_points', '')))
+        except ValueError: return jsonify({"error": "max_points bir tamsayı olmalıdır."}), 400
+        if max_points < 3: return jsonify({"error": "max_points en az 3 olmalıdır."}), 400
+    source: str = request.args.get('source', 'auto').lower()
+    if source not in ['auto', 'proxmox', 'local']: return jsonify({"error": f"Geçersiz veri kaynağı: {source}"}), 400
     vm_config = CACHED_VM_CONFIGS.get(str(vmid))
     if not vm_config or vm_config.get('type') != 'qemu': return jsonify({"error": f"VM {vmid} bulunamadı veya QEMU değil."}), 404
     node_name: str = str(vm_config.get('node'))
     ds_name: Optional[str] = METRIC_DS_MAP.get(metric_name)
-    if metric_name == "cpu_usage_percent_short" or metric_name == "ram_usage_percent_short":
-        vm_key_hist = (node_name, vmid); history_key_hist = 'cpu' if metric_name == "cpu_usage_percent_short" else 'ram'
-        history_data_hist: Deque[float] = PERFORMANCE_HISTORY.get(vm_key_hist, {}).get('history', {}).get(history_key_hist, deque()) # type: ignore
-        return jsonify({"labels": list(range(len(history_data_hist))), "values": list(history_data_hist), "ds_name_used": metric_name})
+    if metric_name in SHORT_HISTORY_SERIES:
+        history_data_hist: List[float] = recent_history_values(node_name, vmid, SHORT_HISTORY_SERIES[metric_name])
+        return jsonify({"labels": list(range(len(history_data_hist))), "values": history_data_hist, "ds_name_used": metric_name})
     if not ds_name: return jsonify({"error": f"Bilinmeyen metrik adı: {metric_name}. METRIC_DS_MAP'i kontrol edin."}), 400
+    if source != 'proxmox' and TIMESERIES_STORE is not None:
+        local_series: Optional[Dict[str, Any]] = query_local_metric_history(TIMESERIES_STORE, node_name, vmid, metric_name, timeframe, cf, max_points, require_coverage=(source == 'auto'))
+        if local_series is not None: return jsonify(local_series)
+        if source == 'local': return jsonify({"error": f"VM {vmid} için yerel depoda '{timeframe}' aralığını kapsayan veri yok."}), 404
     labels: List[int] = []; values: List[Optional[float]] = []
     try:
-        rrd_data: List[Dict[str, Any]] = prox_conn.nodes(node_name).qemu(vmid).rrddata.get(timeframe=timeframe, cf='AVERAGE')
+        rrd_data: List[Dict[str, Any]] = get_cached_rrd_data(prox_conn, node_name, vmid, timeframe, cf)
         max_mem_bytes_for_ram_pct: Optional[float] = None
-        if ds_name == "mem":
+        # RRD 'maxmem' veri kaynağını da içerir; status.current yalnızca o yoksa çağrılır.
+        if ds_name == "mem" and not any(p.get('maxmem') for p in rrd_data):
             try: status_current = prox_conn.nodes(node_name).qemu(vmid).status.current.get(); max_mem_bytes_for_ram_pct = float(status_current.get('maxmem', 0))
             except Exception: print(f"Could not get maxmem for VM {vmid} for RAM % calculation.")
         for data_point in rrd_data:
@@ -381,15 +1317,19 @@ def api_vm_metric_history(vmid: int, metric_name: str) -> Any:
             if value is not None:
                  if ds_name == "cpu": value = round(value * 100, 2)
                  elif ds_name == "mem":
-                    if max_mem_bytes_for_ram_pct and max_mem_bytes_for_ram_pct > 0: value = round((value / max_mem_bytes_for_ram_pct) * 100, 2)
+                    point_max_mem: Optional[float] = _safe_float(data_point.get('maxmem')) or max_mem_bytes_for_ram_pct
+                    if point_max_mem and point_max_mem > 0: value = round((value / point_max_mem) * 100, 2)
                     else: value = None
                  elif "_Bps" in metric_name: value = round(value, 2)
             labels.append(timestamp); values.append(value)
-        return jsonify({"labels": labels, "values": values, "ds_name_used": ds_name})
-    except requests.exceptions.HTTPError as e_rrd:
-        if e_rrd.response and e_rrd.response.status_code == 400 and "unknown data source" in str(e_rrd.response.text).lower(): return jsonify({"error": f"RRD veri kaynağı '{ds_name}' bulunamadı (VM: {vmid}, Node: {node_name}). METRIC_DS_MAP'i kontrol edin."}), 400
-        print(f"RRD verisi çekilirken HTTP Hatası (VMID: {vmid}, Metrik: {metric_name}): {e_rrd}"); return jsonify({"error": f"RRD verisi çekilemedi: {e_rrd.response.status_code if e_rrd.response else 'Bilinmeyen HTTP Hatası'}"}), 500
-    except Exception as e_gen: print(f"RRD verisi çekilirken genel hata (VMID: {vmid}, Metrik: {metric_name}): {e_gen}"); return jsonify({"error": "RRD verisi çekilirken genel bir hata oluştu."}), 500
+        total_points: int = len(labels)
+        if max_points is not None and total_points > max_points: labels, values = downsample_lttb(labels, values, max_points)
+        return jsonify({"labels": labels, "values": values, "ds_name_used": ds_name, "total_points": total_points, "source": "proxmox"})
+    except ResourceException as e_rrd:
+        if e_rrd.status_code == 400 and "unknown data source" in str(e_rrd).lower(): return jsonify({"error": f"RRD veri kaynağı '{ds_name}' bulunamadı (VM: {vmid}, Node: {node_name}). METRIC_DS_MAP'i kontrol edin."}), 400
+        print(f"RRD verisi çekilirken API Hatası (VMID: {vmid}, Metrik: {metric_name}): {e_rrd}"); invalidate_proxmox_on_auth_error(e_rrd)
+        return jsonify({"error": f"RRD verisi çekilemedi: {e_rrd.status_code}"}), 500
+    except Exception as e_gen: print(f"RRD verisi çekilirken genel hata (VMID: {vmid}, Metrik: {metric_name}): {e_gen}"); invalidate_proxmox_on_auth_error(e_gen); return jsonify({"error": "RRD verisi çekilirken genel bir hata oluştu."}), 500
 
 @app.route('/vm_action/<node>/<int:vmid>/<action>', methods=['POST'])
 def vm_action_route(node: str, vmid: int, action: str) -> Any:
@@ -412,7 +1352,9 @@ def vm_action_route(node: str, vmid: int, action: str) -> Any:
         if hasattr(e, 'args') and e.args and isinstance(e.args[0], str): err_msg_user = e.args[0]
         response_data["message"] = f'VM {vmid} ("{vm_name}") için "{action}" hatası: {err_msg_user}'
         print(f"Exception VM {vmid} işlem {action}: {e}")
-        if hasattr(e, 'response') and e.response and hasattr(e.response, 'status_code'): print(f"API Detayı: {e.response.status_code} - {e.response.text}") # type: ignore
+        invalidate_proxmox_on_auth_error(e)
+        api_response: Optional[requests.Response] = getattr(e, 'response', None)
+        if api_response is not None: print(f"API Detayı: {api_response.status_code} - {api_response.text}")
         try: current_status_data_exc: Dict[str, Any] = prox_conn.nodes(node).qemu(vmid).status.current.get(); response_data["new_status"] = current_status_data_exc.get('status')
         except: pass
         return jsonify(response_data), 500
@@ -420,32 +1362,66 @@ def vm_action_route(node: str, vmid: int, action: str) -> Any:
 @app.route('/delete_snapshots', methods=['POST'])
 def delete_snapshots_route() -> Any:
     selected_snapshots_raw: List[str] = request.form.getlist('selected_snapshots')
-    response_data: Dict[str, Any] = {"status": "error", "message": "Bir hata oluştu.", "deleted_snapshots": [], "errors": [], "category": "error"}
+    response_data: Dict[str, Any] = {"status": "error", "message": "Bir hata oluştu.", "job_id": None, "category": "error"}
     if not selected_snapshots_raw: response_data["message"] = "Silmek için en az bir snapshot seçmelisiniz."; response_data["category"] = "warning"; return jsonify(response_data), 400
+    if not connect_to_proxmox(): response_data["message"] = "Proxmox VE sunucusuna bağlanılamadı. Snapshotlar silinemedi."; return jsonify(response_data), 503
+    job_data: Dict[str, Any] = SNAPSHOT_DELETE_QUEUE.submit(selected_snapshots_raw).as_dict()
+    response_data.update({"status": "queued", "message": f'{job_data["counts"]["total"]} snapshot için silme işi kuyruğa alındı.', "category": "info", "job_id": job_data["job_id"], "job": job_data,
+                          "progress_url": url_for('api_snapshot_job', job_id=job_data["job_id"]), "stream_url": url_for('api_snapshot_job_stream', job_id=job_data["job_id"])})
+    return jsonify(response_data), 202
+
+@app.route('/api/snapshot_jobs', methods=['GET'])
+def api_snapshot_jobs() -> Any:
+    return jsonify({"jobs": SNAPSHOT_DELETE_QUEUE.list_jobs(), "stats": SNAPSHOT_DELETE_QUEUE.snapshot_stats()})
+
+@app.route('/api/snapshot_jobs/<job_id>', methods=['GET'])
+def api_snapshot_job(job_id: str) -> Any:
+    job_data: Optional[Dict[str, Any]] = SNAPSHOT_DELETE_QUEUE.get(job_id)
+    if job_data is None: return jsonify({"error": f"Silme işi bulunamadı: {job_id}"}), 404
+    return jsonify(job_data)
+
+@app.route('/api/snapshot_jobs/<job_id>/stream', methods=['GET'])
+def api_snapshot_job_stream(job_id: str) -> Any:
+    """İşin her değişikliğini SSE 'progress' olayı olarak gönderir; iş bitince 'done' olayıyla akışı kapatır."""
+    if SNAPSHOT_DELETE_QUEUE.get(job_id) is None: return jsonify({"error": f"Silme işi bulunamadı: {job_id}"}), 404
+    def generate() -> Any:
+        last_version: int = -1; started_at: float = time.monotonic()
+        while time.monotonic() - started_at < LIVE_STREAM_MAX_SECONDS:
+            job_data: Optional[Dict[str, Any]] = SNAPSHOT_DELETE_QUEUE.wait_for_update(job_id, last_version, LIVE_STREAM_KEEPALIVE_SECONDS)
+            if job_data is None: return
+            if job_data["version"] == last_version: yield ": keepalive\n\n"; continue
+            last_version = job_data["version"]
+            if job_data["status"] not in ('queued', 'running'): yield _format_sse_event('done', job_data, last_version); return
+            yield _format_sse_event('progress', job_data, last_version)
+    response: Response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'; response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route() -> Any:
+    return Response(TELEMETRY.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/proxmox_pool_stats', methods=['GET'])
+def api_proxmox_pool_stats() -> Any:
+    return jsonify(PROXMOX_POOL.snapshot_stats())
+
+@app.route('/api/right_sizing_report', methods=['GET'])
+def api_right_sizing_report() -> Any:
     prox_conn: Optional[ProxmoxAPI] = connect_to_proxmox()
-    if not prox_conn: response_data["message"] = "Proxmox VE sunucusuna bağlanılamadı. Snapshotlar silinemedi."; return jsonify(response_data), 503
-    success_count: int = 0; error_count: int = 0
-    for snap_identifier_del in selected_snapshots_raw:
-        try:
-            parts_del: List[str] = snap_identifier_del.split('/')
-            if len(parts_del) != 4: response_data["errors"].append({"id": snap_identifier_del, "error": "Geçersiz format"}); error_count += 1; continue
-            node_snap_del: str = parts_del[0]; resource_type_snap_del: str = parts_del[1]; vmid_str_snap_del: str = parts_del[2]; snap_name_del: str = parts_del[3]; vmid_snap_del: int = int(vmid_str_snap_del)
-            target_resource_snap_del: ProxmoxNodeType = prox_conn.nodes(node_snap_del).qemu(vmid_snap_del) if resource_type_snap_del == "qemu" else prox_conn.nodes(node_snap_del).lxc(vmid_snap_del)
-            target_resource_snap_del.snapshot(snap_name_del).delete(); response_data["deleted_snapshots"].append(snap_identifier_del); success_count += 1
-        except Exception as e:
-            error_count += 1; err_msg_del: str = str(e)
-            if hasattr(e, 'args') and e.args and isinstance(e.args[0], str): err_msg_del = e.args[0]
-            if hasattr(e, 'response') and e.response and hasattr(e.response, 'status_code'): err_msg_del += f" (API: {e.response.status_code} - {e.response.text})" # type: ignore
-            response_data["errors"].append({"id": snap_identifier_del, "error": err_msg_del}); print(f"Snapshot silinirken hata ({snap_identifier_del}): {err_msg_del}")
-    if success_count > 0 and error_count == 0: response_data.update({"status": "success", "message": f'{success_count} snapshot için silme işlemi başarıyla tetiklendi.', "category": "success"})
-    elif success_count > 0 and error_count > 0: response_data.update({"status": "partial_success", "message": f'{success_count} snapshot silindi, {error_count} tanesi silinirken hata oluştu.', "category": "warning"})
-    elif error_count > 0: response_data.update({"status": "error", "message": f'{error_count} snapshot silinirken hata oluştu.', "category": "error"})
-    elif not response_data["errors"]: response_data.update({"status": "info", "message": "Silinecek uygun snapshot bulunamadı veya işlem yapılmadı.", "category": "info"})
-    return jsonify(response_data)
+    if not prox_conn: return jsonify({"error": "Proxmox bağlantısı kurulamadı"}), 503
+    if not CACHED_VM_CONFIGS: get_all_vms_and_containers_with_initial_perf(prox_conn)
+    report: Optional[Dict[str, Any]] = RIGHT_SIZING_REPORTER.latest_report()
+    if report is None or request.args.get('refresh', '').lower() in ['true', '1', 't']: report = RIGHT_SIZING_REPORTER.refresh(prox_conn)
+    elif RIGHT_SIZING_REPORTER.is_stale(): RIGHT_SIZING_REPORTER.refresh_in_background(prox_conn)
+    if report is None: return jsonify({"error": "Sağ boyutlandırma raporu oluşturulamadı."}), 500
+    only_actionable: bool = request.args.get('actionable', '').lower() in ['true', '1', 't']
+    if only_actionable: report = {**report, "guests": [row for row in report["guests"] if row['cpu_action'] or row['ram_action']]}
+    return jsonify({**report, "stats": RIGHT_SIZING_REPORTER.stats})
 
 @app.route('/about', methods=['GET'])
 def about_page() -> str:
     return render_template('about.html')
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Geliştirme sunucusu; üretimde gunicorn.conf.py ile çalıştırın (README). Hata ayıklama kipi gerekiyorsa FLASK_DEBUG=1.
+    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
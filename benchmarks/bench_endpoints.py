@@ -0,0 +1,139 @@
+"""Uygulama uç noktalarının Proxmox API simülatörüne karşı ölçümü.
+
+Kullanım: python benchmarks/bench_endpoints.py --scales 10,100,1000 --latency-ms 1 --json sonuc.json
+Her ölçek, temiz bir app modülüyle ayrı bir alt süreçte çalışır. Ölçülen senaryolar: index() (akışlı gövde sonuna kadar okunur),
+/api/live_vm_performance (toplayıcı kapalı, her istek upstream'den örnekler), /api/vm_metric_history (en fazla --history-guests
+QEMU VM'i, RRD kaynağı) ve delete_snapshots_route ile misafir başına --delete-per-guest snapshot'ın toplu silinmesi (iş bitene kadar).
+Her senaryo için soğuk ilk çalıştırmanın ve --repeat sıcak çalıştırmanın en iyisinin süresi, upstream çağrı sayısı ve tepe bellek
+raporlanır. tracemalloc süreleri birkaç kat uzattığı için tepe bellek aynı ölçekte ikinci bir alt süreçte ölçülür (--no-tracemalloc ile atlanır);
+simülatör tohumla belirlenimli olduğundan iki geçiş aynı çağrı dizisini üretir.
+--baseline önceki bir --json çıktısıyla karşılaştırır: upstream çağrı sayısı artan veya süresi --tolerance oranından fazla uzayan
+senaryo varsa çıkış kodu 1 olur (CI için).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR)); sys.path.insert(0, BENCH_DIR)
+from proxmox_simulator import ProxmoxSimulator, TREE_SHAPES  # noqa: E402
+
+RESULT_PREFIX: str = "BENCH_RESULT "
+ResultType = Dict[str, Any]
+
+
+def measure(simulator: ProxmoxSimulator, fn: Callable[[], None], trace_memory: bool) -> Tuple[float, int, Optional[float]]:
+    """(süre ms, upstream çağrı sayısı, tepe bellek MiB) döndürür."""
+    calls_before: int = simulator.total_calls()
+    if trace_memory: tracemalloc.reset_peak()
+    started: float = time.perf_counter(); fn(); elapsed_ms: float = (time.perf_counter() - started) * 1000
+    peak_mib: Optional[float] = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if trace_memory else None
+    return elapsed_ms, simulator.total_calls() - calls_before, peak_mib
+
+
+def run_scale(args: argparse.Namespace) -> List[ResultType]:
+    """Alt süreçte çalışır: ortamı simülatöre göre ayarlar, app'i içe aktarır ve senaryoları sırayla ölçer."""
+    simulator: ProxmoxSimulator = ProxmoxSimulator(nodes=args.nodes, guests=args.guests, snapshots_per_guest=args.snapshots, tree_shape=args.tree_shape,
+                                                   latency_ms=args.latency_ms, latency_jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=args.seed)
+    os.environ.update({"PROXMOX_HOST": simulator.host, "PROXMOX_USER": "root@pam", "PROXMOX_PASSWORD": "simulator", "PVEGUARD_METRICS_COLLECTOR": "False",
+                       "PVEGUARD_TSDB_PATH": "off", "PVEGUARD_STATE_BACKEND": "memory"})
+    for name in ("PROXMOX_TOKEN_NAME", "PROXMOX_TOKEN_VALUE"): os.environ.pop(name, None) # Ticket yolu (access/ticket) da ölçülsün
+    results: List[ResultType] = []; trace_memory: bool = args.trace_memory
+    if trace_memory: tracemalloc.start()
+    with simulator.patch_requests():
+        import app as pveguard_app  # noqa: E402 - ortam ayarlandıktan sonra yüklenmeli
+        pveguard_app.app.config.update(WTF_CSRF_ENABLED=False, TESTING=True); client: Any = pveguard_app.app.test_client()
+        def get(url: str) -> None:
+            response: Any = client.get(url); body: bytes = response.get_data(); response.close() # Akışlı yanıtın tamamı üretilsin
+            if response.status_code >= 400: raise RuntimeError(f"{url} -> {response.status_code}: {body[:200]!r}")
+        qemu_vmids: List[int] = [vmid for vmid, guest in simulator.guests.items() if guest.type == 'qemu'][:args.history_guests]
+        def metric_history() -> None:
+            for vmid in qemu_vmids: get(f"/api/vm_metric_history/{vmid}/cpu_usage_percent?timeframe=day&source=proxmox")
+        scenarios: List[Tuple[str, Callable[[], None]]] = [("index", lambda: get("/?old_days=30")), ("live_vm_performance", lambda: get("/api/live_vm_performance")),
+                                                           ("vm_metric_history", metric_history)]
+        for name, fn in scenarios:
+            cold_ms, cold_calls, cold_peak = measure(simulator, fn, trace_memory); warm: List[Tuple[float, int, Optional[float]]] = [measure(simulator, fn, trace_memory) for _ in range(args.repeat)]
+            best_warm: Optional[Tuple[float, int, Optional[float]]] = min(warm, key=lambda run: run[0]) if warm else None
+            results.append({"scenario": name, "guests": args.guests, "requests": len(qemu_vmids) if name == "vm_metric_history" else 1, "cold_ms": round(cold_ms, 1), "cold_upstream_calls": cold_calls,
+                            "warm_ms": round(best_warm[0], 1) if best_warm else None, "warm_upstream_calls": best_warm[1] if best_warm else None,
+                            "peak_mib": round(max([cold_peak or 0.0] + [run[2] or 0.0 for run in warm]), 2) if trace_memory else None})
+        snapshot_ids: List[str] = simulator.snapshot_ids(args.delete_per_guest); job_outcome: Dict[str, Any] = {}
+        def bulk_delete() -> None:
+            response: Any = client.post("/delete_snapshots", data={"selected_snapshots": snapshot_ids}); payload: Dict[str, Any] = response.get_json(); response.close()
+            if response.status_code != 202: raise RuntimeError(f"/delete_snapshots -> {response.status_code}: {payload}")
+            job: Optional[Dict[str, Any]] = pveguard_app.SNAPSHOT_DELETE_QUEUE.get(payload["job_id"]); deadline: float = time.monotonic() + args.delete_timeout
+            while job is not None and job["status"] in ('queued', 'running') and time.monotonic() < deadline: job = pveguard_app.SNAPSHOT_DELETE_QUEUE.wait_for_update(payload["job_id"], job["version"], 1.0)
+            job_outcome.update(job["counts"] if job else {})
+        delete_ms, delete_calls, delete_peak = measure(simulator, bulk_delete, trace_memory)
+        results.append({"scenario": "delete_snapshots", "guests": args.guests, "requests": len(snapshot_ids), "cold_ms": round(delete_ms, 1), "cold_upstream_calls": delete_calls,
+                        "warm_ms": None, "warm_upstream_calls": None, "peak_mib": round(delete_peak, 2) if delete_peak is not None else None,
+                        "deleted": job_outcome.get("done"), "errors": job_outcome.get("error")})
+    for result in results: result["errors_injected"] = simulator.errors_injected
+    return results
+
+
+def run_scale_in_subprocess(args: argparse.Namespace, guests: int, trace_memory: bool) -> List[ResultType]:
+    command: List[str] = [sys.executable, os.path.abspath(__file__), "--worker", "--guests", str(guests), "--nodes", str(args.nodes), "--snapshots", str(args.snapshots),
+                          "--tree-shape", args.tree_shape, "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms), "--error-rate", str(args.error_rate),
+                          "--repeat", str(args.repeat), "--seed", str(args.seed), "--history-guests", str(args.history_guests), "--delete-per-guest", str(args.delete_per_guest),
+                          "--delete-timeout", str(args.delete_timeout)] + (["--trace-memory"] if trace_memory else [])
+    completed: subprocess.CompletedProcess = subprocess.run(command, capture_output=True, text=True)
+    lines: List[str] = completed.stdout.splitlines(); result_lines: List[str] = [line for line in lines if line.startswith(RESULT_PREFIX)]
+    if args.verbose or completed.returncode != 0 or not result_lines: # Uygulamanın print() çıktıları yalnızca gerektiğinde gösterilir
+        sys.stderr.write('\n'.join(line for line in lines if not line.startswith(RESULT_PREFIX)) + '\n' + completed.stderr)
+    if not result_lines: raise RuntimeError(f"{guests} misafirlik ölçüm başarısız oldu (çıkış kodu {completed.returncode})")
+    return json.loads(result_lines[-1][len(RESULT_PREFIX):])
+
+
+def compare_with_baseline(results: List[ResultType], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path, encoding='utf-8') as baseline_file: baseline: Dict[Tuple[str, int], ResultType] = {(row["scenario"], row["guests"]): row for row in json.load(baseline_file)["results"]}
+    regressions: List[str] = []
+    for row in results:
+        previous: Optional[ResultType] = baseline.get((row["scenario"], row["guests"]))
+        if previous is None: continue
+        for field in ("cold_upstream_calls", "warm_upstream_calls"):
+            if row.get(field) is not None and previous.get(field) is not None and row[field] > previous[field]: regressions.append(f"{row['scenario']}@{row['guests']}: {field} {previous[field]} -> {row[field]}")
+        for field in ("cold_ms", "warm_ms"):
+            if row.get(field) is not None and previous.get(field) and row[field] > previous[field] * (1 + tolerance): regressions.append(f"{row['scenario']}@{row['guests']}: {field} {previous[field]} -> {row[field]}")
+    return regressions
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="PVEGuard uç noktalarının Proxmox API simülatörüyle ölçümü")
+    parser.add_argument('--scales', default='10,100,1000', help="Virgülle ayrılmış misafir sayıları"); parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--snapshots', type=int, default=5, help="Misafir başına snapshot"); parser.add_argument('--tree-shape', choices=TREE_SHAPES, default='mixed')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help="Upstream çağrı başına gecikme"); parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Rastgele 500 döndürülecek çağrı oranı"); parser.add_argument('--repeat', type=int, default=3, help="Sıcak çalıştırma sayısı")
+    parser.add_argument('--seed', type=int, default=42); parser.add_argument('--history-guests', type=int, default=25); parser.add_argument('--delete-per-guest', type=int, default=1)
+    parser.add_argument('--delete-timeout', type=float, default=300.0); parser.add_argument('--no-tracemalloc', action='store_true')
+    parser.add_argument('--json', help="Sonuçların yazılacağı JSON dosyası"); parser.add_argument('--baseline', help="Karşılaştırılacak önceki --json çıktısı")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Süre artışı için izin verilen oran (0.5 = %%50)"); parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS); parser.add_argument('--guests', type=int, default=10, help=argparse.SUPPRESS)
+    parser.add_argument('--trace-memory', action='store_true', help=argparse.SUPPRESS)
+    args: argparse.Namespace = parser.parse_args()
+    if args.worker: print(RESULT_PREFIX + json.dumps(run_scale(args)), flush=True); return
+    results: List[ResultType] = []
+    for guests in [int(scale) for scale in args.scales.split(',') if scale.strip()]:
+        rows: List[ResultType] = run_scale_in_subprocess(args, guests, trace_memory=False)
+        if not args.no_tracemalloc:
+            for row, traced_row in zip(rows, run_scale_in_subprocess(args, guests, trace_memory=True)): row["peak_mib"] = traced_row["peak_mib"]
+        for row in rows:
+            results.append(row); warm: str = f" | sıcak {row['warm_ms']:.1f} ms, {row['warm_upstream_calls']} çağrı" if row['warm_ms'] is not None else ''
+            extra: str = f" | silinen={row['deleted']} hata={row['errors']}" if row['scenario'] == 'delete_snapshots' else ''
+            memory: str = f" | tepe {row['peak_mib']:.1f} MiB" if row['peak_mib'] is not None else ''
+            print(f"{guests:>5} misafir {row['scenario']:<20} ({row['requests']} istek): soğuk {row['cold_ms']:.1f} ms, {row['cold_upstream_calls']} çağrı{warm}{memory}{extra}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file: json.dump({"parameters": {k: v for k, v in vars(args).items() if k not in ('worker', 'guests', 'trace_memory', 'json', 'baseline', 'verbose')}, "results": results}, json_file, indent=2)
+    if args.baseline:
+        regressions: List[str] = compare_with_baseline(results, args.baseline, args.tolerance)
+        for line in regressions: print(f"GERİLEME: {line}")
+        if regressions: sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Snapshot analiz motoru için sentetik orman ölçümü.
+
+Kullanım: python benchmarks/bench_snapshot_analysis.py --snapshots 100000 --guests 2000
+Her misafir için dallanan zincirlerden oluşan bir orman (yarısı QEMU, yarısı LXC) ve tek misafirli derin bir zincir üretilir.
+--legacy verilirse, misafir başına tüm listeyi tarayan eski idle tespiti de küçük boyutlarda karşılaştırma için ölçülür.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from snapshot_analysis import analyze_snapshots, age_in_days  # noqa: E402
+
+GuestKeyType = Tuple[str, int, str]
+
+
+def build_forest(snapshot_count: int, guest_count: int, branch_probability: float, now_ts: float, seed: int) -> Dict[GuestKeyType, List[Dict[str, Any]]]:
+    rng: random.Random = random.Random(seed); per_guest: int = max(1, snapshot_count // max(1, guest_count)); forest: Dict[GuestKeyType, List[Dict[str, Any]]] = {}
+    for guest_index in range(guest_count):
+        guest_key: GuestKeyType = (f"pve{guest_index % 16}", 100 + guest_index, 'qemu' if guest_index % 2 == 0 else 'lxc'); snaps: List[Dict[str, Any]] = []; last_name: str = ''
+        for snap_index in range(per_guest):
+            roll: float = rng.random() # Küçük bir olasılıkla ebeveynsiz yeni kök (etkin zincirin dışında kalan yetim kök adayı)
+            parent: str = '' if roll < 0.02 else snaps[rng.randrange(len(snaps))]['snap_name'] if snaps and roll < branch_probability else last_name
+            name: str = f"snap{snap_index}"; snaps.append({"snap_name": name, "parent": parent, "create_time_unix": int(now_ts - rng.randrange(0, 400 * 86400)),
+                                                        "node": guest_key[0], "vmid": guest_key[1], "resource_type": guest_key[2], "vm_status": rng.choice(('running', 'stopped'))})
+            last_name = name
+        snaps.append({"snap_name": "current", "parent": last_name or None}); forest[guest_key] = snaps
+    return forest
+
+
+def build_deep_chain(snapshot_count: int, now_ts: float) -> Dict[GuestKeyType, List[Dict[str, Any]]]:
+    snaps: List[Dict[str, Any]] = [{"snap_name": f"snap{i}", "parent": f"snap{i - 1}" if i else '', "create_time_unix": int(now_ts - (snapshot_count - i) * 60),
+                                    "node": "pve0", "vmid": 100, "resource_type": "qemu", "vm_status": "stopped"} for i in range(snapshot_count)]
+    snaps.append({"snap_name": "current", "parent": f"snap{snapshot_count - 1}"})
+    return {("pve0", 100, "qemu"): snaps}
+
+
+def legacy_idle_scan(forest: Dict[GuestKeyType, List[Dict[str, Any]]], now_ts: float, idle_days: int) -> int:
+    flat: List[Dict[str, Any]] = [s for snaps in forest.values() for s in snaps if s['snap_name'] != 'current']; idle_count: int = 0
+    for node, vmid, _ in forest:
+        times: List[int] = [s['create_time_unix'] for s in flat if str(s.get('node')) == node and str(s.get('vmid')) == str(vmid) and s.get('create_time_unix') is not None]
+        if times and age_in_days(max(times), now_ts) > idle_days: idle_count += 1
+    return idle_count
+
+
+def measure(label: str, forest: Dict[GuestKeyType, List[Dict[str, Any]]], now_ts: float, old_days: int, idle_days: int, repeat: int) -> None:
+    snapshot_total: int = sum(len(snaps) - 1 for snaps in forest.values()); best: float = float('inf')
+    for _ in range(repeat):
+        started: float = time.perf_counter(); analysis = analyze_snapshots(forest, now_ts, old_days)
+        idle_count: int = sum(1 for guest_key in forest if analysis.is_idle(guest_key, now_ts, idle_days)); best = min(best, time.perf_counter() - started)
+    max_depth: int = max((s['depth'] for s in analysis.snapshots), default=0)
+    print(f"{label}: {snapshot_total} snapshot, {len(forest)} misafir, en iyi {best * 1000:.1f} ms ({best / max(1, snapshot_total) * 1e6:.2f} µs/snapshot) | "
+          f"yetim eski kök={len(analysis.orphaned_old_roots)} bayat yaprak={len(analysis.stale_leaves)} idle={idle_count} maks. derinlik={max_depth}")
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Snapshot analiz motoru ölçümü")
+    parser.add_argument('--snapshots', type=int, default=100000); parser.add_argument('--guests', type=int, default=2000)
+    parser.add_argument('--branch-probability', type=float, default=0.2); parser.add_argument('--old-days', type=int, default=30)
+    parser.add_argument('--idle-days', type=int, default=180); parser.add_argument('--repeat', type=int, default=3); parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--legacy', action='store_true', help="Eski misafir başına tam tarama idle tespitini de ölç (yalnızca küçük boyutlarda önerilir)")
+    args: argparse.Namespace = parser.parse_args(); now_ts: float = time.time()
+    measure("Dallanan orman", build_forest(args.snapshots, args.guests, args.branch_probability, now_ts, args.seed), now_ts, args.old_days, args.idle_days, args.repeat)
+    measure("Derin zincir", build_deep_chain(args.snapshots, now_ts), now_ts, args.old_days, args.idle_days, args.repeat)
+    if args.legacy:
+        forest: Dict[GuestKeyType, List[Dict[str, Any]]] = build_forest(args.snapshots, args.guests, args.branch_probability, now_ts, args.seed)
+        started: float = time.perf_counter(); idle_count: int = legacy_idle_scan(forest, now_ts, args.idle_days)
+        print(f"Eski idle taraması: {(time.perf_counter() - started) * 1000:.1f} ms (idle={idle_count})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""Ölçümler için süreç içi Proxmox VE REST API benzetimi.
+
+PVEGuard'ın kullandığı uç noktaları (access/ticket, nodes, qemu/lxc listeleri, config, status/current, rrddata, snapshot
+GET/DELETE, görev durumu, cluster/resources ve cluster/tasks) bellekteki sentetik bir kümeden yanıtlar. patch_requests()
+bağlamı içinde simülatörün adresine giden tüm requests çağrıları (proxmoxer'ın oturum dışındaki ticket isteği dahil) ağa
+çıkmadan SimulatorAdapter'a yönlendirilir; böylece proxmoxer, bağlantı havuzu ve uygulamanın ölçüm katmanı olduğu gibi çalışır.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import requests
+
+TREE_SHAPES: Tuple[str, ...] = ('chain', 'branching', 'orphans', 'mixed')
+RRD_STEP_SECONDS: Dict[str, int] = {"hour": 60, "day": 1800, "week": 10800, "month": 43200, "year": 604800}
+RRD_POINTS: int = 70
+SnapshotType = Dict[str, Any]
+
+
+class SimulatedGuest:
+    __slots__ = ('vmid', 'node', 'type', 'name', 'status', 'cores', 'memory_mb', 'snapshots', 'current_parent', 'booted_at')
+
+    def __init__(self, vmid: int, node: str, guest_type: str, status: str, cores: int, memory_mb: int, booted_at: float) -> None:
+        self.vmid: int = vmid; self.node: str = node; self.type: str = guest_type; self.name: str = f"{'vm' if guest_type == 'qemu' else 'ct'}-{vmid}"
+        self.status: str = status; self.cores: int = cores; self.memory_mb: int = memory_mb; self.booted_at: float = booted_at
+        self.snapshots: Dict[str, SnapshotType] = {}; self.current_parent: Optional[str] = None
+
+
+class ProxmoxSimulator:
+    """Yapılandırılabilir sentetik küme: node/misafir/snapshot sayıları, snapshot ağacı biçimi, çağrı gecikmesi ve hata oranı.
+
+    `tree_shape`: 'chain' (doğrusal zincir), 'branching' (rastgele önceki snapshot'tan dallanma), 'orphans' (zincir + ebeveynsiz
+    eski kökler) veya 'mixed' (misafir başına rastgele). `error_rate` oranındaki API çağrıları (ticket hariç) 500 ile döner.
+    Her çağrı (yöntem, şablonlanmış yol) başına `calls` sayacına yazılır.
+    """
+
+    def __init__(self, nodes: int = 3, guests: int = 10, snapshots_per_guest: int = 5, tree_shape: str = 'mixed', lxc_ratio: float = 0.3,
+                 running_ratio: float = 0.7, latency_ms: float = 0.0, latency_jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 42,
+                 host: str = 'pve-sim.invalid', port: int = 8006) -> None:
+        if tree_shape not in TREE_SHAPES: raise ValueError(f"Bilinmeyen ağaç biçimi: {tree_shape}")
+        self.host: str = host; self.port: int = port; self.base_url: str = f"https://{host}:{port}/api2/json"
+        self.latency_seconds: float = max(0.0, latency_ms) / 1000; self.jitter_seconds: float = max(0.0, latency_jitter_ms) / 1000; self.error_rate: float = max(0.0, error_rate)
+        self.node_names: List[str] = [f"pve{i}" for i in range(max(1, nodes))]; self.started_at: float = time.time()
+        self._rng: random.Random = random.Random(seed); self._lock: threading.Lock = threading.Lock()
+        self.guests: Dict[int, SimulatedGuest] = {}; self.tasks: List[Dict[str, Any]] = []; self._task_seq: int = 0
+        self.calls: Counter = Counter(); self.errors_injected: int = 0
+        for index in range(guests):
+            vmid: int = 100 + index; guest_type: str = 'lxc' if self._rng.random() < lxc_ratio else 'qemu'
+            guest: SimulatedGuest = SimulatedGuest(vmid, self.node_names[index % len(self.node_names)], guest_type, 'running' if self._rng.random() < running_ratio else 'stopped',
+                                                   self._rng.choice((1, 2, 4, 8)), self._rng.choice((1024, 2048, 4096, 8192)), self.started_at - self._rng.randrange(3600, 90 * 86400))
+            shape: str = self._rng.choice(TREE_SHAPES[:3]) if tree_shape == 'mixed' else tree_shape
+            self._build_snapshot_tree(guest, snapshots_per_guest, shape); self.guests[vmid] = guest
+
+    def _build_snapshot_tree(self, guest: SimulatedGuest, count: int, shape: str) -> None:
+        names: List[str] = []; snap_time: float = self.started_at - self._rng.randrange(30, 400) * 86400
+        for index in range(count):
+            parent: Optional[str] = names[-1] if names else None
+            if shape == 'branching' and names and self._rng.random() < 0.3: parent = self._rng.choice(names)
+            elif shape == 'orphans' and self._rng.random() < 0.15: parent = None # Etkin zincirin dışında kalan kök
+            name: str = f"snap{index}"; snap_time += self._rng.randrange(1, 20) * 86400
+            guest.snapshots[name] = {"name": name, "parent": parent, "snaptime": int(min(snap_time, self.started_at - 60)), "description": f"otomatik {index}"}
+            if guest.type == 'qemu' and self._rng.random() < 0.2: guest.snapshots[name]["vmstate"] = 1
+            if parent is not None or shape != 'orphans' or not names: names.append(name)
+        guest.current_parent = names[-1] if names else None
+
+    def snapshot_ids(self, per_guest: int = 1) -> List[str]:
+        """Silme formunun beklediği 'node/type/vmid/snap' kimlikleri; misafir başına en eski `per_guest` snapshot."""
+        with self._lock:
+            return [f"{guest.node}/{guest.type}/{guest.vmid}/{name}" for guest in self.guests.values()
+                    for name in sorted(guest.snapshots, key=lambda snap_name: guest.snapshots[snap_name]['snaptime'])[:per_guest]]
+
+    def total_calls(self) -> int:
+        with self._lock: return sum(self.calls.values())
+
+    # --- İstek yönlendirme ---
+
+    def handle(self, method: str, path: str, params: Dict[str, Any]) -> Tuple[int, Any, str]:
+        """(HTTP durumu, data, reason) döndürür; `path` 'api2/json/' sonrası kısımdır."""
+        segments: List[str] = [unquote(segment) for segment in path.split('/') if segment]; template: str = self._template(segments)
+        with self._lock:
+            self.calls[(method, template)] += 1
+            inject_error: bool = template != 'access/ticket' and self.error_rate > 0 and self._rng.random() < self.error_rate
+            if inject_error: self.errors_injected += 1
+            delay: float = self.latency_seconds + (self._rng.uniform(0.0, self.jitter_seconds) if self.jitter_seconds else 0.0)
+        if delay: time.sleep(delay)
+        if inject_error: return 500, None, "simulated failure"
+        try: return self._route(method, segments, params)
+        except KeyError as e: return 500, None, f"no such object {e}"
+
+    @staticmethod
+    def _template(segments: List[str]) -> str:
+        placeholders: Dict[str, str] = {'nodes': '{node}', 'qemu': '{vmid}', 'lxc': '{vmid}', 'snapshot': '{snapname}', 'tasks': '{upid}'}; templated: List[str] = []
+        for segment in segments: templated.append(placeholders[templated[-1]] if templated and templated[-1] in placeholders else segment)
+        return '/'.join(templated)
+
+    def _route(self, method: str, segments: List[str], params: Dict[str, Any]) -> Tuple[int, Any, str]:
+        now: float = time.time()
+        if segments == ['access', 'ticket'] and method == 'POST':
+            return 200, {"username": params.get('username'), "ticket": f"PVE:{params.get('username')}:{int(now):X}::simulated", "CSRFPreventionToken": f"{int(now):X}:simulated"}, "OK"
+        if segments == ['nodes'] and method == 'GET': return 200, [{"node": node, "status": "online", "type": "node"} for node in self.node_names], "OK"
+        if segments == ['cluster', 'resources'] and method == 'GET':
+            with self._lock: guests: List[SimulatedGuest] = list(self.guests.values())
+            return 200, [self._resource_row(guest, now, cluster=True) for guest in guests if params.get('type') in (None, 'vm')], "OK"
+        if segments == ['cluster', 'tasks'] and method == 'GET':
+            with self._lock: return 200, [dict(task) for task in reversed(self.tasks[-1000:])], "OK" # Proxmox yalnızca son görevleri döndürür
+        if len(segments) < 3 or segments[0] != 'nodes' or segments[1] not in self.node_names: return 404, None, "Not Found"
+        node: str = segments[1]
+        if len(segments) == 3 and segments[2] in ('qemu', 'lxc') and method == 'GET':
+            with self._lock: guests = [guest for guest in self.guests.values() if guest.node == node and guest.type == segments[2]]
+            return 200, [self._resource_row(guest, now, cluster=False) for guest in guests], "OK"
+        if len(segments) == 5 and segments[2] == 'tasks' and segments[4] == 'status' and method == 'GET':
+            return 200, {"upid": segments[3], "node": node, "status": "stopped", "exitstatus": "OK"}, "OK"
+        if len(segments) < 5 or segments[2] not in ('qemu', 'lxc') or not segments[3].isdigit(): return 404, None, "Not Found"
+        guest: SimulatedGuest = self.guests[int(segments[3])]
+        if guest.node != node or guest.type != segments[2]: return 500, None, f"Configuration file does not exist for {segments[3]}"
+        rest: List[str] = segments[4:]
+        if rest == ['config'] and method == 'GET':
+            return 200, {"name": guest.name, "cores": guest.cores, "memory": guest.memory_mb, "digest": f"{guest.vmid:x}{guest.cores}{guest.memory_mb}"}, "OK"
+        if rest == ['status', 'current'] and method == 'GET': return 200, self._resource_row(guest, now, cluster=False), "OK"
+        if len(rest) == 2 and rest[0] == 'status' and method == 'POST':
+            guest.status = 'stopped' if rest[1] in ('shutdown', 'stop') else 'running'; return 200, self._add_task(guest, f"qm{rest[1]}" if guest.type == 'qemu' else f"vz{rest[1]}", now), "OK"
+        if rest == ['rrddata'] and method == 'GET': return 200, self._rrd_rows(guest, str(params.get('timeframe', 'hour')), now), "OK"
+        if rest == ['snapshot'] and method == 'GET':
+            with self._lock:
+                snapshots: List[SnapshotType] = [dict(snap) for snap in guest.snapshots.values()]
+                snapshots.append({"name": "current", "parent": guest.current_parent, "running": int(guest.status == 'running'), "description": "You are here!"})
+            return 200, snapshots, "OK"
+        if len(rest) == 2 and rest[0] == 'snapshot' and method == 'DELETE': return self._delete_snapshot(guest, rest[1], now)
+        return 404, None, "Not Found"
+
+    def _resource_row(self, guest: SimulatedGuest, now: float, cluster: bool) -> Dict[str, Any]:
+        running: bool = guest.status == 'running'; uptime: int = int(now - guest.booted_at) if running else 0
+        # Sayaçlar çalışma süresiyle büyür; uygulama ardışık örneklerden Bps hesaplar.
+        row: Dict[str, Any] = {"vmid": guest.vmid, "name": guest.name, "status": guest.status, "uptime": uptime, "cpu": (0.02 + (guest.vmid % 7) / 20) if running else 0.0,
+                               "mem": guest.memory_mb * 1024 * 1024 * (25 + guest.vmid % 50) // 100 if running else 0, "maxmem": guest.memory_mb * 1024 * 1024,
+                               "maxdisk": 32 * 1024 ** 3, "diskread": uptime * 40000, "diskwrite": uptime * 25000, "netin": uptime * 5000, "netout": uptime * 3000}
+        if cluster: row.update({"id": f"{guest.type}/{guest.vmid}", "type": guest.type, "node": guest.node, "maxcpu": guest.cores, "template": 0})
+        else: row["cpus"] = guest.cores
+        return row
+
+    def _rrd_rows(self, guest: SimulatedGuest, timeframe: str, now: float) -> List[Dict[str, Any]]:
+        step: int = RRD_STEP_SECONDS.get(timeframe, 60); end: int = int(now) // step * step; maxmem: int = guest.memory_mb * 1024 * 1024
+        return [{"time": end - (RRD_POINTS - 1 - i) * step, "cpu": 0.05 + 0.04 * ((guest.vmid + i) % 10) / 10, "mem": maxmem * (0.3 + 0.01 * ((guest.vmid + i) % 20)), "maxmem": maxmem,
+                 "maxcpu": guest.cores, "diskread": 1000.0 * (i % 5), "diskwrite": 800.0 * (i % 3), "netin": 300.0 + i, "netout": 200.0 + i} for i in range(RRD_POINTS)]
+
+    def _add_task(self, guest: SimulatedGuest, task_type: str, now: float) -> str:
+        with self._lock:
+            self._task_seq += 1; upid: str = f"UPID:{guest.node}:{self._task_seq:08X}:00000000:{int(now):08X}:{task_type}:{guest.vmid}:root@pam:"
+            self.tasks.append({"upid": upid, "node": guest.node, "type": task_type, "id": str(guest.vmid), "user": "root@pam", "starttime": int(now), "endtime": int(now), "status": "OK"})
+            return upid
+
+    def _delete_snapshot(self, guest: SimulatedGuest, snap_name: str, now: float) -> Tuple[int, Any, str]:
+        with self._lock:
+            removed: Optional[SnapshotType] = guest.snapshots.pop(snap_name, None)
+            if removed is None: return 500, None, f"snapshot '{snap_name}' does not exist"
+            for snap in guest.snapshots.values(): # Proxmox'taki gibi çocuklar silinen snapshot'ın ebeveynine bağlanır
+                if snap.get('parent') == snap_name: snap['parent'] = removed.get('parent')
+            if guest.current_parent == snap_name: guest.current_parent = removed.get('parent')
+        return 200, self._add_task(guest, 'qmdelsnapshot' if guest.type == 'qemu' else 'vzdelsnapshot', now), "OK"
+
+    # --- requests entegrasyonu ---
+
+    @contextmanager
+    def patch_requests(self) -> Iterator["SimulatorAdapter"]:
+        """Bağlam süresince simülatörün adresine giden tüm requests oturumlarını SimulatorAdapter'a yönlendirir."""
+        adapter: SimulatorAdapter = SimulatorAdapter(self); original_get_adapter: Any = requests.Session.get_adapter; prefix: str = f"https://{self.host}:{self.port}/"
+        def get_adapter(session: requests.Session, url: str) -> requests.adapters.BaseAdapter:
+            return adapter if url.startswith(prefix) else original_get_adapter(session, url)
+        setattr(requests.Session, "get_adapter", get_adapter) # Sınıf düzeyinde: simülasyon sırasında açılan tüm oturumlar da yönlendirilir
+        try: yield adapter
+        finally: setattr(requests.Session, "get_adapter", original_get_adapter)
+
+
+class SimulatorAdapter(requests.adapters.BaseAdapter):
+    """requests taşıma katmanı: hazırlanmış isteği ProxmoxSimulator.handle'a verir ve Proxmox biçiminde ({"data": ...}) yanıt üretir."""
+
+    def __init__(self, simulator: ProxmoxSimulator) -> None:
+        super().__init__(); self.simulator: ProxmoxSimulator = simulator
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout: Any = None, verify: Any = True, cert: Any = None, proxies: Any = None) -> requests.Response:
+        parts = urlsplit(request.url or ''); params: Dict[str, Any] = dict(parse_qsl(parts.query))
+        body: Any = request.body.decode('utf-8') if isinstance(request.body, bytes) else request.body
+        if isinstance(body, str) and body: params.update(parse_qsl(body))
+        status_code, data, reason = self.simulator.handle(str(request.method).upper(), parts.path.split('/api2/json/', 1)[-1], params)
+        response: requests.Response = requests.Response(); response.status_code = status_code; response.reason = reason; response.url = request.url or ''; response.request = request
+        response.headers['Content-Type'] = 'application/json;charset=UTF-8'; response.encoding = 'utf-8'
+        response._content = json.dumps({"data": data} if status_code < 400 else {"data": None, "errors": {"message": reason}}).encode('utf-8')
+        return response
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,31 @@
+"""PVEGuard için gunicorn yapılandırması.
+
+Kullanım: gunicorn -c gunicorn.conf.py app:app
+Worker ve thread sayısı, dinlenen adres ve zaman aşımı PVEGUARD_WORKERS, PVEGUARD_THREADS, PVEGUARD_BIND ve
+PVEGUARD_WORKER_TIMEOUT ile değiştirilebilir. Birden fazla worker varken paylaşılan durum deposu (PVEGUARD_STATE_BACKEND=sqlite)
+ve tüm worker'larda aynı APP_SECRET_KEY gerekir; .env'de tanımlı değillerse burada ayarlanır. Değişkenler master süreçte
+ayarlandığından worker'lar app'i içe aktarırken hepsi aynı değerleri görür.
+"""
+import os
+import secrets
+
+from dotenv import load_dotenv
+
+load_dotenv() # app.py de .env'i okur, ama aşağıdaki varsayılanlar .env'deki değerleri ezmemeli
+
+bind: str = os.getenv("PVEGUARD_BIND", "0.0.0.0:5000")
+workers: int = max(1, int(os.getenv("PVEGUARD_WORKERS", "2")))
+threads: int = max(1, int(os.getenv("PVEGUARD_THREADS", "8")))
+worker_class: str = "gthread" # SSE akışları ve akışlı pano bağlantı başına bir thread'i uzun süre tutar
+timeout: int = int(os.getenv("PVEGUARD_WORKER_TIMEOUT", "120"))
+graceful_timeout: int = 30
+keepalive: int = 5
+# Toplayıcı, rapor ve silme kuyruğu thread'leri app içe aktarılırken başlar; fork'tan önce başlatılan thread'ler worker'lara geçmez.
+preload_app: bool = False
+accesslog: str = "-"
+
+if workers > 1:
+    os.environ.setdefault("PVEGUARD_STATE_BACKEND", "sqlite")
+    os.environ.setdefault("APP_SECRET_KEY", secrets.token_hex(32)) # Tanımsızsa oturumlar ve CSRF token'ları yeniden başlatmaya kadar geçerli olur
+    if os.environ["PVEGUARD_STATE_BACKEND"].lower() != "sqlite":
+        print(f"Uyarı: {workers} worker ile PVEGUARD_STATE_BACKEND={os.environ['PVEGUARD_STATE_BACKEND']}; önbellekler ve metrik toplayıcı her worker'da ayrı çalışır.")
@@ -0,0 +1,131 @@
+import threading
+from array import array
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
+
+PERF_SERIES_NAMES: Tuple[str, ...] = ('cpu', 'ram', 'diskread', 'diskwrite', 'netin', 'netout')
+
+
+class RollingSeries:
+    """Önceden ayrılmış float32 dizisi üzerinde sabit kapasiteli halka tampon.
+
+    Ortalama, çalışan toplamla O(1); maksimum, pencere içindeki adayları tutan monoton bir kuyrukla amortize O(1)
+    hesaplanır. Kayan nokta birikimini sınırlamak için toplam her `capacity` eklemede bir diziden yeniden hesaplanır.
+    """
+
+    __slots__ = ('capacity', '_values', '_count', '_seq', '_sum', '_max_seqs', '_appends_since_resum')
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = max(1, int(capacity))
+        self._values: array = array('f', bytes(4 * self.capacity))
+        self._count: int = 0; self._seq: int = 0; self._sum: float = 0.0; self._appends_since_resum: int = 0
+        self._max_seqs: Deque[int] = deque()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value: float) -> None:
+        slot: int = self._seq % self.capacity
+        if self._count == self.capacity: self._sum -= self._values[slot]
+        else: self._count += 1
+        oldest_seq: int = self._seq + 1 - self._count
+        while self._max_seqs and self._max_seqs[0] < oldest_seq: self._max_seqs.popleft()
+        self._values[slot] = value; stored: float = self._values[slot]; self._sum += stored
+        while self._max_seqs and self._values[self._max_seqs[-1] % self.capacity] <= stored: self._max_seqs.pop()
+        self._max_seqs.append(self._seq); self._seq += 1
+        self._appends_since_resum += 1
+        if self._appends_since_resum >= self.capacity: self._sum = float(sum(self._ordered_raw())); self._appends_since_resum = 0
+
+    def clear(self) -> None:
+        self._count = 0; self._sum = 0.0; self._max_seqs.clear(); self._appends_since_resum = 0
+
+    def mean(self) -> Optional[float]:
+        return self._sum / self._count if self._count else None
+
+    def max(self) -> Optional[float]:
+        return float(self._values[self._max_seqs[0] % self.capacity]) if self._max_seqs else None
+
+    def last(self) -> Optional[float]:
+        return float(self._values[(self._seq - 1) % self.capacity]) if self._count else None
+
+    def _ordered_raw(self, last_n: Optional[int] = None) -> List[float]:
+        count: int = self._count if last_n is None else max(0, min(self._count, last_n))
+        if not count: return []
+        start: int = (self._seq - count) % self.capacity; end: int = start + count
+        if end <= self.capacity: return self._values[start:end].tolist()
+        return self._values[start:].tolist() + self._values[:end - self.capacity].tolist()
+
+    def values(self, last_n: Optional[int] = None, ndigits: int = 2) -> List[float]:
+        """Pencere içeriğini (veya son `last_n` örneği) eskiden yeniye, float32 kalıntılarından arındırılmış olarak döndürür."""
+        return [round(v, ndigits) for v in self._ordered_raw(last_n)]
+
+
+class VMPerformanceHistory:
+    """Bir misafirin CPU/RAM yüzdesi ve disk/ağ Bps serilerini tutan kompakt geçmiş."""
+
+    __slots__ = ('series', 'status_text', 'seq')
+
+    def __init__(self, capacity: int, series_names: Tuple[str, ...] = PERF_SERIES_NAMES) -> None:
+        self.series: Dict[str, RollingSeries] = {name: RollingSeries(capacity) for name in series_names}
+        self.status_text: str = 'unknown'; self.seq: int = 0
+
+    def __len__(self) -> int:
+        return len(self.series['cpu']) if 'cpu' in self.series else 0
+
+    def append(self, sample: Dict[str, Optional[float]]) -> None:
+        for name, value in sample.items():
+            if value is not None and name in self.series: self.series[name].append(value)
+        self.seq += 1
+
+    def clear(self) -> None:
+        for rolling_series in self.series.values(): rolling_series.clear()
+
+    def summary(self, name: str, ndigits: int = 2) -> Tuple[Optional[float], Optional[float]]:
+        rolling_series: Optional[RollingSeries] = self.series.get(name)
+        if rolling_series is None or not len(rolling_series): return None, None
+        return round(rolling_series.mean() or 0.0, ndigits), round(rolling_series.max() or 0.0, ndigits)
+
+    def preload(self, series_values: Dict[str, List[float]]) -> None:
+        """Kalıcı depodan okunan değerleri (eskiden yeniye) boş geçmişe yükler."""
+        for name, values in series_values.items():
+            if name in self.series:
+                for value in values: self.series[name].append(value)
+        self.seq += max((len(values) for values in series_values.values()), default=0)
+
+
+class CounterRateTracker:
+    """Kümülatif bayt sayaçlarından (diskread, diskwrite, netin, netout) ardışık örneklerle saniye başına hız türetir.
+
+    Proxmox liste yanıtlarındaki sayaçlar pvestatd turlarıyla (~10 sn) güncellenir; bu yüzden hız, sayaçların değiştiği iki
+    örnek arasındaki farktan hesaplanır ve sayaçlar değişmeden gelen örnekler son hızı korur. `idle_after_seconds` boyunca
+    hiç değişmeyen sayaçlar sıfır hız sayılır. Bir sayaç azalırsa (misafir yeniden başladı) taban sıfırlanır ve hız bilinmez (None) olur.
+    """
+
+    __slots__ = ('idle_after_seconds', '_state', '_lock')
+
+    def __init__(self, idle_after_seconds: float = 60.0) -> None:
+        self.idle_after_seconds: float = idle_after_seconds
+        self._state: Dict[Hashable, Tuple[float, Dict[str, float], Dict[str, Optional[float]]]] = {}; self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def update(self, key: Hashable, now: float, counters: Dict[str, float]) -> Dict[str, Optional[float]]:
+        """`now` (monoton saniye) anındaki sayaçları kaydeder ve sayaç başına Bps değerlerini döndürür; ilk örnekte hepsi None'dır."""
+        with self._lock:
+            previous: Optional[Tuple[float, Dict[str, float], Dict[str, Optional[float]]]] = self._state.get(key)
+            unknown: Dict[str, Optional[float]] = {name: None for name in counters}
+            if previous is None: self._state[key] = (now, dict(counters), unknown); return dict(unknown)
+            changed_at, base, rates = previous; elapsed: float = now - changed_at
+            if counters == base: return {name: 0.0 for name in counters} if elapsed > self.idle_after_seconds else dict(rates)
+            if elapsed <= 0 or any(value < base.get(name, 0.0) for name, value in counters.items()): self._state[key] = (now, dict(counters), unknown); return dict(unknown)
+            new_rates: Dict[str, Optional[float]] = {name: round((value - base.get(name, 0.0)) / elapsed, 2) for name, value in counters.items()}
+            self._state[key] = (now, dict(counters), new_rates); return dict(new_rates)
+
+    def forget(self, key: Hashable) -> None:
+        with self._lock: self._state.pop(key, None)
+
+    def retain(self, keys: set) -> None:
+        """Listede olmayan (silinmiş veya taşınmış) misafirlerin sayaç durumunu atar."""
+        with self._lock:
+            for key in [k for k in self._state if k not in keys]: del self._state[key]
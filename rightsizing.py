@@ -0,0 +1,109 @@
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+PERCENTILES: Tuple[int, ...] = (50, 95, 99)
+RRDRowsType = List[Dict[str, Any]]
+
+
+class RightSizingPolicy:
+    """Sağ boyutlandırma eşikleri ve pay (headroom) kuralları.
+
+    Küçültme yalnızca p95 kullanım eşik altındaysa, büyütme p95 büyütme eşiğini aştığında önerilir. Hedef kaynak,
+    p95'e pay eklenmiş değer ile p99'dan büyük olanı karşılayacak şekilde hesaplanır; böylece kısa tepeler kesilmez.
+    """
+
+    __slots__ = ('cpu_threshold_percent', 'ram_threshold_percent', 'cpu_upsize_percent', 'ram_upsize_percent', 'cpu_headroom_percent',
+                 'ram_headroom_percent', 'min_vcpu', 'min_ram_mb', 'ram_step_mb', 'min_samples')
+
+    def __init__(self, cpu_threshold_percent: float = 15.0, ram_threshold_percent: float = 25.0, cpu_upsize_percent: float = 85.0, ram_upsize_percent: float = 90.0,
+                 cpu_headroom_percent: float = 30.0, ram_headroom_percent: float = 20.0, min_vcpu: int = 1, min_ram_mb: int = 1024, ram_step_mb: int = 256, min_samples: int = 5) -> None:
+        self.cpu_threshold_percent: float = cpu_threshold_percent; self.ram_threshold_percent: float = ram_threshold_percent
+        self.cpu_upsize_percent: float = cpu_upsize_percent; self.ram_upsize_percent: float = ram_upsize_percent
+        self.cpu_headroom_percent: float = cpu_headroom_percent; self.ram_headroom_percent: float = ram_headroom_percent
+        self.min_vcpu: int = max(1, min_vcpu); self.min_ram_mb: int = max(1, min_ram_mb); self.ram_step_mb: int = max(1, ram_step_mb); self.min_samples: int = max(1, min_samples)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def merge_rrd_utilization(day_rows: RRDRowsType, week_rows: RRDRowsType, week_weight: int) -> Tuple[List[float], List[float]]:
+    """Günlük ve haftalık RRD satırlarını tek bir CPU/RAM yüzdesi serisinde birleştirir.
+
+    Haftalık satırların yalnızca günlük verinin başlamadığı eski kısmı alınır ve her biri `week_weight` kez tekrarlanır;
+    böylece farklı adımlı noktalar yüzdeliklerde kapsadıkları süre oranında ağırlık taşır. Eksik değerler NaN olur.
+    """
+    day_start: float = min((float(row['time']) for row in day_rows if row.get('time') is not None), default=math.inf)
+    cpu_values: List[float] = []; ram_values: List[float] = []
+    def add(row: Dict[str, Any], repeat: int) -> None:
+        cpu_raw: Any = row.get('cpu'); mem_raw: Any = row.get('mem'); maxmem_raw: Any = row.get('maxmem')
+        cpu_percent: float = float(cpu_raw) * 100.0 if cpu_raw is not None else math.nan
+        ram_percent: float = float(mem_raw) / float(maxmem_raw) * 100.0 if mem_raw is not None and maxmem_raw else math.nan
+        cpu_values.extend([cpu_percent] * repeat); ram_values.extend([ram_percent] * repeat)
+    for row in week_rows:
+        if row.get('time') is not None and float(row['time']) < day_start: add(row, max(1, week_weight))
+    for row in day_rows: add(row, 1)
+    return cpu_values, ram_values
+
+
+def fleet_percentiles(series_list: Sequence[Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Tüm filonun serilerini NaN ile doldurulmuş tek bir matriste toplayıp satır başına PERCENTILES değerlerini hesaplar.
+
+    (n, len(PERCENTILES)) boyutlu yüzdelik matrisi ve her satırdaki geçerli örnek sayısını döndürür; örneği olmayan satırlar NaN kalır.
+    """
+    row_count: int = len(series_list); width: int = max((len(series) for series in series_list), default=0)
+    percentiles: np.ndarray = np.full((row_count, len(PERCENTILES)), np.nan)
+    if not row_count or not width: return percentiles, np.zeros(row_count, dtype=np.int64)
+    matrix: np.ndarray = np.full((row_count, width), np.nan)
+    for row_index, series in enumerate(series_list): matrix[row_index, :len(series)] = series
+    counts: np.ndarray = np.count_nonzero(~np.isnan(matrix), axis=1); has_samples: np.ndarray = counts > 0
+    if has_samples.any(): percentiles[has_samples] = np.nanpercentile(matrix[has_samples], PERCENTILES, axis=1).T
+    return percentiles, counts
+
+
+def _target_allocation(current: np.ndarray, p95: np.ndarray, p99: np.ndarray, headroom_percent: float) -> np.ndarray:
+    demand_percent: np.ndarray = np.maximum(p95 * (1.0 + headroom_percent / 100.0), p99)
+    return current * np.nan_to_num(demand_percent, nan=100.0) / 100.0
+
+
+def compute_targets(current_vcpu: np.ndarray, current_ram_mb: np.ndarray, cpu_percentiles: np.ndarray, ram_percentiles: np.ndarray,
+                    sample_counts: np.ndarray, eligible: np.ndarray, policy: RightSizingPolicy) -> Dict[str, np.ndarray]:
+    """Tüm misafirler için vCPU/RAM hedeflerini ve eylemleri (-1 küçült, 0 yok, 1 büyüt) vektörel olarak hesaplar."""
+    p95_index: int = PERCENTILES.index(95); p99_index: int = PERCENTILES.index(99)
+    cpu_p95: np.ndarray = cpu_percentiles[:, p95_index]; cpu_p99: np.ndarray = cpu_percentiles[:, p99_index]
+    ram_p95: np.ndarray = ram_percentiles[:, p95_index]; ram_p99: np.ndarray = ram_percentiles[:, p99_index]
+    has_enough: np.ndarray = (sample_counts >= policy.min_samples) & (current_vcpu > 0) & (current_ram_mb > 0); actionable: np.ndarray = eligible & has_enough
+    target_vcpu: np.ndarray = np.maximum(policy.min_vcpu, np.ceil(_target_allocation(current_vcpu, cpu_p95, cpu_p99, policy.cpu_headroom_percent))).astype(np.int64)
+    target_ram_mb: np.ndarray = np.maximum(policy.min_ram_mb, np.ceil(_target_allocation(current_ram_mb, ram_p95, ram_p99, policy.ram_headroom_percent) / policy.ram_step_mb) * policy.ram_step_mb).astype(np.int64)
+    with np.errstate(invalid='ignore'):
+        cpu_action: np.ndarray = np.where(actionable & (cpu_p95 < policy.cpu_threshold_percent) & (target_vcpu < current_vcpu), -1, np.where(actionable & (cpu_p95 > policy.cpu_upsize_percent) & (target_vcpu > current_vcpu), 1, 0))
+        ram_action: np.ndarray = np.where(actionable & (ram_p95 < policy.ram_threshold_percent) & (target_ram_mb < current_ram_mb), -1, np.where(actionable & (ram_p95 > policy.ram_upsize_percent) & (target_ram_mb > current_ram_mb), 1, 0))
+    return {"target_vcpu": np.where(cpu_action != 0, target_vcpu, current_vcpu), "target_ram_mb": np.where(ram_action != 0, target_ram_mb, current_ram_mb),
+            "cpu_action": cpu_action, "ram_action": ram_action, "has_enough_samples": has_enough}
+
+
+def _rounded(value: float) -> Optional[float]:
+    return None if math.isnan(value) else round(float(value), 2)
+
+
+def build_right_sizing_report(guests: List[Dict[str, Any]], cpu_series: Sequence[Sequence[float]], ram_series: Sequence[Sequence[float]], policy: RightSizingPolicy) -> List[Dict[str, Any]]:
+    """`guests` (node, vmid, type, name, status, current_vcpu, current_ram_mb) ile aynı sıradaki serilerden misafir başına rapor satırları üretir."""
+    if not guests: return []
+    cpu_percentiles, cpu_counts = fleet_percentiles(cpu_series); ram_percentiles, ram_counts = fleet_percentiles(ram_series)
+    current_vcpu: np.ndarray = np.array([int(guest.get('current_vcpu') or 0) for guest in guests], dtype=np.int64)
+    current_ram_mb: np.ndarray = np.array([int(guest.get('current_ram_mb') or 0) for guest in guests], dtype=np.int64)
+    eligible: np.ndarray = np.array([guest.get('status') == 'running' for guest in guests], dtype=bool)
+    targets: Dict[str, np.ndarray] = compute_targets(current_vcpu, current_ram_mb, cpu_percentiles, ram_percentiles, np.minimum(cpu_counts, ram_counts), eligible, policy)
+    rows: List[Dict[str, Any]] = []
+    for i, guest in enumerate(guests):
+        suggestions: List[str] = []
+        if targets["cpu_action"][i]: suggestions.append(f"vCPU: {current_vcpu[i]} -> {targets['target_vcpu'][i]}")
+        if targets["ram_action"][i]: suggestions.append(f"RAM: {current_ram_mb[i]}MB -> {targets['target_ram_mb'][i]}MB")
+        rows.append({"node": guest.get('node'), "vmid": guest.get('vmid'), "type": guest.get('type', 'qemu'), "name": guest.get('name'), "status": guest.get('status'),
+                     "current_vcpu": int(current_vcpu[i]), "current_ram_mb": int(current_ram_mb[i]), "samples": int(min(cpu_counts[i], ram_counts[i])),
+                     **{f"cpu_p{p}": _rounded(cpu_percentiles[i, j]) for j, p in enumerate(PERCENTILES)}, **{f"ram_p{p}": _rounded(ram_percentiles[i, j]) for j, p in enumerate(PERCENTILES)},
+                     "target_vcpu": int(targets["target_vcpu"][i]), "target_ram_mb": int(targets["target_ram_mb"][i]),
+                     "cpu_action": int(targets["cpu_action"][i]), "ram_action": int(targets["ram_action"][i]), "has_enough_samples": bool(targets["has_enough_samples"][i]),
+                     "right_sizing_suggestion": "; ".join(suggestions)})
+    return rows
@@ -0,0 +1,113 @@
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+SnapshotType = Dict[str, Any]
+GuestKeyType = Tuple[str, int, str]
+SECONDS_PER_DAY: int = 86400
+
+
+def age_in_days(create_time_unix: float, now_ts: float) -> int:
+    """datetime farkının .days değeriyle aynı (aşağı yuvarlanmış) gün cinsinden yaş."""
+    return int((now_ts - create_time_unix) // SECONDS_PER_DAY)
+
+
+class SnapshotNode:
+    __slots__ = ('snapshot', 'name', 'parent', 'children', 'depth', 'subtree_size', 'on_active_chain')
+
+    def __init__(self, snapshot: SnapshotType) -> None:
+        self.snapshot: SnapshotType = snapshot; self.name: str = str(snapshot.get('snap_name', ''))
+        self.parent: Optional[SnapshotNode] = None; self.children: List[SnapshotNode] = []
+        self.depth: int = 0; self.subtree_size: int = 1; self.on_active_chain: bool = False
+
+
+class GuestSnapshotForest:
+    """Bir misafirin (QEMU veya LXC) snapshot ormanı.
+
+    'current' girdisi düğüm olarak eklenmez; yalnızca etkin zinciri (current'ın ebeveyninden köke giden yol) belirler.
+    Ebeveyni listede bulunmayan snapshot'lar kök sayılır. Derinlik ve alt ağaç boyutu tek bir BFS geçişiyle hesaplanır.
+    """
+
+    __slots__ = ('nodes', 'roots', 'current_parent', 'latest_create_time')
+
+    def __init__(self, snapshots: Iterable[SnapshotType]) -> None:
+        self.nodes: Dict[str, SnapshotNode] = {}; self.roots: List[SnapshotNode] = []
+        self.current_parent: Optional[str] = None; self.latest_create_time: Optional[int] = None
+        for snap in snapshots:
+            if str(snap.get('snap_name', '')).lower() == 'current':
+                self.current_parent = str(snap['parent']) if snap.get('parent') else None; continue
+            node: SnapshotNode = SnapshotNode(snap); self.nodes[node.name] = node
+            create_time: Optional[int] = snap.get('create_time_unix')
+            if create_time is not None and (self.latest_create_time is None or create_time > self.latest_create_time): self.latest_create_time = create_time
+        for node in self.nodes.values():
+            parent_name: Any = node.snapshot.get('parent'); parent_node: Optional[SnapshotNode] = self.nodes.get(str(parent_name)) if parent_name else None
+            if parent_node is not None and parent_node is not node: node.parent = parent_node; parent_node.children.append(node)
+            else: self.roots.append(node)
+        self._compute_shape(); self._mark_active_chain()
+
+    def _compute_shape(self) -> None:
+        order: List[SnapshotNode] = []; visited: set[int] = set(); queue: Deque[SnapshotNode] = deque()
+        def walk_from(start_nodes: Iterable[SnapshotNode]) -> None:
+            for start in start_nodes:
+                if id(start) not in visited: visited.add(id(start)); queue.append(start)
+            while queue:
+                node: SnapshotNode = queue.popleft(); order.append(node)
+                for child in node.children:
+                    if id(child) not in visited: visited.add(id(child)); child.depth = node.depth + 1; queue.append(child)
+        walk_from(self.roots)
+        # Ebeveyn bağları döngü oluşturuyorsa hiçbir kökten ulaşılamayan düğümler kalır; bunlar kök kabul edilip döngü kırılır.
+        for node in self.nodes.values():
+            if id(node) not in visited:
+                if node.parent is not None: node.parent.children.remove(node); node.parent = None
+                node.depth = 0; self.roots.append(node); walk_from([node])
+        for node in reversed(order):
+            if node.parent is not None: node.parent.subtree_size += node.subtree_size
+
+    def _mark_active_chain(self) -> None:
+        node: Optional[SnapshotNode] = self.nodes.get(self.current_parent) if self.current_parent else None
+        while node is not None and not node.on_active_chain: node.on_active_chain = True; node = node.parent
+
+
+def _is_old(snapshot: SnapshotType, now_ts: float, old_days: int) -> bool:
+    create_time: Optional[int] = snapshot.get('create_time_unix')
+    if not create_time: return False
+    return old_days == -1 or age_in_days(create_time, now_ts) > old_days
+
+
+class SnapshotAnalysis:
+    """analyze_snapshots() çıktısı: misafir ormanları, işaretlenmiş snapshot'lar ve özet listeler."""
+
+    __slots__ = ('forests', 'snapshots', 'orphaned_old_roots', 'stale_leaves')
+
+    def __init__(self) -> None:
+        self.forests: Dict[GuestKeyType, GuestSnapshotForest] = {}; self.snapshots: List[SnapshotType] = []
+        self.orphaned_old_roots: List[SnapshotType] = []; self.stale_leaves: List[SnapshotType] = []
+
+    def latest_snapshot_time(self, guest_key: GuestKeyType) -> Optional[int]:
+        forest: Optional[GuestSnapshotForest] = self.forests.get(guest_key)
+        return forest.latest_create_time if forest else None
+
+    def is_idle(self, guest_key: GuestKeyType, now_ts: float, idle_days: int) -> bool:
+        """En yeni snapshot'ı `idle_days` günden eski olan misafirler (snapshot'ı olmayanlar idle sayılmaz)."""
+        latest: Optional[int] = self.latest_snapshot_time(guest_key)
+        return latest is not None and age_in_days(latest, now_ts) > idle_days
+
+
+def analyze_snapshots(snapshots_by_guest: Dict[GuestKeyType, List[SnapshotType]], now_ts: float, old_days: int) -> SnapshotAnalysis:
+    """Her misafirin ('current' dahil) snapshot listesinden ormanı kurar ve snapshot sözlüklerini yerinde işaretler.
+
+    Eklenen alanlar: is_old, is_on_stopped_vm_and_old (snapshot'taki vm_status'a göre), is_orphaned_old_root (etkin zincirde
+    olmayan, ebeveynsiz eski kök), is_stale_leaf, on_active_chain, depth, subtree_size. Toplam maliyet snapshot sayısıyla doğrusaldır.
+    """
+    analysis: SnapshotAnalysis = SnapshotAnalysis()
+    for guest_key, guest_snapshots in snapshots_by_guest.items():
+        forest: GuestSnapshotForest = GuestSnapshotForest(guest_snapshots); analysis.forests[guest_key] = forest
+        for node in forest.nodes.values():
+            snap: SnapshotType = node.snapshot; is_old: bool = _is_old(snap, now_ts, old_days)
+            snap['is_old'] = is_old; snap['is_on_stopped_vm_and_old'] = is_old and str(snap.get('vm_status', '')).lower() == 'stopped'
+            snap['is_orphaned_old_root'] = is_old and not snap.get('parent') and not node.on_active_chain
+            snap['is_stale_leaf'] = is_old and not node.children and not node.on_active_chain
+            snap['on_active_chain'] = node.on_active_chain; snap['depth'] = node.depth; snap['subtree_size'] = node.subtree_size
+            analysis.snapshots.append(snap)
+            if snap['is_orphaned_old_root']: analysis.orphaned_old_roots.append(snap)
+            if snap['is_stale_leaf']: analysis.stale_leaves.append(snap)
+    return analysis
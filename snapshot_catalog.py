@@ -0,0 +1,126 @@
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from snapshot_analysis import SECONDS_PER_DAY, SnapshotAnalysis, SnapshotType
+
+SORT_FIELDS: Tuple[str, ...] = ('date', 'name', 'resource')
+SortKeyType = Tuple[Any, ...]
+MAX_SORT_KEY_SUFFIX: str = '\U0010ffff'
+SORT_KEY_TYPES: Dict[str, Tuple[type, ...]] = {'date': (int, int, str), 'name': (str, str), 'resource': (str, int, str)} # _sort_key'in ürettiği biçim
+
+
+def snapshot_id(snapshot: SnapshotType) -> str:
+    """Silme formunun ve kuyruğun kullandığı 'node/type/vmid/snap' kimliği."""
+    return f"{snapshot.get('node')}/{snapshot.get('resource_type')}/{snapshot.get('vmid')}/{snapshot.get('snap_name')}"
+
+
+def _sort_key(sort_by: str, snapshot: SnapshotType, snap_id: str) -> SortKeyType:
+    create_time: Optional[int] = snapshot.get('create_time_unix')
+    if sort_by == 'name': return (str(snapshot.get('snap_name', '')).lower(), snap_id)
+    if sort_by == 'resource': return (str(snapshot.get('resource_name', '')).lower(), create_time if create_time is not None else -1, snap_id)
+    return (0 if create_time is None else 1, create_time or 0, snap_id) # Zamanı bilinmeyenler en eski sayılır
+
+
+def encode_cursor(sort_by: str, order: str, key: SortKeyType) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_by, order, list(key)], separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_by: str, order: str) -> SortKeyType:
+    """İmleci çözer; bozuksa veya farklı bir sıralama için üretilmişse ValueError fırlatır."""
+    try: cursor_sort_by, cursor_order, key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError, ValueError) as e: raise ValueError("Geçersiz imleç") from e
+    if cursor_sort_by != sort_by or cursor_order != order or not isinstance(key, list): raise ValueError("İmleç bu sıralamaya ait değil")
+    key_types: Tuple[type, ...] = SORT_KEY_TYPES.get(sort_by, ())
+    # Biçimi uymayan anahtar bisect'te dizindeki anahtarlarla karşılaştırılamaz (TypeError); bool da int sayılmasın.
+    if len(key) != len(key_types) or any(type(part) is not part_type for part, part_type in zip(key, key_types)): raise ValueError("İmleç anahtarı bu sıralamanın biçiminde değil")
+    return tuple(key)
+
+
+class SnapshotCatalog:
+    """Analiz edilmiş snapshot kümesi üzerinde önceden sıralanmış dizinler.
+
+    Her sıralama alanı için tüm küme bir kez sıralanır; node, misafir, tür ve işaret (yetim kök, kapalı VM, eski) gruplarının
+    dizinleri bu sıralı listeden doğrusal olarak dağıtılır. Sorgu en seçici grubu seçer, tarih sınırlarını tarih sıralamasında
+    bisect ile uygular ve imleçten itibaren yalnızca sayfa kadar öğe tarar; kalan koşullar tarama sırasında denetlenir.
+    """
+
+    def __init__(self, analysis: SnapshotAnalysis, now_ts: float, old_days: int) -> None:
+        self.analysis: SnapshotAnalysis = analysis; self.now_ts: float = now_ts; self.old_days: int = old_days
+        self.snapshots: List[SnapshotType] = analysis.snapshots; self.ids: List[str] = [snapshot_id(snap) for snap in self.snapshots]
+        self._indexes: Dict[str, Dict[str, Tuple[List[SortKeyType], List[int]]]] = {}
+        facet_names: List[List[str]] = [self._facets_of(snap) for snap in self.snapshots]
+        for sort_by in SORT_FIELDS:
+            keys: List[SortKeyType] = [_sort_key(sort_by, snap, snap_id) for snap, snap_id in zip(self.snapshots, self.ids)]
+            facet_index: Dict[str, Tuple[List[SortKeyType], List[int]]] = {}
+            for position in sorted(range(len(keys)), key=keys.__getitem__):
+                for facet in facet_names[position]:
+                    facet_keys, facet_positions = facet_index.setdefault(facet, ([], [])); facet_keys.append(keys[position]); facet_positions.append(position)
+            self._indexes[sort_by] = facet_index
+
+    @staticmethod
+    def _facets_of(snap: SnapshotType) -> List[str]:
+        facets: List[str] = ['all', f"node:{snap.get('node')}", f"vmid:{snap.get('vmid')}", f"type:{snap.get('resource_type')}"]
+        if str(snap.get('vm_status', '')).lower() == 'stopped': facets.append('stopped_vm')
+        if snap.get('is_old'): facets.append('old')
+        # Tablodaki satır sınıflarıyla aynı, birbirini dışlayan uyarı kategorileri
+        if snap.get('is_orphaned_old_root'): facets.append('orphaned')
+        elif snap.get('is_on_stopped_vm_and_old'): facets.append('stopped_vm_old')
+        elif snap.get('is_old'): facets.append('old_other')
+        return facets
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def _date_range(self, facet: str, older_than_days: Optional[int], max_date_ts: Optional[float]) -> Tuple[int, int]:
+        keys: List[SortKeyType] = self._indexes['date'].get(facet, ([], []))[0]; lo: int = 0; hi: int = len(keys)
+        if older_than_days is not None: lo = bisect_left(keys, (1,)); hi = min(hi, bisect_right(keys, (1, self.now_ts - older_than_days * SECONDS_PER_DAY, MAX_SORT_KEY_SUFFIX)))
+        if max_date_ts is not None: hi = min(hi, bisect_left(keys, (1, max_date_ts, '')))
+        return lo, max(lo, hi)
+
+    def count(self, facet: str = 'all', max_date_ts: Optional[float] = None) -> int:
+        """Bir grubun (isteğe bağlı tarih sınırına kadar) boyutu; O(log n)."""
+        lo, hi = self._date_range(facet, None, max_date_ts); return hi - lo
+
+    def query(self, sort_by: str = 'date', order: str = 'desc', limit: int = 100, cursor: Optional[str] = None, node: Optional[str] = None, vmid: Optional[int] = None,
+              resource_type: Optional[str] = None, flags: Tuple[str, ...] = (), older_than_days: Optional[int] = None, max_date_ts: Optional[float] = None) -> Dict[str, Any]:
+        """Filtrelenmiş ve sıralanmış bir sayfa ile bir sonraki sayfanın imlecini döndürür.
+
+        `flags` grup adlarından oluşur ('orphaned', 'stopped_vm', 'old', 'stopped_vm_old', 'old_other'); tümü sağlanmalıdır.
+        `total` yalnızca sonuç doğrudan bir grup ve tarih aralığından hesaplanabiliyorsa doldurulur, aksi halde None'dır.
+        """
+        if sort_by not in SORT_FIELDS: sort_by = 'date'
+        order = 'asc' if order == 'asc' else 'desc'; limit = max(1, limit)
+        facets: List[str] = list(flags)
+        if node is not None: facets.append(f"node:{node}")
+        if vmid is not None: facets.append(f"vmid:{vmid}")
+        if resource_type is not None: facets.append(f"type:{resource_type}")
+        sort_index: Dict[str, Tuple[List[SortKeyType], List[int]]] = self._indexes[sort_by]
+        facet: str = min(facets, key=lambda name: len(sort_index.get(name, ([], []))[1])) if facets else 'all'
+        keys, positions = sort_index.get(facet, ([], [])); residual_facets: set[str] = set(facets) - {facet}
+        residual_dates: bool = sort_by != 'date' and (older_than_days is not None or max_date_ts is not None)
+        lo, hi = self._date_range(facet, older_than_days, max_date_ts) if sort_by == 'date' else (0, len(keys))
+        older_than_ts: Optional[float] = self.now_ts - older_than_days * SECONDS_PER_DAY if older_than_days is not None else None
+        total: Optional[int] = hi - lo if not residual_facets and not residual_dates else None
+        if cursor:
+            cursor_key: SortKeyType = decode_cursor(cursor, sort_by, order)
+            if order == 'asc': lo = max(lo, bisect_right(keys, cursor_key))
+            else: hi = min(hi, bisect_left(keys, cursor_key))
+        def matches(snap: SnapshotType) -> bool:
+            if residual_facets and not residual_facets.issubset(self._facets_of(snap)): return False
+            if residual_dates:
+                create_time: Optional[int] = snap.get('create_time_unix')
+                if older_than_ts is not None and (create_time is None or create_time > older_than_ts): return False
+                if max_date_ts is not None and create_time is not None and create_time >= max_date_ts: return False
+            return True
+        scan: Iterator[int] = iter(range(lo, hi)) if order == 'asc' else iter(range(hi - 1, lo - 1, -1))
+        items: List[SnapshotType] = []; last_key: Optional[SortKeyType] = None; has_more: bool = False
+        for i in scan:
+            snap: SnapshotType = self.snapshots[positions[i]]
+            if not (residual_facets or residual_dates) or matches(snap):
+                if len(items) == limit: has_more = True; break
+                items.append(dict(snap, id=self.ids[positions[i]])); last_key = keys[i]
+        return {"items": items, "next_cursor": encode_cursor(sort_by, order, last_key) if has_more and last_key is not None else None, "total": total,
+                "sort_by": sort_by, "order": order, "limit": limit}
@@ -0,0 +1,237 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from state_backend import StateBackend
+
+GuestKeyType = Tuple[str, int]
+LOCK_ERROR_PATTERN = re.compile(r"locked|can't lock file|got timeout", re.IGNORECASE)
+SNAPSHOT_MISSING_PATTERN = re.compile(r"snapshot '[^']*' does not exist", re.IGNORECASE)
+FINISHED_ITEM_STATES: Tuple[str, ...] = ('done', 'error')
+JOBS_NAMESPACE: str = "snapshot_jobs"
+
+
+class TaskPollError(Exception):
+    """Silme görevinin durumu art arda sorgulanamadı; silme isteği yeniden gönderilmez."""
+
+
+def _error_text(e: Exception) -> str:
+    err_msg: str = str(e)
+    if hasattr(e, 'args') and e.args and isinstance(e.args[0], str): err_msg = e.args[0]
+    return err_msg
+
+
+class SnapshotDeleteJob:
+    """Bir toplu silme isteğinin öğelerini ve ilerlemesini tutar; her değişiklik `version`'ı artırır."""
+
+    def __init__(self, job_id: str, items: List[Dict[str, Any]]) -> None:
+        self.job_id: str = job_id; self.items: List[Dict[str, Any]] = items; self.version: int = 0
+        self.created_at: str = datetime.now(timezone.utc).isoformat(); self.finished_at: Optional[str] = None
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {"total": len(self.items), "done": 0, "error": 0, "pending": 0}
+        for item in self.items: counts[item['state'] if item['state'] in FINISHED_ITEM_STATES else 'pending'] += 1
+        return counts
+
+    def status(self) -> str:
+        counts: Dict[str, int] = self.counts()
+        if counts["pending"]: return 'running' if any(item['state'] != 'queued' for item in self.items) else 'queued'
+        if counts["error"] == 0: return 'completed'
+        return 'partial' if counts["done"] else 'failed'
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"job_id": self.job_id, "status": self.status(), "version": self.version, "created_at": self.created_at, "finished_at": self.finished_at, "counts": self.counts(), "items": [dict(item) for item in self.items]}
+
+
+class SnapshotDeleteQueue:
+    """Toplu snapshot silme işlerini arka planda yürüten kuyruk.
+
+    Aynı misafirin snapshot'ları sırayla (misafir başına tek işlem), bir node'da en fazla `per_node` misafir ve toplamda
+    en fazla `max_workers` misafir aynı anda işlenir. Her silme çağrısının döndürdüğü UPID görev bitene kadar izlenir;
+    misafir kilitli olduğu için başarısız olan silmeler artan beklemeyle `lock_retries` kez yeniden denenir; yeniden denemede
+    snapshot artık yoksa önceki deneme silmiş sayılır. Görev durumu sorgulanamazsa silme yeniden gönderilmez, aynı UPID
+    `poll_error_retries` ardışık hataya kadar sorgulanmaya devam eder.
+    `state_backend` verilirse her işin son durumu "snapshot_jobs" ad alanına yazılır; böylece işi başlatmayan worker'lar da
+    işin durumunu okuyup akışını izleyebilir.
+    """
+
+    def __init__(self, get_client: Callable[[], Any], max_workers: int = 8, per_node: int = 2, lock_retries: int = 5, task_timeout_seconds: float = 900.0,
+                 poll_interval_seconds: float = 1.0, poll_error_retries: int = 5, max_jobs_kept: int = 50, on_error: Optional[Callable[[Exception], None]] = None,
+                 on_deleted: Optional[Callable[[Dict[str, Any]], None]] = None, on_retry: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 state_backend: Optional[StateBackend] = None) -> None:
+        self.get_client: Callable[[], Any] = get_client; self.max_workers: int = max(1, max_workers); self.per_node: int = max(1, per_node)
+        self.on_error: Optional[Callable[[Exception], None]] = on_error; self.on_deleted: Optional[Callable[[Dict[str, Any]], None]] = on_deleted
+        self.on_retry: Optional[Callable[[Dict[str, Any]], None]] = on_retry
+        self.lock_retries: int = max(0, lock_retries); self.task_timeout_seconds: float = task_timeout_seconds; self.poll_interval_seconds: float = poll_interval_seconds
+        self.poll_error_retries: int = max(0, poll_error_retries)
+        self.max_jobs_kept: int = max(1, max_jobs_kept); self.state_backend: Optional[StateBackend] = state_backend
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pveguard-snapdel")
+        self._lock: threading.Lock = threading.Lock(); self._update_condition: threading.Condition = threading.Condition(self._lock)
+        self._jobs: "OrderedDict[str, SnapshotDeleteJob]" = OrderedDict(); self._pending: Deque[Tuple[SnapshotDeleteJob, GuestKeyType, List[Dict[str, Any]]]] = deque()
+        self._busy_guests: set[GuestKeyType] = set(); self._in_flight_by_node: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {"jobs": 0, "deleted": 0, "errors": 0, "lock_retries": 0, "poll_retries": 0}
+
+    def submit(self, snapshot_ids: List[str]) -> SnapshotDeleteJob:
+        """'node/type/vmid/snap' biçimindeki kimlikleri bir işe dönüştürüp kuyruğa ekler; geçersiz kimlikler hata olarak işaretlenir."""
+        items: List[Dict[str, Any]] = []; batches: "OrderedDict[GuestKeyType, List[Dict[str, Any]]]" = OrderedDict()
+        for snap_identifier in dict.fromkeys(snapshot_ids):
+            parts: List[str] = snap_identifier.split('/')
+            item: Dict[str, Any] = {"id": snap_identifier, "state": "queued", "upid": None, "attempts": 0, "error": None}
+            if len(parts) != 4 or parts[1] not in ('qemu', 'lxc') or not parts[2].isdigit(): item.update({"state": "error", "error": "Geçersiz format"}); items.append(item); continue
+            item.update({"node": parts[0], "type": parts[1], "vmid": int(parts[2]), "snap_name": parts[3]}); items.append(item)
+            batches.setdefault((parts[0], int(parts[2])), []).append(item)
+        job: SnapshotDeleteJob = SnapshotDeleteJob(uuid.uuid4().hex, items)
+        with self._lock:
+            self._jobs[job.job_id] = job; self.stats["jobs"] += 1; self.stats["errors"] += len(items) - sum(len(batch) for batch in batches.values())
+            while len(self._jobs) > self.max_jobs_kept:
+                oldest_id: str = next(iter(self._jobs))
+                if self._jobs[oldest_id].status() in ('queued', 'running'): break
+                self._jobs.popitem(last=False)
+            self._prune_shared_jobs()
+            for guest_key, batch in batches.items(): self._pending.append((job, guest_key, batch))
+            if not batches: job.finished_at = datetime.now(timezone.utc).isoformat()
+            self._publish_locked(job); self._dispatch_locked()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """İşin durumunu paylaşılan depodan (yoksa bu süreçteki kayıttan) döndürür; başka worker'ın başlattığı işler de bulunur."""
+        if self.state_backend is not None:
+            job_data: Optional[Dict[str, Any]] = self.state_backend.get(JOBS_NAMESPACE, job_id)
+            if job_data is not None: return job_data
+        with self._lock:
+            job: Optional[SnapshotDeleteJob] = self._jobs.get(job_id)
+            return job.as_dict() if job else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock: job_records: List[Dict[str, Any]] = [job.as_dict() for job in self._jobs.values()]
+        if self.state_backend is not None: job_records = list({**{record["job_id"]: record for record in job_records}, **self.state_backend.get_all(JOBS_NAMESPACE)}.values())
+        job_records.sort(key=lambda record: record["created_at"], reverse=True)
+        return [{key: record[key] for key in ("job_id", "status", "created_at", "finished_at", "counts")} for record in job_records]
+
+    def wait_for_update(self, job_id: str, last_version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """İşin sürümü `last_version`'dan büyük olana veya süre dolana kadar bekler ve güncel durumunu döndürür.
+
+        Bu süreçteki işler için koşul değişkeninde beklenir; başka worker'ın yürüttüğü işler paylaşılan depodan yoklanır.
+        """
+        with self._update_condition:
+            job: Optional[SnapshotDeleteJob] = self._jobs.get(job_id)
+            if job is not None:
+                self._update_condition.wait_for(lambda: job.version > last_version, timeout=timeout)
+                return job.as_dict()
+        deadline: float = time.monotonic() + timeout
+        while True:
+            job_data: Optional[Dict[str, Any]] = self.get(job_id)
+            if job_data is None or job_data["version"] > last_version or time.monotonic() >= deadline: return job_data
+            time.sleep(min(self.poll_interval_seconds, max(0.0, deadline - time.monotonic())))
+
+    def _publish_locked(self, job: SnapshotDeleteJob) -> None:
+        """İşin güncel durumunu paylaşılan depoya yazar; depo hatası silme işini durdurmaz."""
+        if self.state_backend is None: return
+        try: self.state_backend.put(JOBS_NAMESPACE, job.job_id, job.as_dict())
+        except Exception as e: print(f"Silme işi durumu paylaşılan depoya yazılamadı ({job.job_id}): {e}")
+
+    def _prune_shared_jobs(self) -> None:
+        """Paylaşılan depoda `max_jobs_kept`'i aşan en eski bitmiş işleri siler; süren işlere dokunmaz."""
+        if self.state_backend is None: return
+        try:
+            job_records: List[Dict[str, Any]] = sorted(self.state_backend.get_all(JOBS_NAMESPACE).values(), key=lambda record: record["created_at"])
+            expired_ids: List[str] = [record["job_id"] for record in job_records[:max(0, len(job_records) + 1 - self.max_jobs_kept)] if record["status"] not in ('queued', 'running')]
+            if expired_ids: self.state_backend.delete(JOBS_NAMESPACE, expired_ids)
+        except Exception as e: print(f"Eski silme işleri paylaşılan depodan temizlenemedi: {e}")
+
+    def _touch_locked(self, job: SnapshotDeleteJob, item: Dict[str, Any], **changes: Any) -> None:
+        item.update(changes); job.version += 1
+        if job.status() not in ('queued', 'running') and job.finished_at is None: job.finished_at = datetime.now(timezone.utc).isoformat()
+        self._publish_locked(job); self._update_condition.notify_all()
+
+    def _update(self, job: SnapshotDeleteJob, item: Dict[str, Any], count: Optional[str] = None, **changes: Any) -> None:
+        """Öğeyi günceller; `count` verilirse aynı kilit altında o istatistik sayacını da artırır."""
+        with self._lock:
+            if count is not None: self.stats[count] += 1
+            self._touch_locked(job, item, **changes)
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        with self._lock: return dict(self.stats)
+
+    def _dispatch_locked(self) -> None:
+        waiting: Deque[Tuple[SnapshotDeleteJob, GuestKeyType, List[Dict[str, Any]]]] = deque()
+        in_flight_total: int = sum(self._in_flight_by_node.values())
+        while self._pending:
+            job, guest_key, batch = self._pending.popleft()
+            if in_flight_total >= self.max_workers or guest_key in self._busy_guests or self._in_flight_by_node.get(guest_key[0], 0) >= self.per_node: waiting.append((job, guest_key, batch)); continue
+            self._busy_guests.add(guest_key); self._in_flight_by_node[guest_key[0]] = self._in_flight_by_node.get(guest_key[0], 0) + 1; in_flight_total += 1
+            self._executor.submit(self._run_guest_batch, job, guest_key, batch)
+        self._pending = waiting
+
+    def _run_guest_batch(self, job: SnapshotDeleteJob, guest_key: GuestKeyType, batch: List[Dict[str, Any]]) -> None:
+        try:
+            for item in batch: self._delete_one(job, item)
+        finally:
+            with self._lock:
+                self._busy_guests.discard(guest_key); self._in_flight_by_node[guest_key[0]] -= 1
+                self._dispatch_locked()
+
+    def _connected_client(self) -> Any:
+        prox_conn: Any = self.get_client()
+        if not prox_conn: raise ConnectionError("Proxmox VE sunucusuna bağlanılamadı.")
+        return prox_conn
+
+    def _mark_deleted(self, job: SnapshotDeleteJob, item: Dict[str, Any]) -> None:
+        self._update(job, item, count="deleted", state="done", error=None)
+        if self.on_deleted:
+            try: self.on_deleted(item)
+            except Exception as e: print(f"Silme sonrası güncelleme başarısız ({item['id']}): {e}")
+
+    def _mark_failed(self, job: SnapshotDeleteJob, item: Dict[str, Any], error_text: str) -> None:
+        print(f"Snapshot silinirken hata ({item['id']}): {error_text}")
+        self._update(job, item, count="errors", state="error", error=error_text)
+
+    def _delete_one(self, job: SnapshotDeleteJob, item: Dict[str, Any]) -> None:
+        for attempt in range(self.lock_retries + 1):
+            self._update(job, item, state="deleting", attempts=attempt + 1)
+            try:
+                prox_conn: Any = self._connected_client()
+                guest: Any = prox_conn.nodes(item['node']).qemu(item['vmid']) if item['type'] == 'qemu' else prox_conn.nodes(item['node']).lxc(item['vmid'])
+                upid: str = str(guest.snapshot(item['snap_name']).delete())
+            except Exception as e:
+                error_text: str = _error_text(e)
+                if self.on_error: self.on_error(e)
+                # Kilit hatasıyla biten önceki deneme (ör. zaman aşımına uğrayan görev) snapshot'ı yine de silmiş olabilir.
+                if attempt > 0 and SNAPSHOT_MISSING_PATTERN.search(error_text): self._mark_deleted(job, item); return
+            else:
+                self._update(job, item, state="waiting_task", upid=upid)
+                try: exit_status: str = self._wait_for_task(job, item, upid)
+                except TaskPollError as e: self._mark_failed(job, item, str(e)); return
+                if exit_status == 'OK': self._mark_deleted(job, item); return
+                error_text = f"Görev başarısız: {exit_status}"
+            if attempt < self.lock_retries and LOCK_ERROR_PATTERN.search(error_text):
+                self._update(job, item, count="lock_retries", state="retry_wait", error=error_text)
+                if self.on_retry: self.on_retry(item)
+                time.sleep(min(30.0, 2.0 * 2 ** attempt)); continue
+            self._mark_failed(job, item, error_text); return
+
+    def _wait_for_task(self, job: SnapshotDeleteJob, item: Dict[str, Any], upid: str) -> str:
+        """UPID'in durumunu görev bitene kadar (giderek seyrekleşen aralıklarla) sorgular ve exitstatus'u döndürür.
+
+        Sorgu hataları silmeyi tekrarlatmaz: istemci her sorguda yeniden alınır (401 sonrası havuz yeni giriş yapar) ve aynı UPID
+        `poll_error_retries` ardışık hataya kadar izlenir; bu da aşılırsa TaskPollError yükseltilir.
+        """
+        if not upid.startswith('UPID:'): return 'OK' # Eski sürümler bazı silmeleri eşzamanlı yapıp UPID döndürmez
+        deadline: float = time.monotonic() + self.task_timeout_seconds; delay: float = self.poll_interval_seconds; poll_errors: int = 0
+        while time.monotonic() < deadline:
+            try: task_status: Dict[str, Any] = self._connected_client().nodes(item['node']).tasks(upid).status.get() or {}
+            except Exception as e:
+                if self.on_error: self.on_error(e)
+                poll_errors += 1
+                if poll_errors > self.poll_error_retries: raise TaskPollError(f"Görev durumu alınamadı ({poll_errors} deneme): {_error_text(e)}") from e
+                self._update(job, item, count="poll_retries", error=f"Görev durumu alınamadı, yeniden denenecek: {_error_text(e)}")
+                time.sleep(min(30.0, delay * 2 ** poll_errors)); continue
+            if poll_errors: poll_errors = 0; self._update(job, item, error=None)
+            if task_status.get('status') == 'stopped': return str(task_status.get('exitstatus', 'unknown'))
+            time.sleep(delay); delay = min(5.0, delay * 1.5)
+        return f"zaman aşımı ({int(self.task_timeout_seconds)} sn)"
@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, Iterator, List, MutableMapping, Optional, Tuple, TypeVar
+
+
+class StateBackend(ABC):
+    """Worker'lar arasında paylaşılan durum için ad alanı (namespace) başına anahtar/değer deposu ve liderlik kirası.
+
+    Değerler JSON'a çevrilebilir olmalıdır. get_all() bir ad alanının sonraki yazmalardan etkilenmeyen anlık görüntüsünü
+    döndürür; çağıranlar döndürülen değerleri yerinde değiştirmemeli, değişiklikleri put() ile yazmalıdır.
+    """
+
+    shared: bool = False
+
+    @abstractmethod
+    def version(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    def get_all(self, namespace: str) -> Dict[str, Any]:
+        ...
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self.get_all(namespace).get(key, default)
+
+    @abstractmethod
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, keys: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    def try_acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        """Kira boşsa, süresi dolmuşsa veya zaten `owner`'daysa `ttl_seconds` için alır/yeniler ve True döndürür."""
+        ...
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """Tek süreçlik varsayılan arka uç: düz sözlükler; kira bu süreçteki ilk sahibe verilir."""
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock(); self._data: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}; self._leases: Dict[str, Tuple[str, float]] = {}
+
+    def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def get_all(self, namespace: str) -> Dict[str, Any]:
+        with self._lock: return dict(self._data.get(namespace, {})) # put/delete sözlüğü yerinde değiştirir; okuyan kopyayı dolaşır
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock: return self._data.get(namespace, {}).get(key, default) # Tek anahtar için tüm ad alanı kopyalanmaz
+
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        with self._lock: self._data.setdefault(namespace, {})[key] = value; self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def delete(self, namespace: str, keys: Iterable[str]) -> None:
+        with self._lock:
+            entries: Dict[str, Any] = self._data.setdefault(namespace, {})
+            for key in keys: entries.pop(key, None)
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def try_acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            holder: Optional[Tuple[str, float]] = self._leases.get(name); now: float = time.time()
+            if holder is not None and holder[0] != owner and holder[1] > now: return False
+            self._leases[name] = (owner, now + ttl_seconds); return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            if self._leases.get(name, ('', 0.0))[0] == owner: del self._leases[name]
+
+
+class SQLiteStateBackend(StateBackend):
+    """Aynı makinedeki birden fazla süreç (ör. gunicorn worker'ları) için WAL kipinde SQLite arka ucu.
+
+    Her yazma ad alanının sürüm sayacını aynı işlemde artırır. Okumalar önce bu sayacı (tek satırlık bir sorgu) denetler ve
+    sürüm değişmediyse süreç içindeki çözümlenmiş görüntüyü döndürür; böylece büyük değerler yalnızca değiştiklerinde
+    yeniden okunup JSON'dan çözülür. Kiralar duvar saatiyle (time.time) tutulur ve BEGIN IMMEDIATE ile atomik alınır.
+    """
+
+    shared: bool = True
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path; self._lock: threading.Lock = threading.Lock(); self._snapshots: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self.stats: Dict[str, int] = {"reads": 0, "cache_hits": 0, "writes": 0}
+        directory: str = os.path.dirname(os.path.abspath(path))
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._conn: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL"); self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state_kv (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (namespace, key)) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state_versions (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state_leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID")
+
+    def _version_locked(self, namespace: str) -> int:
+        row: Optional[Tuple[int]] = self._conn.execute("SELECT version FROM state_versions WHERE namespace = ?", (namespace,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def version(self, namespace: str) -> int:
+        with self._lock: return self._version_locked(namespace)
+
+    def get_all(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            cached: Optional[Tuple[int, Dict[str, Any]]] = self._snapshots.get(namespace)
+            if cached is not None and cached[0] == self._version_locked(namespace): self.stats["cache_hits"] += 1; return cached[1]
+            self._conn.execute("BEGIN") # Sürüm ile satırlar aynı okuma işleminden gelsin
+            try:
+                current_version: int = self._version_locked(namespace)
+                entries: Dict[str, Any] = {key: json.loads(value) for key, value in self._conn.execute("SELECT key, value FROM state_kv WHERE namespace = ?", (namespace,))}
+            finally: self._conn.execute("COMMIT")
+            self._snapshots[namespace] = (current_version, entries); self.stats["reads"] += 1
+            return entries
+
+    def _write(self, namespace: str, statement: str, rows: List[Tuple[Any, ...]], apply_local: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous_version: int = self._version_locked(namespace); self._conn.executemany(statement, rows)
+                self._conn.execute("INSERT INTO state_versions (namespace, version) VALUES (?, 1) ON CONFLICT(namespace) DO UPDATE SET version = version + 1", (namespace,))
+                self._conn.execute("COMMIT")
+            except Exception: self._conn.execute("ROLLBACK"); raise
+            self.stats["writes"] += 1; cached: Optional[Tuple[int, Dict[str, Any]]] = self._snapshots.get(namespace)
+            # Araya başka bir sürecin yazması girmediyse görüntünün güncellenmiş bir kopyası tutulur; art arda yazmalar ad alanını
+            # yeniden okutmaz ve get_all() ile daha önce verilmiş görüntüler değişmez.
+            if cached is not None and cached[0] == previous_version: updated: Dict[str, Any] = dict(cached[1]); apply_local(updated); self._snapshots[namespace] = (previous_version + 1, updated)
+            else: self._snapshots.pop(namespace, None)
+
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        encoded: str = json.dumps(value, separators=(',', ':'))
+        self._write(namespace, "INSERT OR REPLACE INTO state_kv (namespace, key, value) VALUES (?, ?, ?)", [(namespace, key, encoded)], lambda entries: entries.__setitem__(key, json.loads(encoded)))
+
+    def delete(self, namespace: str, keys: Iterable[str]) -> None:
+        key_list: List[str] = list(keys)
+        def drop(entries: Dict[str, Any]) -> None:
+            for key in key_list: entries.pop(key, None)
+        self._write(namespace, "DELETE FROM state_kv WHERE namespace = ? AND key = ?", [(namespace, key) for key in key_list], drop)
+
+    def try_acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            now: float = time.time(); holder: Optional[Tuple[str, float]] = self._conn.execute("SELECT owner, expires_at FROM state_leases WHERE name = ?", (name,)).fetchone()
+            if holder is not None and holder[0] != owner and holder[1] > now: return False # Başkasının geçerli kirası varsa yazma kilidi alınmaz
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                holder = self._conn.execute("SELECT owner, expires_at FROM state_leases WHERE name = ?", (name,)).fetchone()
+                if holder is not None and holder[0] != owner and holder[1] > now: self._conn.execute("COMMIT"); return False
+                self._conn.execute("INSERT OR REPLACE INTO state_leases (name, owner, expires_at) VALUES (?, ?, ?)", (name, owner, now + ttl_seconds)); self._conn.execute("COMMIT")
+                return True
+            except Exception: self._conn.execute("ROLLBACK"); raise
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock: self._conn.execute("DELETE FROM state_leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def close(self) -> None:
+        with self._lock: self._conn.close()
+
+
+_MISSING: Any = object()
+V = TypeVar("V")
+
+
+class SharedMapping(MutableMapping[str, V]):
+    """Bir ad alanını sözlük gibi gösterir (ör. CACHED_VM_CONFIGS); okumalar arka ucun sürümle önbelleğe alınmış görüntüsünden yapılır."""
+
+    def __init__(self, backend: StateBackend, namespace: str) -> None:
+        self.backend: StateBackend = backend; self.namespace: str = namespace
+
+    def __getitem__(self, key: str) -> V:
+        value: Any = self.backend.get(self.namespace, key, _MISSING)
+        if value is _MISSING: raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.backend.get(self.namespace, key, default)
+
+    def __setitem__(self, key: str, value: V) -> None:
+        self.backend.put(self.namespace, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self: raise KeyError(key)
+        self.backend.delete(self.namespace, [key])
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        key_list: List[str] = list(keys)
+        if key_list: self.backend.delete(self.namespace, key_list)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.backend.get_all(self.namespace)))
+
+    def __len__(self) -> int:
+        return len(self.backend.get_all(self.namespace))
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.backend.get(self.namespace, key, _MISSING) is not _MISSING
+
+    def items(self) -> Any:
+        return list(self.backend.get_all(self.namespace).items())
+
+    def values(self) -> Any:
+        return list(self.backend.get_all(self.namespace).values())
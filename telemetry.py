@@ -0,0 +1,171 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+UPSTREAM_LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUTE_LATENCY_BUCKETS: Tuple[float, ...] = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Proxmox API'sinde bir koleksiyon adını izleyen parça o koleksiyonun öğesidir; şablonda yer tutucuyla değiştirilir.
+PATH_PARAMETERS: Dict[str, str] = {'nodes': '{node}', 'qemu': '{vmid}', 'lxc': '{vmid}', 'snapshot': '{snapname}', 'tasks': '{upid}', 'storage': '{storage}',
+                                   'pools': '{poolid}', 'content': '{volume}', 'users': '{userid}', 'groups': '{groupid}', 'roles': '{roleid}'}
+CacheStatsType = Callable[[], Dict[str, Any]]
+
+
+def template_upstream_path(url: str) -> str:
+    """'https://h:8006/api2/json/nodes/pve1/qemu/101/snapshot/s1' -> 'nodes/{node}/qemu/{vmid}/snapshot/{snapname}'."""
+    path: str = urlsplit(url).path
+    if '/api2/' in path: path = path.split('/api2/', 1)[1].partition('/')[2] # 'json/' biçim önekini at
+    segments: List[str] = [unquote(segment) for segment in path.split('/') if segment]; templated: List[str] = []
+    for segment in segments:
+        previous: Optional[str] = templated[-1] if templated else None # Şablonlanmış önceki parça; 'qemu' adlı bir node yanlış eşleşmesin
+        if previous in PATH_PARAMETERS: templated.append(PATH_PARAMETERS[previous])
+        elif segment.isdigit(): templated.append('{id}')
+        else: templated.append(segment)
+    return '/'.join(templated)
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+
+
+class Histogram:
+    """Prometheus tarzı sabit kovalı gecikme histogramı (kova sayıları kümülatif olmayan biçimde tutulur)."""
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets: Tuple[float, ...] = buckets; self.counts: List[int] = [0] * (len(buckets) + 1); self.total: float = 0.0; self.count: int = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1; self.total += seconds; self.count += 1
+
+    def render(self, name: str, labels: str, lines: List[str]) -> None:
+        prefix: str = f"{labels}," if labels else ''; cumulative: int = 0
+        for bound, bucket_count in zip(self.buckets, self.counts): cumulative += bucket_count; lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total:.6f}" if labels else f"{name}_sum {self.total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}" if labels else f"{name}_count {self.count}")
+
+
+class RequestTiming:
+    """Tek bir Flask isteği boyunca yapılan upstream çağrılarının sayısı ve süresi; isteğin başlattığı thread'ler de aynı nesneye yazar."""
+
+    __slots__ = ('started_at', 'upstream_calls', 'upstream_seconds', '_lock')
+
+    def __init__(self) -> None:
+        self.started_at: float = time.perf_counter(); self.upstream_calls: int = 0; self.upstream_seconds: float = 0.0; self._lock: threading.Lock = threading.Lock()
+
+    def add_upstream(self, seconds: float) -> None:
+        with self._lock: self.upstream_calls += 1; self.upstream_seconds += seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
+CURRENT_REQUEST_TIMING: "contextvars.ContextVar[Optional[RequestTiming]]" = contextvars.ContextVar("pveguard_request_timing", default=None)
+
+
+def run_in_request_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """fn'i çağıranın contextvars bağlamıyla çalışacak biçimde sarar; thread havuzuna verilen işlerin upstream süreleri isteğe yazılsın diye."""
+    context: contextvars.Context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class TelemetryRegistry:
+    """Upstream (Proxmox API) çağrıları, Flask rotaları ve önbellek sayaçları için süreç içi metrik kaydı.
+
+    Upstream çağrıları (yöntem, şablonlanmış yol) başına sayılır: sonuç sınıfı (2xx/4xx/5xx veya istisna sınıfı), gecikme
+    histogramı ve yeniden denemeler. Önbellekler ve bileşenler kayıt sırasında verilen istatistik fonksiyonlarıyla okunur;
+    böylece sayaçlar kendi modüllerinde kalır ve yalnızca dışa aktarılırken toplanır. Değerler süreç başınadır.
+    """
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._upstream_outcomes: Dict[Tuple[str, str, str], int] = {}; self._upstream_latency: Dict[Tuple[str, str], Histogram] = {}
+        self._upstream_retries: Dict[Tuple[str, str, str], int] = {}
+        self._route_requests: Dict[Tuple[str, str, str], int] = {}; self._route_latency: Dict[str, Histogram] = {}
+        self._route_upstream: Dict[str, List[float]] = {} # endpoint -> [upstream çağrı sayısı, upstream saniyesi]
+        self._caches: Dict[str, Tuple[CacheStatsType, str, str]] = {}; self._components: Dict[str, CacheStatsType] = {}
+
+    def observe_upstream(self, method: str, path_template: str, seconds: float, outcome: str) -> None:
+        with self._lock:
+            outcome_key: Tuple[str, str, str] = (method, path_template, outcome); self._upstream_outcomes[outcome_key] = self._upstream_outcomes.get(outcome_key, 0) + 1
+            histogram: Optional[Histogram] = self._upstream_latency.get((method, path_template))
+            if histogram is None: histogram = self._upstream_latency[(method, path_template)] = Histogram(UPSTREAM_LATENCY_BUCKETS)
+            histogram.observe(seconds)
+        timing: Optional[RequestTiming] = CURRENT_REQUEST_TIMING.get()
+        if timing is not None: timing.add_upstream(seconds)
+
+    def record_retry(self, method: str, path_template: str, reason: str) -> None:
+        with self._lock: retry_key: Tuple[str, str, str] = (method, path_template, reason); self._upstream_retries[retry_key] = self._upstream_retries.get(retry_key, 0) + 1
+
+    def observe_route(self, endpoint: str, method: str, status_code: int, timing: RequestTiming) -> None:
+        seconds: float = timing.elapsed()
+        with self._lock:
+            request_key: Tuple[str, str, str] = (endpoint, method, str(status_code)); self._route_requests[request_key] = self._route_requests.get(request_key, 0) + 1
+            histogram: Optional[Histogram] = self._route_latency.get(endpoint)
+            if histogram is None: histogram = self._route_latency[endpoint] = Histogram(ROUTE_LATENCY_BUCKETS)
+            histogram.observe(seconds); totals: List[float] = self._route_upstream.setdefault(endpoint, [0, 0.0])
+            totals[0] += timing.upstream_calls; totals[1] += timing.upstream_seconds
+
+    def register_cache(self, name: str, stats_fn: CacheStatsType, hits_key: str = 'hits', misses_key: str = 'misses') -> None:
+        self._caches[name] = (stats_fn, hits_key, misses_key)
+
+    def register_component(self, name: str, stats_fn: CacheStatsType) -> None:
+        """Sayısal alanları pveguard_component_stat{component, stat} olarak dışa aktarılacak bir bileşen (kuyruk, toplayıcı, havuz)."""
+        self._components[name] = stats_fn
+
+    def instrument_session(self, session: Any) -> None:
+        """requests.Session'ın request yöntemini örnek düzeyinde sarar; proxmoxer tüm API çağrılarını bu yöntemle yaptığından her çağrı ölçülür."""
+        if getattr(session, '_pveguard_instrumented', False): return
+        original_request: Callable[..., Any] = session.request
+        def instrumented_request(method: str, url: str, *args: Any, **kwargs: Any) -> Any:
+            path_template: str = template_upstream_path(url); started_at: float = time.perf_counter()
+            try: response: Any = original_request(method, url, *args, **kwargs)
+            except Exception as e: self.observe_upstream(method.upper(), path_template, time.perf_counter() - started_at, type(e).__name__); raise
+            self.observe_upstream(method.upper(), path_template, time.perf_counter() - started_at, f"{response.status_code // 100}xx"); return response
+        session.request = instrumented_request; session._pveguard_instrumented = True
+
+    def render_prometheus(self) -> str:
+        """Tüm metrikleri Prometheus metin biçiminde (0.0.4) döndürür."""
+        lines: List[str] = []
+        with self._lock:
+            lines += ["# HELP pveguard_upstream_requests_total Proxmox API çağrıları (sonuç: HTTP sınıfı veya istisna sınıfı).", "# TYPE pveguard_upstream_requests_total counter"]
+            lines += [f"pveguard_upstream_requests_total{{{_labels(method=method, path=path, outcome=outcome)}}} {count}" for (method, path, outcome), count in sorted(self._upstream_outcomes.items())]
+            lines += ["# HELP pveguard_upstream_request_duration_seconds Proxmox API çağrı gecikmesi.", "# TYPE pveguard_upstream_request_duration_seconds histogram"]
+            for (method, path), histogram in sorted(self._upstream_latency.items()): histogram.render("pveguard_upstream_request_duration_seconds", _labels(method=method, path=path), lines)
+            lines += ["# HELP pveguard_upstream_retries_total Yeniden denenen Proxmox API çağrıları.", "# TYPE pveguard_upstream_retries_total counter"]
+            lines += [f"pveguard_upstream_retries_total{{{_labels(method=method, path=path, reason=reason)}}} {count}" for (method, path, reason), count in sorted(self._upstream_retries.items())]
+            lines += ["# HELP pveguard_http_requests_total Flask rotalarına gelen istekler.", "# TYPE pveguard_http_requests_total counter"]
+            lines += [f"pveguard_http_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {count}" for (endpoint, method, status), count in sorted(self._route_requests.items())]
+            lines += ["# HELP pveguard_http_request_duration_seconds Flask isteklerinin (akış yanıtlarında gövde bitene kadar) süresi.", "# TYPE pveguard_http_request_duration_seconds histogram"]
+            for endpoint, histogram in sorted(self._route_latency.items()): histogram.render("pveguard_http_request_duration_seconds", _labels(endpoint=endpoint), lines)
+            lines += ["# HELP pveguard_http_request_upstream_calls_total Rota isteklerinin yaptığı toplam Proxmox API çağrısı.", "# TYPE pveguard_http_request_upstream_calls_total counter"]
+            lines += [f"pveguard_http_request_upstream_calls_total{{{_labels(endpoint=endpoint)}}} {int(totals[0])}" for endpoint, totals in sorted(self._route_upstream.items())]
+            lines += ["# HELP pveguard_http_request_upstream_seconds_total Rota isteklerinin Proxmox API'sini beklediği toplam süre.", "# TYPE pveguard_http_request_upstream_seconds_total counter"]
+            lines += [f"pveguard_http_request_upstream_seconds_total{{{_labels(endpoint=endpoint)}}} {totals[1]:.6f}" for endpoint, totals in sorted(self._route_upstream.items())]
+        cache_rows: List[Tuple[str, int, int]] = []
+        for name, (stats_fn, hits_key, misses_key) in sorted(self._caches.items()):
+            try: stats: Dict[str, Any] = stats_fn(); cache_rows.append((name, int(stats.get(hits_key) or 0), int(stats.get(misses_key) or 0)))
+            except Exception as e: print(f"Önbellek istatistikleri okunamadı ({name}): {e}")
+        lines += ["# HELP pveguard_cache_hits_total Önbellek isabetleri.", "# TYPE pveguard_cache_hits_total counter"]
+        lines += [f'pveguard_cache_hits_total{{cache="{_escape_label(name)}"}} {hits}' for name, hits, _ in cache_rows]
+        lines += ["# HELP pveguard_cache_misses_total Önbellek ıskaları.", "# TYPE pveguard_cache_misses_total counter"]
+        lines += [f'pveguard_cache_misses_total{{cache="{_escape_label(name)}"}} {misses}' for name, _, misses in cache_rows]
+        lines += ["# HELP pveguard_cache_hit_ratio İsabetlerin tüm erişimlere oranı (erişim yoksa 0).", "# TYPE pveguard_cache_hit_ratio gauge"]
+        lines += [f'pveguard_cache_hit_ratio{{cache="{_escape_label(name)}"}} {hits / (hits + misses) if hits + misses else 0.0:.6f}' for name, hits, misses in cache_rows]
+        lines += ["# HELP pveguard_component_stat Arka plan bileşenlerinin sayısal istatistikleri.", "# TYPE pveguard_component_stat gauge"]
+        for name, stats_fn in sorted(self._components.items()):
+            try: component_stats: Dict[str, Any] = stats_fn()
+            except Exception as e: print(f"Bileşen istatistikleri okunamadı ({name}): {e}"); continue
+            lines += [f"pveguard_component_stat{{{_labels(component=name, stat=stat)}}} {float(value):g}" for stat, value in sorted(component_stats.items()) if isinstance(value, (int, float))]
+        return '\n'.join(lines) + '\n'
+
+    def server_timing_header(self, timing: RequestTiming) -> str:
+        return f'upstream;dur={timing.upstream_seconds * 1000:.1f};desc="{timing.upstream_calls} Proxmox API", total;dur={timing.elapsed() * 1000:.1f}'
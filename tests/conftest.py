@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Modüller depo kökünde, paket olarak kurulmuyor
+
+# app içe aktarılırken .env'deki gerçek sunucu kullanılmasın ve arka plan thread'leri başlamasın; load_dotenv var olan ortam değişkenlerini ezmez.
+os.environ.update({"PROXMOX_HOST": "pve.test.invalid", "PROXMOX_USER": "root@pam", "PROXMOX_PASSWORD": "secret", "APP_SECRET_KEY": "test", "PVEGUARD_METRICS_COLLECTOR": "False", "PVEGUARD_TSDB_PATH": "none"})
+
+from fake_proxmox import FakeProxmox  # noqa: E402
+
+
+@pytest.fixture
+def fake_proxmox(monkeypatch: pytest.MonkeyPatch) -> FakeProxmox:
+    """connect_to_proxmox()'un döndürdüğü istemciyi sahte API ile değiştirir."""
+    import app
+    prox: FakeProxmox = FakeProxmox()
+    monkeypatch.setattr(app.PROXMOX_POOL, "get", lambda: prox)
+    return prox
@@ -0,0 +1,57 @@
+import copy
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from proxmoxer.core import ResourceException
+
+
+class FakeResource:
+    """proxmoxer yol zincirinin (prox.nodes('pve1').qemu(100).status.current.get()) bir parçası."""
+
+    def __init__(self, api: "FakeProxmox", path: Tuple[str, ...]) -> None:
+        self.api: "FakeProxmox" = api; self.path: Tuple[str, ...] = path
+
+    def __getattr__(self, name: str) -> "FakeResource":
+        if name.startswith('_'): raise AttributeError(name)
+        return FakeResource(self.api, self.path + (name,))
+
+    def __call__(self, resource_id: Any = None) -> "FakeResource":
+        return self if resource_id in (None, '') else FakeResource(self.api, self.path + (str(resource_id),))
+
+    def get(self, **params: Any) -> Any:
+        return self.api.request('GET', self.path, params)
+
+    def post(self, **params: Any) -> Any:
+        return self.api.request('POST', self.path, params)
+
+    def delete(self, **params: Any) -> Any:
+        return self.api.request('DELETE', self.path, params)
+
+
+class FakeProxmox:
+    """Yanıtları 'YÖNTEM yol' anahtarlı `routes` sözlüğünden veren sahte ProxmoxAPI.
+
+    Değer çağrılabilirse istek parametreleriyle çağrılır, istisnaysa fırlatılır; tanımsız yollar 404 ResourceException
+    verir. Her çağrı `calls` listesine 'YÖNTEM yol' olarak yazılır.
+    """
+
+    def __init__(self, routes: Optional[Dict[str, Any]] = None) -> None:
+        self.routes: Dict[str, Any] = dict(routes or {}); self.calls: List[str] = []; self._lock: threading.Lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> FakeResource:
+        if name.startswith('_'): raise AttributeError(name)
+        return FakeResource(self, (name,))
+
+    def request(self, method: str, path: Tuple[str, ...], params: Dict[str, Any]) -> Any:
+        route: str = f"{method} {'/'.join(path)}"
+        with self._lock: self.calls.append(route)
+        if route not in self.routes: raise ResourceException(404, "Not Found", f"tanımsız yol: {route}")
+        response: Any = self.routes[route]
+        if isinstance(response, Exception): raise response
+        return response(**params) if callable(response) else copy.deepcopy(response)
+
+    def count(self, route: str) -> int:
+        with self._lock: return self.calls.count(route)
+
+    def reset_calls(self) -> None:
+        with self._lock: self.calls.clear()
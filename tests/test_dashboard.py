@@ -0,0 +1,50 @@
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+
+
+@pytest.fixture
+def cluster(fake_proxmox: FakeProxmox, monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeProxmox]:
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+    monkeypatch.setattr(app, "SNAPSHOT_INDEX", app.SnapshotIndex(max_age_seconds=900.0))
+    fake_proxmox.routes.update({
+        "GET cluster/resources": [{"type": "qemu", "vmid": 100, "node": "pve1", "name": "web-01", "status": "running", "cpu": 0.1, "mem": 1, "maxmem": 2},
+                                  {"type": "qemu", "vmid": 101, "node": "pve2", "name": "db-01", "status": "stopped"}],
+        "GET cluster/tasks": [], "GET nodes/pve1/qemu/100/config": {"cores": 2, "memory": 2048}, "GET nodes/pve2/qemu/101/config": {"cores": 4, "memory": 4096},
+        "GET nodes/pve1/qemu/100/snapshot": [{"name": "before-kernel-upgrade", "snaptime": 1600000000}, {"name": "current", "parent": "before-kernel-upgrade"}],
+        "GET nodes/pve2/qemu/101/snapshot": [{"name": "current"}]})
+    yield fake_proxmox
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+
+
+def test_streamed_and_buffered_dashboards_render_the_same_data(cluster: FakeProxmox) -> None:
+    client: Any = app.app.test_client()
+    streamed: Any = client.get("/"); buffered: Any = client.get("/?stream=0")
+    assert streamed.status_code == buffered.status_code == 200 and "Content-Length" in buffered.headers and "Content-Length" not in streamed.headers
+    for body in (streamed.get_data(as_text=True), buffered.get_data(as_text=True)):
+        assert "web-01" in body and "db-01" in body and "before-kernel-upgrade" in body
+
+
+def test_stream_sends_the_page_head_before_proxmox_is_called(cluster: FakeProxmox) -> None:
+    response: Any = app.app.test_client().get("/", buffered=False)
+    try:
+        first_chunk: str = next(iter(response.response)).decode()
+        assert "<html" in first_chunk.lower() and cluster.calls == []
+    finally: response.close()
+
+
+def test_snapshot_progress_reports_each_node(cluster: FakeProxmox) -> None:
+    dashboard: app.DashboardPage = app.DashboardPage(cluster, old_days=30, idle_days=60, max_date=None, sort_by="date", order="desc")
+    progress: List[Dict[str, Any]] = list(dashboard.snapshot_progress())
+    assert sorted((event["node"], event["fetched"]) for event in progress) == [("pve1", 1), ("pve2", 1)]
+    assert list(dashboard.snapshot_progress()) == [] # görünüm bir kez kurulur
+    cached: app.DashboardPage = app.DashboardPage(cluster, old_days=30, idle_days=60, max_date=None, sort_by="date", order="desc")
+    assert sorted((event["node"], event["fetched"]) for event in cached.snapshot_progress()) == [("pve1", 0), ("pve2", 0)]
+
+
+def test_unreachable_server_renders_an_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app.PROXMOX_POOL, "get", lambda: None)
+    assert "Proxmox VE sunucusuna bağlanılamadı." in app.app.test_client().get("/").get_data(as_text=True)
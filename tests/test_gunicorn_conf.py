@@ -0,0 +1,25 @@
+import os
+import runpy
+from typing import Any, Dict
+
+import pytest
+
+CONFIG_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+@pytest.fixture(autouse=True)
+def isolated_environ(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(os, "environ", dict(os.environ)) # Yapılandırma os.environ'a yazar; diğer testlere sızmasın
+
+
+def test_multiple_workers_share_state_and_secret() -> None:
+    os.environ["PVEGUARD_WORKERS"] = "4"; os.environ.pop("PVEGUARD_STATE_BACKEND", None); os.environ.pop("APP_SECRET_KEY", None)
+    settings: Dict[str, Any] = runpy.run_path(CONFIG_PATH)
+    assert settings["workers"] == 4 and settings["worker_class"] == "gthread" and settings["preload_app"] is False
+    assert os.environ["PVEGUARD_STATE_BACKEND"] == "sqlite" and len(os.environ["APP_SECRET_KEY"]) == 64
+
+
+def test_explicit_settings_are_kept() -> None:
+    os.environ.update({"PVEGUARD_WORKERS": "2", "PVEGUARD_STATE_BACKEND": "memory", "APP_SECRET_KEY": "sabit"})
+    runpy.run_path(CONFIG_PATH)
+    assert os.environ["PVEGUARD_STATE_BACKEND"] == "memory" and os.environ["APP_SECRET_KEY"] == "sabit"
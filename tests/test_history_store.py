@@ -0,0 +1,75 @@
+import random
+from typing import List
+
+from history_store import CounterRateTracker, RollingSeries, VMPerformanceHistory
+
+
+def test_mean_and_max_match_naive_window_across_wraparound() -> None:
+    rng: random.Random = random.Random(7); series: RollingSeries = RollingSeries(16); window: List[float] = []
+    for _ in range(500):
+        value: float = round(rng.uniform(0.0, 100.0), 2); series.append(value); window = (window + [value])[-16:]
+        assert abs((series.mean() or 0.0) - sum(window) / len(window)) < 1e-3
+        assert abs((series.max() or 0.0) - max(window)) < 1e-3
+    assert series.values() == [round(v, 2) for v in window] and len(series) == 16
+
+
+def test_values_are_ordered_oldest_first_and_last_n() -> None:
+    series: RollingSeries = RollingSeries(4)
+    for value in (1.0, 2.0, 3.0, 4.0, 5.0, 6.0): series.append(value)
+    assert series.values() == [3.0, 4.0, 5.0, 6.0] and series.values(last_n=2) == [5.0, 6.0] and series.last() == 6.0
+
+
+def test_max_falls_back_when_peak_leaves_the_window() -> None:
+    series: RollingSeries = RollingSeries(3)
+    for value in (90.0, 10.0, 20.0): series.append(value)
+    assert series.max() == 90.0
+    series.append(5.0)
+    assert series.max() == 20.0
+
+
+def test_clear_empties_the_series() -> None:
+    series: RollingSeries = RollingSeries(3); series.append(1.0); series.clear()
+    assert len(series) == 0 and series.mean() is None and series.max() is None and series.values() == []
+
+
+def test_vm_history_skips_missing_values_and_counts_samples() -> None:
+    history: VMPerformanceHistory = VMPerformanceHistory(5)
+    history.append({"cpu": 10.0, "ram": 50.0, "netin": None}); history.append({"cpu": 30.0, "ram": 70.0, "netin": 1000.0})
+    assert len(history) == 2 and history.seq == 2 and len(history.series["netin"]) == 1
+    assert history.summary("cpu") == (20.0, 30.0) and history.summary("diskread") == (None, None)
+
+
+def test_preload_fills_window_and_advances_seq() -> None:
+    history: VMPerformanceHistory = VMPerformanceHistory(3)
+    history.preload({"cpu": [1.0, 2.0, 3.0, 4.0], "ram": [10.0], "unknown": [5.0]})
+    assert history.series["cpu"].values() == [2.0, 3.0, 4.0] and history.series["ram"].values() == [10.0] and history.seq == 4
+
+
+
+def test_first_sample_has_unknown_rates() -> None:
+    tracker: CounterRateTracker = CounterRateTracker()
+    assert tracker.update('qemu/100', 0.0, {"netin": 1000.0, "netout": 50.0}) == {"netin": None, "netout": None}
+
+
+def test_rate_from_changed_counters_and_kept_between_refreshes() -> None:
+    tracker: CounterRateTracker = CounterRateTracker(idle_after_seconds=60.0)
+    tracker.update('qemu/100', 0.0, {"netin": 1000.0})
+    assert tracker.update('qemu/100', 10.0, {"netin": 6000.0}) == {"netin": 500.0}
+    assert tracker.update('qemu/100', 12.0, {"netin": 6000.0}) == {"netin": 500.0} # pvestatd henüz yenilemedi; son hız korunur
+    assert tracker.update('qemu/100', 75.0, {"netin": 6000.0}) == {"netin": 0.0} # Uzun süre değişmeyen sayaç boşta sayılır
+
+
+def test_counter_decrease_resets_baseline() -> None:
+    """Misafir yeniden başlayınca sayaçlar sıfırlanır; o örnekte hız bilinmez, sonraki örnek yeni tabana göre hesaplanır."""
+    tracker: CounterRateTracker = CounterRateTracker()
+    tracker.update('lxc/200', 0.0, {"diskread": 10_000.0, "diskwrite": 500.0}); tracker.update('lxc/200', 10.0, {"diskread": 20_000.0, "diskwrite": 1500.0})
+    assert tracker.update('lxc/200', 20.0, {"diskread": 100.0, "diskwrite": 1600.0}) == {"diskread": None, "diskwrite": None}
+    assert tracker.update('lxc/200', 30.0, {"diskread": 1100.0, "diskwrite": 1600.0}) == {"diskread": 100.0, "diskwrite": 0.0}
+
+
+def test_forget_and_retain_drop_state() -> None:
+    tracker: CounterRateTracker = CounterRateTracker()
+    for key in ('qemu/100', 'qemu/101', 'lxc/200'): tracker.update(key, 0.0, {"netin": 1.0})
+    tracker.retain({'qemu/100', 'lxc/200'}); tracker.forget('lxc/200')
+    assert len(tracker) == 1
+    assert tracker.update('qemu/101', 10.0, {"netin": 5.0}) == {"netin": None}
@@ -0,0 +1,88 @@
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+
+
+@pytest.fixture(autouse=True)
+def clean_caches() -> Iterator[None]:
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+    yield
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+
+
+COUNTERS: Dict[str, int] = {"diskread": 0, "diskwrite": 0, "netin": 0, "netout": 0}
+
+
+def _resources() -> List[Dict[str, Any]]:
+    return [
+        {"type": "qemu", "vmid": 100, "node": "pve1", "name": "web", "status": "running", "cpu": 0.25, "mem": 512 * 1024 ** 2, "maxmem": 1024 ** 3, "maxcpu": 2, "maxdisk": 10, **COUNTERS},
+        {"type": "lxc", "vmid": 200, "node": "pve1", "name": "dns", "status": "running", "cpu": 0.01, "mem": 64 * 1024 ** 2, "maxcpu": 1, "maxmem": 256 * 1024 ** 2, **COUNTERS},
+        {"type": "qemu", "vmid": 101, "node": "pve2", "name": "db", "status": "stopped", "maxcpu": 4, "maxmem": 4 * 1024 ** 3},
+    ]
+
+
+def _prox() -> FakeProxmox:
+    return FakeProxmox({"GET cluster/resources": _resources(), "GET nodes/pve1/qemu/100/config": {"cores": 2, "memory": 1024, "digest": "d100"}, "GET nodes/pve2/qemu/101/config": {"cores": 4, "memory": 4096, "digest": "d101"}})
+
+
+def test_inventory_comes_from_one_cluster_resources_call() -> None:
+    prox: FakeProxmox = _prox(); rows: List[Dict[str, Any]] = app.get_inventory_from_cluster_resources(prox)
+    assert [(r["node"], r["vmid"], r["type"]) for r in rows] == [("pve1", 100, "qemu"), ("pve1", 200, "lxc"), ("pve2", 101, "qemu")]
+    assert prox.count("GET cluster/resources") == 1 and not [c for c in prox.calls if "status" in c or "rrddata" in c]
+    assert rows[1]["ram_usage_percent"] == 25.0 and rows[1]["current_vcpu"] == 1 and rows[1]["current_ram_mb"] == 256
+    web: Dict[str, Any] = rows[0]
+    assert web["cpu_usage_percent"] == 25.0 and web["ram_usage_percent"] == 50.0 and web["current_vcpu"] == 2 and web["current_ram_mb"] == 1024
+
+
+def test_configs_are_fetched_only_when_the_marker_changes() -> None:
+    prox: FakeProxmox = _prox(); app.get_inventory_from_cluster_resources(prox); prox.reset_calls()
+    app.get_inventory_from_cluster_resources(prox)
+    assert prox.calls == ["GET cluster/resources"] # LXC için hiç config isteği yapılmaz
+    resources: List[Dict[str, Any]] = _resources(); resources[0]["maxmem"] = 2 * 1024 ** 3; prox.routes["GET cluster/resources"] = resources; prox.reset_calls()
+    app.get_inventory_from_cluster_resources(prox)
+    assert prox.calls == ["GET cluster/resources", "GET nodes/pve1/qemu/100/config"]
+
+
+def test_stale_config_entries_are_refetched(monkeypatch: pytest.MonkeyPatch) -> None:
+    prox: FakeProxmox = _prox(); app.get_inventory_from_cluster_resources(prox); prox.reset_calls()
+    monkeypatch.setattr(app, "CONFIG_CACHE_MAX_AGE_SECONDS", 0.0)
+    app.get_inventory_from_cluster_resources(prox)
+    assert prox.count("GET nodes/pve1/qemu/100/config") == 1 and prox.count("GET nodes/pve2/qemu/101/config") == 1
+
+
+def test_guests_that_disappear_are_pruned_from_the_config_cache() -> None:
+    prox: FakeProxmox = _prox(); app.get_inventory_from_cluster_resources(prox)
+    assert set(app.CACHED_VM_CONFIGS) == {"100", "101", "200"}
+    prox.routes["GET cluster/resources"] = _resources()[:2]; app.get_inventory_from_cluster_resources(prox)
+    assert set(app.CACHED_VM_CONFIGS) == {"100", "200"}
+
+
+def test_failed_config_fetch_keeps_the_previous_entry() -> None:
+    prox: FakeProxmox = _prox(); app.get_inventory_from_cluster_resources(prox)
+    resources: List[Dict[str, Any]] = _resources(); resources[0]["maxcpu"] = 8; prox.routes["GET cluster/resources"] = resources
+    del prox.routes["GET nodes/pve1/qemu/100/config"]
+    rows: List[Dict[str, Any]] = app.get_inventory_from_cluster_resources(prox)
+    assert rows[0]["current_vcpu"] == 2 and app.CACHED_VM_CONFIGS["100"]["digest"] == "d100"
+
+
+def test_node_walk_mode_uses_the_same_config_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "INVENTORY_MODE", "nodes")
+    prox: FakeProxmox = FakeProxmox({"GET nodes": [{"node": "pve1"}], "GET nodes/pve1/qemu": [{"vmid": 100, "name": "web", "status": "stopped", "maxmem": 1024 ** 3, "cpus": 2}], "GET nodes/pve1/lxc": [],
+                                     "GET nodes/pve1/qemu/100/config": {"cores": 2, "memory": 1024}, "GET nodes/pve1/qemu/100/status/current": {"status": "stopped", "name": "web"}})
+    app.get_all_vms_and_containers_with_initial_perf(prox); app.get_all_vms_and_containers_with_initial_perf(prox)
+    assert prox.count("GET nodes/pve1/qemu/100/config") == 1 and prox.count("GET nodes/pve1/qemu/100/status/current") == 0 # durdurulmuş VM için liste satırı yeterli
+
+
+def test_node_walk_keeps_configs_of_a_node_whose_list_failed() -> None:
+    prox: FakeProxmox = FakeProxmox({"GET nodes": [{"node": "pve1"}, {"node": "pve2"}], "GET nodes/pve1/lxc": [], "GET nodes/pve2/lxc": [],
+                                     "GET nodes/pve1/qemu": [{"vmid": 100, "name": "web", "status": "stopped", "maxmem": 1024 ** 3, "cpus": 2}],
+                                     "GET nodes/pve2/qemu": [{"vmid": 101, "name": "db", "status": "stopped", "maxmem": 1024 ** 3, "cpus": 4}],
+                                     "GET nodes/pve1/qemu/100/config": {"cores": 2, "memory": 1024}, "GET nodes/pve2/qemu/101/config": {"cores": 4, "memory": 1024}})
+    app.get_inventory_by_node_walk(prox)
+    prox.routes["GET nodes/pve2/qemu"] = ConnectionError("pve2 yanıt vermiyor"); app.get_inventory_by_node_walk(prox)
+    assert set(app.CACHED_VM_CONFIGS) == {"100", "101"}
+    prox.routes["GET nodes/pve2/qemu"] = []; app.get_inventory_by_node_walk(prox)
+    assert set(app.CACHED_VM_CONFIGS) == {"100"}
@@ -0,0 +1,69 @@
+import json
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+
+
+def _vm(history: List[float], seq: int, **fields: Any) -> Dict[str, Any]:
+    return {"status": "running", "cpu_usage_percent": history[-1] if history else 0.0, "cpu_history": list(history), "ram_history": [10.0] * len(history), "history_seq": seq, **fields}
+
+
+def test_unchanged_vms_are_left_out_of_the_delta() -> None:
+    payload: Dict[str, Any] = {"100": _vm([1.0, 2.0], 2)}
+    assert app.diff_live_performance_payloads(payload, json.loads(json.dumps(payload))) == {"changed": {}, "removed": []}
+
+
+def test_new_samples_are_sent_as_appends() -> None:
+    delta: Dict[str, Any] = app.diff_live_performance_payloads({"100": _vm([1.0, 2.0], 2)}, {"100": _vm([1.0, 2.0, 3.0], 3)})
+    assert delta["changed"]["100"] == {"cpu_usage_percent": 3.0, "cpu_history_append": [3.0], "ram_history_append": [10.0], "history_seq": 3}
+
+
+def test_appends_follow_the_sliding_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "SPARKLINE_POINTS", 3)
+    delta: Dict[str, Any] = app.diff_live_performance_payloads({"100": _vm([1.0, 2.0, 3.0], 3)}, {"100": _vm([2.0, 3.0, 4.0], 4)})
+    assert delta["changed"]["100"]["cpu_history_append"] == [4.0] and "cpu_history" not in delta["changed"]["100"]
+
+
+def test_reset_history_is_sent_in_full_and_removed_vms_are_listed() -> None:
+    previous: Dict[str, Any] = {"100": _vm([1.0, 2.0], 2), "101": _vm([5.0], 1)}
+    delta: Dict[str, Any] = app.diff_live_performance_payloads(previous, {"100": _vm([], 2, status="stopped"), "102": _vm([7.0], 1)})
+    assert delta["removed"] == ["101"] and delta["changed"]["102"] == _vm([7.0], 1)
+    assert delta["changed"]["100"]["cpu_history"] == [] and delta["changed"]["100"]["status"] == "stopped"
+
+
+def test_sse_event_format() -> None:
+    assert app._format_sse_event("delta", {"a": 1}, 7) == 'id: 7\nevent: delta\ndata: {"a":1}\n\n'
+
+
+@pytest.fixture
+def collected(monkeypatch: pytest.MonkeyPatch, fake_proxmox: FakeProxmox) -> Iterator[app.MetricsCollector]:
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+    fake_proxmox.routes.update({"GET cluster/resources": [{"type": "qemu", "vmid": 100, "node": "pve1", "name": "web", "status": "running", "cpu": 0.1, "mem": 1, "maxmem": 2}],
+                                "GET nodes/pve1/qemu/100/config": {"cores": 1, "memory": 2048}, "GET nodes/pve1/qemu/100/status/current": {"status": "running", "cpu": 0.1, "mem": 1, "maxmem": 2},
+                                "GET nodes/pve1/qemu/100/rrddata": []})
+    metrics_collector: app.MetricsCollector = app.MetricsCollector(interval_seconds=7.0, jitter_seconds=0.0, max_backoff_seconds=120.0, state_backend=app.MemoryStateBackend())
+    monkeypatch.setattr(metrics_collector, "start", lambda: None); monkeypatch.setattr(app, "METRICS_COLLECTOR", metrics_collector); monkeypatch.setattr(app, "METRICS_COLLECTOR_ENABLED", True)
+    metrics_collector.run_once()
+    yield metrics_collector
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+
+
+def test_polling_clients_get_304_until_the_next_round(collected: app.MetricsCollector) -> None:
+    client: Any = app.app.test_client(); first: Any = client.get("/api/live_vm_performance"); etag: str = first.headers["ETag"]
+    assert client.get("/api/live_vm_performance", headers={"If-None-Match": etag}).status_code == 304
+    collected.run_once()
+    refreshed: Any = client.get("/api/live_vm_performance", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200 and refreshed.headers["ETag"] != etag
+
+
+def test_stream_starts_with_a_full_snapshot(collected: app.MetricsCollector) -> None:
+    response: Any = app.app.test_client().get("/api/live_vm_performance/stream", buffered=False)
+    try:
+        chunks: Iterator[bytes] = iter(response.response)
+        assert next(chunks) == b"retry: 3000\n\n"
+        event: str = next(chunks).decode()
+        assert event.startswith("id: 1\nevent: snapshot\n") and json.loads(event.split("data: ", 1)[1])["100"]["cpu_usage_percent"] == 10.0
+    finally: response.close()
@@ -0,0 +1,70 @@
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+
+
+@pytest.fixture(autouse=True)
+def clean_caches() -> Iterator[None]:
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+    yield
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear()
+
+
+@pytest.fixture
+def collector(monkeypatch: pytest.MonkeyPatch) -> app.MetricsCollector:
+    """Thread'i başlatılmayan, turları run_once() ile elle sürülen toplayıcı."""
+    metrics_collector: app.MetricsCollector = app.MetricsCollector(interval_seconds=7.0, jitter_seconds=0.0, max_backoff_seconds=120.0, state_backend=app.MemoryStateBackend())
+    monkeypatch.setattr(metrics_collector, "start", lambda: None); monkeypatch.setattr(app, "METRICS_COLLECTOR", metrics_collector)
+    return metrics_collector
+
+
+def _prox(cpu: float = 0.5) -> FakeProxmox:
+    return FakeProxmox({"GET cluster/resources": [{"type": "qemu", "vmid": 100, "node": "pve1", "name": "web", "status": "running", "cpu": cpu, "mem": 1, "maxmem": 4, "maxcpu": 2}],
+                        "GET nodes/pve1/qemu/100/config": {"cores": 2, "memory": 4096}, "GET nodes/pve1/qemu/100/status/current": {"status": "running", "name": "web", "cpu": cpu, "mem": 1, "maxmem": 4},
+                        "GET nodes/pve1/qemu/100/rrddata": []})
+
+
+def test_run_once_builds_payload_without_recording_inventory_samples(collector: app.MetricsCollector, fake_proxmox: FakeProxmox) -> None:
+    fake_proxmox.routes.update(_prox().routes)
+    assert collector.run_once() is True
+    payload: Optional[Dict[str, Any]] = collector.latest_payload()
+    assert payload is not None and payload["100"]["cpu_usage_percent"] == 50.0 and payload["100"]["ram_usage_percent"] == 25.0
+    assert payload["100"]["cpu_history"] == [50.0] # envanter turu örnek eklemez, yalnızca status.current örneği kaydedilir
+    assert collector.stats["ticks"] == 1 and collector.consecutive_failures == 0
+
+
+def test_failed_rounds_are_counted_and_keep_last_payload(collector: app.MetricsCollector, monkeypatch: pytest.MonkeyPatch) -> None:
+    prox: FakeProxmox = _prox(); monkeypatch.setattr(app.PROXMOX_POOL, "get", lambda: prox); collector.run_once()
+    previous: Optional[Dict[str, Any]] = collector.latest_payload(); monkeypatch.setattr(app.PROXMOX_POOL, "get", lambda: None)
+    assert collector.run_once() is False and collector.run_once() is False
+    assert collector.consecutive_failures == 2 and collector.stats["failures"] == 2 and collector.latest_payload() is previous
+
+
+def test_live_endpoint_serves_collected_payload_without_upstream_calls(collector: app.MetricsCollector, fake_proxmox: FakeProxmox, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "METRICS_COLLECTOR_ENABLED", True); fake_proxmox.routes.update(_prox().routes)
+    client: Any = app.app.test_client()
+    first: Any = client.get("/api/live_vm_performance"); calls_after_first: int = len(fake_proxmox.calls)
+    second: Any = client.get("/api/live_vm_performance")
+    assert first.status_code == 200 and second.get_json() == first.get_json() and len(fake_proxmox.calls) == calls_after_first
+
+
+def test_live_endpoint_reports_unreachable_server(collector: app.MetricsCollector, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "METRICS_COLLECTOR_ENABLED", True); monkeypatch.setattr(app.PROXMOX_POOL, "get", lambda: None)
+    assert app.app.test_client().get("/api/live_vm_performance").status_code == 503
+
+
+def test_bulk_sampling_covers_lxc_and_derives_rates_from_counters(fake_proxmox: FakeProxmox, monkeypatch: pytest.MonkeyPatch) -> None:
+    counters: Dict[str, int] = {"diskread": 0, "diskwrite": 0, "netin": 0, "netout": 0}; clock: List[float] = [100.0]
+    monkeypatch.setattr(app, "COUNTER_RATES", app.CounterRateTracker(idle_after_seconds=60.0)); monkeypatch.setattr(app.time, "monotonic", lambda: clock[0])
+    fake_proxmox.routes["GET cluster/resources"] = lambda type: [{"type": "qemu", "vmid": 100, "node": "pve1", "name": "web", "status": "running", "cpu": 0.5, "mem": 1, "maxmem": 4, **counters},
+                                                                 {"type": "lxc", "vmid": 200, "node": "pve1", "name": "dns", "status": "running", "cpu": 0.1, "mem": 1, "maxmem": 2, **counters}]
+    app.CACHED_VM_CONFIGS.update({"100": {"node": "pve1", "name": "web", "type": "qemu"}, "200": {"node": "pve1", "name": "dns", "type": "lxc"}})
+    first: Dict[str, Any] = app.build_live_performance_payload(fake_proxmox)
+    clock[0] = 110.0; counters.update(netin=10_000, diskwrite=2_000)
+    second: Dict[str, Any] = app.build_live_performance_payload(fake_proxmox)
+    assert set(first) == {"100", "200"} and first["200"]["ram_usage_percent"] == 50.0 and first["100"]["netin_Bps"] is None
+    assert second["100"]["netin_Bps"] == 1000.0 and second["200"]["diskwrite_Bps"] == 200.0
+    assert fake_proxmox.calls == ["GET cluster/resources"] * 2 # misafir başına status.current veya rrddata çağrısı yok
@@ -0,0 +1,146 @@
+from typing import Any, Dict, List
+
+import pytest
+import requests
+from proxmoxer import ProxmoxAPI
+from proxmoxer.backends.https import ProxmoxHTTPAuth
+from proxmoxer.core import ResourceException
+
+import app
+
+
+class _FakeProxmoxAPI:
+    """Ağa çıkmadan oluşturulan ProxmoxAPI yerine geçer; havuzun kullandığı proxmoxer alanlarını taşır."""
+    reject_tickets: bool = False
+
+    def __init__(self, host: str, **kwargs: Any) -> None:
+        if self.reject_tickets and str(kwargs.get("password", "")).startswith("PVE:"): raise ConnectionError("ticket ile giriş reddedildi")
+        self.host: str = host; self.kwargs: Dict[str, Any] = kwargs; self._store: Dict[str, Any] = {"session": requests.Session()}
+
+    def get_tokens(self) -> Any:
+        return (f"PVE:{self.kwargs['user']}:{id(self):X}", "csrf") if "password" in self.kwargs else (None, None)
+
+
+@pytest.fixture
+def logins(monkeypatch: pytest.MonkeyPatch) -> List[_FakeProxmoxAPI]:
+    created: List[_FakeProxmoxAPI] = []
+    def fake_login(host: str, **kwargs: Any) -> _FakeProxmoxAPI:
+        client: _FakeProxmoxAPI = _FakeProxmoxAPI(host, **kwargs); created.append(client); return client
+    monkeypatch.setattr(app, "ProxmoxAPI", fake_login)
+    return created
+
+
+def test_client_is_shared_and_uses_larger_connection_pool(logins: List[_FakeProxmoxAPI]) -> None:
+    pool: app.ProxmoxClientPool = app.ProxmoxClientPool()
+    first: Any = pool.get(); second: Any = pool.get()
+    assert first is second and len(logins) == 1 and logins[0].kwargs["password"] == "secret"
+    assert pool.stats["logins"] == 1 and pool.stats["hits"] == 1
+    assert first._store["session"].get_adapter("https://pve.test.invalid:8006")._pool_maxsize == app.PROXMOX_HTTP_POOL_SIZE
+    assert app.PROXMOX_TICKET_RENEW_SECONDS < ProxmoxHTTPAuth.renew_age # proxmoxer'ın kendi kilitsiz yenilemesi hiç devreye girmez
+
+
+def test_ticket_is_renewed_with_a_new_client_when_due(logins: List[_FakeProxmoxAPI], monkeypatch: pytest.MonkeyPatch) -> None:
+    pool: app.ProxmoxClientPool = app.ProxmoxClientPool(); client: Any = pool.get()
+    monkeypatch.setattr(app, "PROXMOX_TICKET_RENEW_SECONDS", 0)
+    renewed: Any = pool.get()
+    assert renewed is not client and renewed.kwargs["password"] == client.get_tokens()[0] and len(logins) == 2
+    assert pool.stats["ticket_renewals"] == 1 and pool.stats["relogins"] == 0 and pool.stats["logins"] == 1
+    assert renewed._store["session"].get_adapter("https://pve.test.invalid:8006")._pool_maxsize == app.PROXMOX_HTTP_POOL_SIZE
+
+
+def test_failed_renewal_falls_back_to_full_login(logins: List[_FakeProxmoxAPI], monkeypatch: pytest.MonkeyPatch) -> None:
+    pool: app.ProxmoxClientPool = app.ProxmoxClientPool(); client: Any = pool.get(); monkeypatch.setattr(_FakeProxmoxAPI, "reject_tickets", True)
+    monkeypatch.setattr(app, "PROXMOX_TICKET_RENEW_SECONDS", 0)
+    relogged: Any = pool.get()
+    assert relogged is not client and relogged.kwargs["password"] == "secret" and len(logins) == 2 and pool.stats["relogins"] == 1 and pool.stats["ticket_renewals"] == 0
+
+
+def test_api_token_is_never_renewed(logins: List[_FakeProxmoxAPI], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "PROXMOX_TOKEN_NAME", "pveguard"); monkeypatch.setattr(app, "PROXMOX_TOKEN_VALUE", "uuid")
+    monkeypatch.setattr(app, "PROXMOX_TICKET_RENEW_SECONDS", 0)
+    pool: app.ProxmoxClientPool = app.ProxmoxClientPool(); client: Any = pool.get()
+    assert pool.get() is client and len(logins) == 1 and pool.stats["ticket_renewals"] == 0
+    assert logins[0].kwargs["token_name"] == "pveguard" and "password" not in logins[0].kwargs
+    assert pool.snapshot_stats()["auth_mode"] == "token"
+
+
+def test_failed_login_is_not_retried_within_retry_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    attempts: List[str] = []
+    def failing_login(host: str, **kwargs: Any) -> Any:
+        attempts.append(host); raise ConnectionError("bağlantı reddedildi")
+    monkeypatch.setattr(app, "ProxmoxAPI", failing_login); monkeypatch.setattr(app, "PROXMOX_LOGIN_RETRY_SECONDS", 60.0)
+    pool: app.ProxmoxClientPool = app.ProxmoxClientPool()
+    assert pool.get() is None and pool.get() is None
+    assert len(attempts) == 1 and pool.stats["failures"] == 1
+
+
+def test_missing_credentials_return_no_client(logins: List[_FakeProxmoxAPI], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "PROXMOX_PASSWORD", None)
+    assert app.ProxmoxClientPool().get() is None and not logins
+
+
+def test_only_auth_errors_drop_the_shared_client(logins: List[_FakeProxmoxAPI], monkeypatch: pytest.MonkeyPatch) -> None:
+    pool: app.ProxmoxClientPool = app.ProxmoxClientPool(); monkeypatch.setattr(app, "PROXMOX_POOL", pool); pool.get()
+    app.invalidate_proxmox_on_auth_error(ResourceException(500, "Internal Server Error", "rrdcached"))
+    assert pool.stats["invalidations"] == 0
+    app.invalidate_proxmox_on_auth_error(ResourceException(401, "Unauthorized", "invalid ticket"))
+    assert pool.stats["invalidations"] == 1 and pool.snapshot_stats()["connected"] is False
+
+
+def test_auth_errors_from_requests_responses_drop_the_shared_client(logins: List[_FakeProxmoxAPI], monkeypatch: pytest.MonkeyPatch) -> None:
+    pool: app.ProxmoxClientPool = app.ProxmoxClientPool(); monkeypatch.setattr(app, "PROXMOX_POOL", pool); pool.get()
+    response: requests.Response = requests.Response(); response.status_code = 401
+    app.invalidate_proxmox_on_auth_error(ConnectionError("bağlantı koptu"))
+    app.invalidate_proxmox_on_auth_error(requests.exceptions.HTTPError("401 Unauthorized", response=response))
+    assert pool.stats["invalidations"] == 1
+
+
+def test_proxmoxer_exposes_the_fields_the_pool_relies_on() -> None:
+    """Havuz oturuma proxmoxer'ın belgelenmemiş _store alanından erişir; sürüm yükseltmesinde kaybolursa burada fark edilsin."""
+    client: ProxmoxAPI = ProxmoxAPI("pve.test.invalid", user="root@pam", token_name="pveguard", token_value="uuid", verify_ssl=False)
+    assert isinstance(app.ProxmoxClientPool._client_session(client), requests.Session) and client.get_tokens() == (None, None)
+    assert isinstance(ProxmoxHTTPAuth.renew_age, int)
+
+
+def test_missing_session_does_not_break_login(monkeypatch: pytest.MonkeyPatch) -> None:
+    class _SessionlessProxmoxAPI(_FakeProxmoxAPI):
+        def __init__(self, host: str, **kwargs: Any) -> None:
+            super().__init__(host, **kwargs); self._store = {}
+    monkeypatch.setattr(app, "ProxmoxAPI", _SessionlessProxmoxAPI)
+    assert isinstance(app.ProxmoxClientPool().get(), _SessionlessProxmoxAPI)
+
+
+class _CountingPool:
+    def __init__(self, client: Any) -> None:
+        self.client: Any = client; self.invalidations: int = 0
+
+    def get(self) -> Any:
+        return self.client
+
+    def invalidate(self) -> None:
+        self.invalidations += 1
+
+
+def test_expired_tickets_seen_by_data_fetchers_drop_the_shared_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    from fake_proxmox import FakeProxmox
+    expired: ResourceException = ResourceException(401, "Unauthorized", "invalid ticket")
+    prox: FakeProxmox = FakeProxmox({"GET nodes/pve1/qemu/100/rrddata": expired, "GET nodes/pve1/qemu/100/status/current": expired, "GET nodes/pve1/lxc/200/snapshot": expired})
+    pool: _CountingPool = _CountingPool(prox); monkeypatch.setattr(app, "PROXMOX_POOL", pool); app.RRD_CACHE.clear()
+    monkeypatch.setitem(app.CACHED_VM_CONFIGS, "100", {"node": "pve1", "type": "qemu"})
+    assert app.get_vm_rrd_metrics(prox, "pve1", 100)["cpu_usage_percent"] is None and pool.invalidations == 1
+    assert app.get_vm_current_status(prox, "pve1", 100)["status"] == "unknown" and pool.invalidations == 2
+    assert app.get_snapshots_for_resource(prox, "pve1", 200, "lxc") == [] and pool.invalidations == 3
+    response: Any = app.app.test_client().get("/api/vm_metric_history/100/cpu_usage_percent?source=proxmox")
+    assert response.status_code == 500 and response.get_json()["error"] == "RRD verisi çekilemedi: 401" and pool.invalidations == 4
+    app.RRD_CACHE.clear(); app.PERFORMANCE_HISTORY.clear()
+
+
+def test_expected_api_errors_keep_the_shared_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    from fake_proxmox import FakeProxmox
+    prox: FakeProxmox = FakeProxmox({"GET nodes/pve1/qemu/100/status/current": ResourceException(500, "Internal Server Error", "VM 100 qmp command 'query-status' failed - got timeout"),
+                                     "GET nodes/pve1/qemu/101/status/current": ResourceException(404, "Not Found", "no such VM"),
+                                     "GET nodes/pve1/lxc/200/snapshot": ResourceException(500, "Internal Server Error", "Configuration file 'nodes/pve1/lxc/200.conf' does not exist")})
+    pool: _CountingPool = _CountingPool(prox); monkeypatch.setattr(app, "PROXMOX_POOL", pool)
+    assert app.get_vm_current_status(prox, "pve1", 100)["status"] == "error_transitional" and app.get_vm_current_status(prox, "pve1", 101)["status"] == "not_found"
+    assert app.get_snapshots_for_resource(prox, "pve1", 200, "lxc") == [] and pool.invalidations == 0
+    app.PERFORMANCE_HISTORY.clear()
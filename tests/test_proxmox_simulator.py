@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+import pytest
+from proxmoxer import ProxmoxAPI
+from proxmoxer.core import ResourceException
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from bench_endpoints import compare_with_baseline  # noqa: E402
+from proxmox_simulator import ProxmoxSimulator  # noqa: E402
+
+
+def _connect(simulator: ProxmoxSimulator) -> ProxmoxAPI:
+    return ProxmoxAPI(simulator.host, user="root@pam", password="secret", verify_ssl=False)
+
+
+def test_proxmoxer_talks_to_the_simulator_in_process() -> None:
+    simulator: ProxmoxSimulator = ProxmoxSimulator(nodes=2, guests=6, snapshots_per_guest=3, lxc_ratio=0.5)
+    with simulator.patch_requests():
+        prox: ProxmoxAPI = _connect(simulator)
+        resources: List[Dict[str, Any]] = prox.cluster.resources.get(type='vm')
+        guest: Dict[str, Any] = resources[0]; api_guest: Any = getattr(prox.nodes(guest['node']), guest['type'])(guest['vmid'])
+        snapshots: List[Dict[str, Any]] = api_guest.snapshot.get(); rrd: List[Dict[str, Any]] = api_guest.rrddata.get(timeframe='day')
+    assert len(resources) == 6 and {row['type'] for row in resources} <= {'qemu', 'lxc'}
+    assert len(snapshots) == 4 and snapshots[-1]['name'] == 'current' and len(rrd) == 70
+    assert simulator.calls[('POST', 'access/ticket')] == 1 and simulator.calls[('GET', 'nodes/{node}/' + guest['type'] + '/{vmid}/snapshot')] == 1
+
+
+def test_same_seed_builds_the_same_cluster() -> None:
+    first: ProxmoxSimulator = ProxmoxSimulator(guests=20, seed=7); second: ProxmoxSimulator = ProxmoxSimulator(guests=20, seed=7)
+    assert first.snapshot_ids(per_guest=2) == second.snapshot_ids(per_guest=2)
+    assert [guest.snapshots for guest in first.guests.values()] == [guest.snapshots for guest in second.guests.values()]
+    with pytest.raises(ValueError): ProxmoxSimulator(tree_shape='star')
+
+
+def test_delete_reparents_children_and_records_a_task() -> None:
+    simulator: ProxmoxSimulator = ProxmoxSimulator(nodes=1, guests=1, snapshots_per_guest=3, tree_shape='chain', lxc_ratio=0.0)
+    guest: Any = simulator.guests[100]
+    with simulator.patch_requests():
+        prox: ProxmoxAPI = _connect(simulator)
+        upid: str = prox.nodes('pve0').qemu(100).snapshot('snap1').delete()
+        assert prox.nodes('pve0').tasks(upid).status.get()['exitstatus'] == 'OK'
+        with pytest.raises(ResourceException, match="does not exist"): prox.nodes('pve0').qemu(100).snapshot('snap1').delete()
+    assert upid.startswith('UPID:pve0:') and guest.snapshots['snap2']['parent'] == 'snap0' and simulator.tasks[0]['type'] == 'qmdelsnapshot'
+
+
+def test_error_rate_injects_server_errors_but_not_for_login() -> None:
+    simulator: ProxmoxSimulator = ProxmoxSimulator(guests=2, error_rate=1.0)
+    with simulator.patch_requests():
+        prox: ProxmoxAPI = _connect(simulator)
+        with pytest.raises(ResourceException): prox.nodes.get()
+    assert simulator.errors_injected == 1 and simulator.total_calls() == 2
+
+
+def test_baseline_comparison_flags_more_calls_and_slower_runs(tmp_path: Any) -> None:
+    baseline_path: str = str(tmp_path / "baseline.json")
+    with open(baseline_path, "w", encoding="utf-8") as baseline_file:
+        json.dump({"results": [{"scenario": "index", "guests": 10, "cold_ms": 100.0, "warm_ms": 10.0, "cold_upstream_calls": 5, "warm_upstream_calls": 0}]}, baseline_file)
+    same: List[Dict[str, Any]] = [{"scenario": "index", "guests": 10, "cold_ms": 110.0, "warm_ms": 10.0, "cold_upstream_calls": 5, "warm_upstream_calls": 0}]
+    worse: List[Dict[str, Any]] = [{"scenario": "index", "guests": 10, "cold_ms": 100.0, "warm_ms": 20.0, "cold_upstream_calls": 5, "warm_upstream_calls": 1},
+                                   {"scenario": "index", "guests": 100, "cold_ms": 1.0, "warm_ms": 1.0, "cold_upstream_calls": 1, "warm_upstream_calls": 1}]
+    assert compare_with_baseline(same, baseline_path, 0.25) == []
+    assert compare_with_baseline(worse, baseline_path, 0.25) == ["index@10: warm_upstream_calls 0 -> 1", "index@10: warm_ms 10.0 -> 20.0"]
@@ -0,0 +1,104 @@
+import math
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+from rightsizing import PERCENTILES, RightSizingPolicy, build_right_sizing_report, fleet_percentiles, merge_rrd_utilization
+
+
+def test_fleet_percentiles_match_numpy_per_guest_and_ignore_padding() -> None:
+    rng: np.random.Generator = np.random.default_rng(3)
+    series: List[List[float]] = [list(rng.uniform(0, 100, 40)), list(rng.uniform(0, 10, 7)), [], [math.nan, 5.0, 15.0]]
+    percentiles, counts = fleet_percentiles(series)
+    assert counts.tolist() == [40, 7, 0, 2] and np.isnan(percentiles[2]).all()
+    for row_index in (0, 1, 3): assert np.allclose(percentiles[row_index], np.nanpercentile(series[row_index], PERCENTILES))
+
+
+def test_merge_weights_week_rows_that_precede_day_data() -> None:
+    day_rows: List[Dict[str, Any]] = [{"time": 1000, "cpu": 0.5, "mem": 50, "maxmem": 100}, {"time": 2800, "cpu": None, "mem": 10, "maxmem": 100}]
+    week_rows: List[Dict[str, Any]] = [{"time": 0, "cpu": 0.1, "mem": 20, "maxmem": 100}, {"time": 1000, "cpu": 0.9, "mem": 90, "maxmem": 100}]
+    cpu_values, ram_values = merge_rrd_utilization(day_rows, week_rows, week_weight=3)
+    assert cpu_values[:4] == [10.0, 10.0, 10.0, 50.0] and math.isnan(cpu_values[4]) and ram_values == [20.0, 20.0, 20.0, 50.0, 10.0]
+
+
+def _guest(vmid: int, status: str = "running", vcpu: int = 8, ram_mb: int = 16384) -> Dict[str, Any]:
+    return {"node": "pve1", "vmid": vmid, "name": f"vm{vmid}", "status": status, "current_vcpu": vcpu, "current_ram_mb": ram_mb}
+
+
+def test_idle_guest_is_downsized_to_p95_plus_headroom() -> None:
+    policy: RightSizingPolicy = RightSizingPolicy(min_samples=5)
+    rows: List[Dict[str, Any]] = build_right_sizing_report([_guest(100)], [[5.0] * 20], [[10.0] * 20], policy)
+    assert rows[0]["cpu_action"] == -1 and rows[0]["target_vcpu"] == math.ceil(8 * 5.0 * 1.3 / 100) # p95 5% + 30% pay
+    assert rows[0]["ram_action"] == -1 and rows[0]["target_ram_mb"] == 2048 # 16 GB * 12% = 1966 MB, 256 MB adıma yuvarlanır
+    assert rows[0]["cpu_p95"] == 5.0 and rows[0]["right_sizing_suggestion"] == "vCPU: 8 -> 1; RAM: 16384MB -> 2048MB"
+
+
+def test_short_spikes_raise_the_target_through_p99() -> None:
+    policy: RightSizingPolicy = RightSizingPolicy(min_samples=5)
+    cpu: List[float] = [5.0] * 95 + [100.0] * 5 # p95 düşük ama p99 tepede
+    rows: List[Dict[str, Any]] = build_right_sizing_report([_guest(100)], [cpu], [[50.0] * 100], policy)
+    assert rows[0]["cpu_action"] == 0 and rows[0]["target_vcpu"] == 8
+
+
+def test_busy_guest_is_upsized_and_small_samples_are_left_alone() -> None:
+    policy: RightSizingPolicy = RightSizingPolicy(min_samples=5)
+    rows: List[Dict[str, Any]] = build_right_sizing_report([_guest(100, vcpu=2), _guest(101), _guest(102, status="stopped")], [[95.0] * 20, [1.0] * 3, [1.0] * 20], [[50.0] * 20, [1.0] * 3, [1.0] * 20], policy)
+    assert rows[0]["cpu_action"] == 1 and rows[0]["target_vcpu"] == 3 and rows[0]["ram_action"] == 0
+    assert rows[1]["has_enough_samples"] is False and rows[1]["cpu_action"] == 0 and rows[1]["target_vcpu"] == 8
+    assert rows[2]["cpu_action"] == 0 and rows[2]["ram_action"] == 0 # yalnızca çalışan misafirler
+
+
+@pytest.fixture
+def reporter(monkeypatch: pytest.MonkeyPatch) -> Iterator[app.RightSizingReporter]:
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear(); app.RRD_CACHE.clear()
+    fleet_reporter: app.RightSizingReporter = app.RightSizingReporter(RightSizingPolicy(min_samples=5), interval_seconds=3600.0, state_backend=app.MemoryStateBackend())
+    monkeypatch.setattr(app, "RIGHT_SIZING_REPORTER", fleet_reporter)
+    yield fleet_reporter
+    app.CACHED_VM_CONFIGS.clear(); app.PERFORMANCE_HISTORY.clear(); app.RRD_CACHE.clear()
+
+
+def _rrd(cpu: float, count: int, step: int) -> List[Dict[str, Any]]:
+    now: int = int(time.time()) // step * step
+    return [{"time": now - step * (count - 1 - i), "cpu": cpu, "mem": 1024.0, "maxmem": 8192.0} for i in range(count)]
+
+
+def test_report_is_built_from_day_and_week_rrd(reporter: app.RightSizingReporter, fake_proxmox: FakeProxmox) -> None:
+    app.CACHED_VM_CONFIGS.update({"100": {"node": "pve1", "name": "web", "type": "qemu", "current_vcpu": 8, "current_ram_mb": 8192}, "200": {"node": "pve1", "name": "dns", "type": "lxc", "current_vcpu": 1, "current_ram_mb": 512}})
+    app._ensure_perf_history(("pve1", 100)).status_text = "running"
+    fake_proxmox.routes["GET nodes/pve1/qemu/100/rrddata"] = lambda timeframe, cf: _rrd(0.02, 70, app.RRD_STEP_SECONDS[timeframe])
+    body: Dict[str, Any] = app.app.test_client().get("/api/right_sizing_report?actionable=1").get_json()
+    assert body["summary"] == {"guests": 2, "downsize": 1, "upsize": 0, "insufficient_samples": 1} # LXC'nin RRD verisi yok
+    row: Dict[str, Any] = body["guests"][0]
+    assert row["vmid"] == 100 and row["type"] == "qemu" and row["cpu_p95"] == 2.0 and row["ram_p95"] == 12.5 and row["samples"] > 70
+    assert reporter.entry_for("pve1", 100) == row and fake_proxmox.count("GET nodes/pve1/qemu/100/rrddata") == 2
+    app.app.test_client().get("/api/right_sizing_report")
+    assert fake_proxmox.count("GET nodes/pve1/qemu/100/rrddata") == 2 and reporter.stats["refreshes"] == 1 # taze rapor önbellekten
+
+
+def test_report_entry_drives_inline_suggestion(reporter: app.RightSizingReporter, fake_proxmox: FakeProxmox) -> None:
+    app.CACHED_VM_CONFIGS["100"] = {"node": "pve1", "name": "web", "type": "qemu", "current_vcpu": 8, "current_ram_mb": 8192}
+    app._ensure_perf_history(("pve1", 100)).status_text = "running"
+    fake_proxmox.routes["GET nodes/pve1/qemu/100/rrddata"] = lambda timeframe, cf: _rrd(0.02, 70, app.RRD_STEP_SECONDS[timeframe])
+    reporter.refresh(fake_proxmox)
+    detail: Dict[str, Any] = app.calculate_right_sizing_suggestions({"node": "pve1", "vmid": 100, "status": "running", "current_vcpu": 8, "current_ram_mb": 8192, "history_count": 0})
+    assert detail["is_underutilized"] is True and "vCPU: 8 -> 1" in detail["right_sizing_suggestion"]
+
+
+def test_history_reads_wait_for_the_collector_lock(reporter: app.RightSizingReporter, fake_proxmox: FakeProxmox) -> None:
+    app.CACHED_VM_CONFIGS["100"] = {"node": "pve1", "name": "web", "type": "qemu", "current_vcpu": 2, "current_ram_mb": 1024}
+    history: Any = app._ensure_perf_history(("pve1", 100)); history.status_text = "running"; history.append({"cpu": 5.0, "ram": 10.0})
+    results: Dict[str, Any] = {}; collector_holds_lock: threading.Event = threading.Event(); collector_done: threading.Event = threading.Event()
+    def collector_round() -> None:
+        with app.PERF_HISTORY_LOCK: collector_holds_lock.set(); collector_done.wait(5.0)
+    def read_history() -> None:
+        results["report"] = reporter.refresh(fake_proxmox)
+    collector: threading.Thread = threading.Thread(target=collector_round); collector.start(); collector_holds_lock.wait(5.0)
+    reader: threading.Thread = threading.Thread(target=read_history); reader.start(); reader.join(0.2)
+    assert reader.is_alive() and not results # Toplayıcı turu bitene kadar rapor geçmişi okumaz
+    collector_done.set(); reader.join(5.0); collector.join(5.0)
+    assert results["report"]["guests"][0]["status"] == "running" and app.recent_history_values("pve1", 100, "cpu") == [5.0]
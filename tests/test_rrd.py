@@ -0,0 +1,78 @@
+import math
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+
+
+def test_short_series_are_returned_unchanged() -> None:
+    labels: List[int] = [1, 2, 3]; values: List[Optional[float]] = [1.0, None, 3.0]
+    assert app.downsample_lttb(labels, values, 10) == (labels, values)
+
+
+def test_lttb_keeps_endpoints_and_point_budget() -> None:
+    labels: List[int] = list(range(1000)); values: List[Optional[float]] = [math.sin(i / 20.0) for i in labels]
+    out_labels, out_values = app.downsample_lttb(labels, values, 50)
+    assert len(out_labels) == len(out_values) == 50 and out_labels[0] == 0 and out_labels[-1] == 999
+    assert out_labels == sorted(out_labels) and all(values[t] == v for t, v in zip(out_labels, out_values))
+
+
+def test_lttb_keeps_isolated_peaks() -> None:
+    labels: List[int] = list(range(500)); values: List[Optional[float]] = [1.0] * 500; values[137] = 95.0; values[402] = -40.0
+    out_labels, out_values = app.downsample_lttb(labels, values, 20)
+    assert 95.0 in out_values and -40.0 in out_values and 137 in out_labels
+
+
+def test_lttb_skips_missing_values() -> None:
+    labels: List[int] = list(range(100)); values: List[Optional[float]] = [None if i % 2 else float(i) for i in labels]
+    out_labels, out_values = app.downsample_lttb(labels, values, 60) # 50 geçerli nokta bütçeye sığar
+    assert None not in out_values and len(out_labels) == 50
+    out_labels, out_values = app.downsample_lttb(labels, values, 10)
+    assert None not in out_values and len(out_labels) == 10
+
+
+@pytest.fixture(autouse=True)
+def clean_rrd_cache() -> Iterator[None]:
+    app.RRD_CACHE.clear(); app.CACHED_VM_CONFIGS.clear()
+    yield
+    app.RRD_CACHE.clear(); app.CACHED_VM_CONFIGS.clear()
+
+
+def _rrd_points(count: int) -> List[Dict[str, Any]]:
+    now: int = int(time.time()) // 60 * 60
+    return [{"time": now - 60 * (count - 1 - i), "cpu": 0.01 * (i % 50), "mem": 1024.0 * i, "maxmem": 1024.0 * count} for i in range(count)]
+
+
+def test_rrddata_is_cached_per_timeframe_and_cf() -> None:
+    prox: FakeProxmox = FakeProxmox({"GET nodes/pve1/qemu/100/rrddata": _rrd_points(5)})
+    app.get_cached_rrd_data(prox, "pve1", 100, "hour"); app.get_cached_rrd_data(prox, "pve1", 100, "hour")
+    assert prox.count("GET nodes/pve1/qemu/100/rrddata") == 1
+    app.get_cached_rrd_data(prox, "pve1", 100, "hour", "MAX"); app.get_cached_rrd_data(prox, "pve1", 100, "day")
+    assert prox.count("GET nodes/pve1/qemu/100/rrddata") == 3
+
+
+def test_rrd_cache_evicts_least_recently_used(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "RRD_CACHE_MAX_ENTRIES", 2)
+    prox: FakeProxmox = FakeProxmox({f"GET nodes/pve1/qemu/{vmid}/rrddata": _rrd_points(2) for vmid in (100, 101, 102)})
+    app.get_cached_rrd_data(prox, "pve1", 100); app.get_cached_rrd_data(prox, "pve1", 101); app.get_cached_rrd_data(prox, "pve1", 100)
+    app.get_cached_rrd_data(prox, "pve1", 102)
+    assert [key[1] for key in app.RRD_CACHE] == [100, 102]
+
+
+def test_metric_history_downsamples_and_uses_rrd_maxmem(fake_proxmox: FakeProxmox) -> None:
+    app.CACHED_VM_CONFIGS["100"] = {"node": "pve1", "name": "web", "type": "qemu", "current_vcpu": 1, "current_ram_mb": 1024}
+    fake_proxmox.routes["GET nodes/pve1/qemu/100/rrddata"] = _rrd_points(300)
+    client: Any = app.app.test_client()
+    body: Dict[str, Any] = client.get("/api/vm_metric_history/100/ram_usage_percent?timeframe=hour&max_points=40").get_json()
+    assert body["total_points"] == 300 and len(body["labels"]) == 40 and body["values"][-1] == round(299 / 300 * 100, 2)
+    assert client.get("/api/vm_metric_history/100/cpu_usage_percent?timeframe=hour").get_json()["total_points"] == 300
+    assert fake_proxmox.calls == ["GET nodes/pve1/qemu/100/rrddata"] # ikinci metrik aynı önbellek girdisinden, status.current çağrılmadan
+
+
+def test_metric_history_rejects_bad_parameters(fake_proxmox: FakeProxmox) -> None:
+    client: Any = app.app.test_client()
+    assert client.get("/api/vm_metric_history/100/cpu_usage_percent?cf=MIN").status_code == 400
+    assert client.get("/api/vm_metric_history/100/cpu_usage_percent?max_points=2").status_code == 400
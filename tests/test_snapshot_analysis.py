@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+
+from snapshot_analysis import SECONDS_PER_DAY, analyze_snapshots
+
+NOW_TS: int = 1_700_000_000
+GUEST = ('pve1', 100, 'qemu')
+
+
+def _snap(name: str, parent: Optional[str], age_days: Optional[int]) -> Dict[str, Any]:
+    return {"snap_name": name, "parent": parent, "create_time_unix": NOW_TS - age_days * SECONDS_PER_DAY if age_days is not None else None, "vm_status": "running"}
+
+
+def _by_name(snapshots: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {snap['snap_name']: snap for snap in snapshots}
+
+
+def test_active_chain_depth_and_subtree_size() -> None:
+    """base -> mid -> head zinciri etkin; mid'den ayrılan eski dal etkin zincirde değildir."""
+    snaps = [_snap('base', None, 90), _snap('mid', 'base', 60), _snap('head', 'mid', 40), _snap('branch', 'mid', 50), {"snap_name": "current", "parent": "head"}]
+    analysis = analyze_snapshots({GUEST: snaps}, NOW_TS, 30); by_name = _by_name(analysis.snapshots)
+    assert 'current' not in by_name
+    assert [by_name[name]['depth'] for name in ('base', 'mid', 'head', 'branch')] == [0, 1, 2, 2]
+    assert [by_name[name]['subtree_size'] for name in ('base', 'mid', 'head', 'branch')] == [4, 3, 1, 1]
+    assert [by_name[name]['on_active_chain'] for name in ('base', 'mid', 'head', 'branch')] == [True, True, True, False]
+    assert [snap['snap_name'] for snap in analysis.stale_leaves] == ['branch'] # head eski ama etkin zincirin ucu
+    assert analysis.orphaned_old_roots == [] # base eski ama etkin zincirin kökü
+
+
+def test_orphaned_old_root_and_stale_leaf_flags() -> None:
+    snaps = [_snap('lost', None, 45), _snap('fresh', None, 5), _snap('root', None, 100), _snap('tip', 'root', 10), {"snap_name": "current", "parent": "tip"}]
+    by_name = _by_name(analyze_snapshots({GUEST: snaps}, NOW_TS, 30).snapshots)
+    assert by_name['lost']['is_orphaned_old_root'] and by_name['lost']['is_stale_leaf']
+    assert not by_name['fresh']['is_orphaned_old_root'] and not by_name['fresh']['is_stale_leaf'] # Yeni snapshot işaretlenmez
+    assert not by_name['root']['is_orphaned_old_root'] and by_name['root']['on_active_chain']
+    assert not by_name['tip']['is_old'] and by_name['tip']['depth'] == 1
+
+
+def test_missing_parent_becomes_root_and_cycles_are_broken() -> None:
+    snaps = [_snap('child', 'deleted-parent', 40), _snap('a', 'b', 40), _snap('b', 'a', 40)]
+    analysis = analyze_snapshots({GUEST: snaps}, NOW_TS, 30); forest = analysis.forests[GUEST]; by_name = _by_name(analysis.snapshots)
+    assert by_name['child']['depth'] == 0 and forest.nodes['child'] in forest.roots
+    assert sorted(by_name[name]['depth'] for name in ('a', 'b')) == [0, 1] # Döngü tek bir köke indirgenir
+    assert not by_name['child']['is_orphaned_old_root'] # Ebeveyn alanı dolu olduğu için yetim kök sayılmaz
+
+
+def test_old_days_minus_one_marks_every_dated_snapshot_and_idle_guest() -> None:
+    snaps = [_snap('today', None, 0), _snap('undated', None, None)]
+    analysis = analyze_snapshots({GUEST: snaps}, NOW_TS, -1); by_name = _by_name(analysis.snapshots)
+    assert by_name['today']['is_old'] and not by_name['undated']['is_old']
+    assert not analysis.is_idle(GUEST, NOW_TS, 7) and analysis.is_idle(GUEST, NOW_TS + 8 * SECONDS_PER_DAY, 7)
+    assert not analysis.is_idle(('pve1', 999, 'lxc'), NOW_TS, 7)
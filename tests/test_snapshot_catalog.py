@@ -0,0 +1,75 @@
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from snapshot_analysis import SECONDS_PER_DAY, analyze_snapshots
+from snapshot_catalog import SORT_FIELDS, SnapshotCatalog, _sort_key, decode_cursor, encode_cursor, snapshot_id
+
+NOW_TS: int = 1_700_000_000
+OLD_DAYS: int = 30
+
+
+def _build_catalog(seed: int = 7) -> SnapshotCatalog:
+    """Aynı ad/tarih değerlerini paylaşan, tarihi bilinmeyen ve farklı node/türdeki snapshot'lardan bir katalog kurar."""
+    rng: random.Random = random.Random(seed); snapshots_by_guest: Dict[Any, List[Dict[str, Any]]] = {}
+    for vmid in range(100, 112):
+        node: str = f"pve{vmid % 3}"; resource_type: str = 'lxc' if vmid % 4 == 0 else 'qemu'; guest_snaps: List[Dict[str, Any]] = []
+        for index in range(rng.randint(1, 6)):
+            create_time: Optional[int] = None if rng.random() < 0.1 else NOW_TS - rng.choice([1, 10, 31, 45, 45, 200]) * SECONDS_PER_DAY
+            guest_snaps.append({"snap_name": rng.choice(['daily', 'Weekly', 'pre-upgrade', f"s{index}"]) + ('' if index == 0 else f"-{index}"), "parent": guest_snaps[-1]['snap_name'] if guest_snaps and rng.random() < 0.7 else None,
+                                "create_time_unix": create_time, "node": node, "vmid": vmid, "resource_type": resource_type, "resource_name": f"guest-{vmid % 5}",
+                                "vm_status": 'stopped' if vmid % 2 else 'running'})
+        guest_snaps.append({"snap_name": "current", "parent": guest_snaps[-1]['snap_name']})
+        snapshots_by_guest[(node, vmid, resource_type)] = guest_snaps
+    return SnapshotCatalog(analyze_snapshots(snapshots_by_guest, NOW_TS, OLD_DAYS), NOW_TS, OLD_DAYS)
+
+
+def _all_pages(catalog: SnapshotCatalog, limit: int, **query: Any) -> List[str]:
+    ids: List[str] = []; cursor: Optional[str] = None
+    while True:
+        page: Dict[str, Any] = catalog.query(limit=limit, cursor=cursor, **query)
+        assert len(page['items']) <= limit
+        ids.extend(item['id'] for item in page['items']); cursor = page['next_cursor']
+        if cursor is None: return ids
+
+
+def _full_sort(catalog: SnapshotCatalog, sort_by: str, order: str, keep: Any = lambda snap: True) -> List[str]:
+    rows = [(snap, snapshot_id(snap)) for snap in catalog.snapshots if keep(snap)]
+    return [snap_id for snap, snap_id in sorted(rows, key=lambda row: _sort_key(sort_by, row[0], row[1]), reverse=order == 'desc')]
+
+
+@pytest.mark.parametrize('sort_by', SORT_FIELDS)
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('limit', [1, 3, 1000])
+def test_cursor_pages_match_full_sort(sort_by: str, order: str, limit: int) -> None:
+    catalog: SnapshotCatalog = _build_catalog()
+    assert _all_pages(catalog, limit, sort_by=sort_by, order=order) == _full_sort(catalog, sort_by, order)
+
+
+@pytest.mark.parametrize('sort_by', SORT_FIELDS)
+def test_filtered_cursor_pages_match_full_sort(sort_by: str) -> None:
+    catalog: SnapshotCatalog = _build_catalog(); older_than_ts: int = NOW_TS - 40 * SECONDS_PER_DAY
+    expected: List[str] = _full_sort(catalog, sort_by, 'desc', lambda snap: snap['node'] == 'pve1' and snap['vm_status'] == 'stopped' and snap['is_old']
+                                     and snap['create_time_unix'] is not None and snap['create_time_unix'] <= older_than_ts)
+    assert expected # Senaryo boş sonuçla geçmesin
+    assert _all_pages(catalog, 2, sort_by=sort_by, order='desc', node='pve1', flags=('stopped_vm', 'old'), older_than_days=40) == expected
+
+
+def test_total_counts_group_without_residual_filters() -> None:
+    catalog: SnapshotCatalog = _build_catalog()
+    page: Dict[str, Any] = catalog.query(limit=2, resource_type='lxc')
+    assert page['total'] == sum(1 for snap in catalog.snapshots if snap['resource_type'] == 'lxc')
+    assert catalog.query(limit=2, resource_type='lxc', node='pve0')['total'] is None
+
+
+def test_cursor_is_bound_to_its_sort() -> None:
+    cursor: str = encode_cursor('name', 'asc', ('daily', 'pve0/qemu/101/daily'))
+    assert decode_cursor(cursor, 'name', 'asc') == ('daily', 'pve0/qemu/101/daily')
+    with pytest.raises(ValueError): decode_cursor(cursor, 'date', 'asc')
+    with pytest.raises(ValueError): decode_cursor('bozuk!imlec', 'name', 'asc')
+
+
+@pytest.mark.parametrize("sort_by, key", [('date', ('a', 1)), ('date', (1, 1700000000)), ('date', (True, 1, 'x')), ('name', ('daily', 5)), ('resource', ('web', '1700000000', 'x')), ('resource', ('web', None, 'x'))])
+def test_cursor_key_must_match_the_sort_key_shape(sort_by: str, key: Tuple[Any, ...]) -> None:
+    with pytest.raises(ValueError): decode_cursor(encode_cursor(sort_by, 'desc', key), sort_by, 'desc')
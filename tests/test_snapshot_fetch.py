@@ -0,0 +1,50 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+
+
+def _guests(nodes: Dict[str, int]) -> List[Dict[str, Any]]:
+    return [{"node": node, "vmid": 100 * n + i, "type": "qemu", "name": f"{node}-{i}", "status": "running"} for n, (node, count) in enumerate(nodes.items(), start=1) for i in range(count)]
+
+
+def _snapshot_list(vmid: int) -> List[Dict[str, Any]]:
+    return [{"name": "before-upgrade", "snaptime": 1700000000 + vmid, "description": "", "parent": None}, {"name": "current", "parent": "before-upgrade", "running": 1}]
+
+
+def test_each_guest_is_asked_once_and_current_is_kept_for_ancestry() -> None:
+    guests: List[Dict[str, Any]] = _guests({"pve1": 2, "pve2": 1})
+    prox: FakeProxmox = FakeProxmox({f"GET nodes/{g['node']}/qemu/{g['vmid']}/snapshot": _snapshot_list(g['vmid']) for g in guests})
+    by_resource: Dict[app.ResourceKeyType, List[Dict[str, Any]]] = app.collect_snapshots_for_resources(prox, guests)
+    assert len(prox.calls) == 3 and len(set(prox.calls)) == 3
+    assert [s["snap_name"] for s in by_resource[("pve1", 100, "qemu")]] == ["before-upgrade", "current"]
+    flat: List[Dict[str, Any]] = app.flatten_snapshots_without_current(guests, by_resource)
+    assert [s["snap_name"] for s in flat] == ["before-upgrade"] * 3 and flat[0]["resource_name"] == "pve1-0"
+
+
+def test_concurrency_is_bounded_per_node(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(app, "SNAPSHOT_FETCH_PER_NODE", 2)
+    lock: threading.Lock = threading.Lock(); active: Dict[str, int] = {}; peak: Dict[str, int] = {}
+    def slow_snapshot_list(node: str, vmid: int) -> Callable[..., List[Dict[str, Any]]]:
+        def handler(**_params: Any) -> List[Dict[str, Any]]:
+            with lock: active[node] = active.get(node, 0) + 1; peak[node] = max(peak.get(node, 0), active[node])
+            time.sleep(0.02)
+            with lock: active[node] -= 1
+            return _snapshot_list(vmid)
+        return handler
+    guests: List[Dict[str, Any]] = _guests({"pve1": 6, "pve2": 6})
+    prox: FakeProxmox = FakeProxmox({f"GET nodes/{g['node']}/qemu/{g['vmid']}/snapshot": slow_snapshot_list(g['node'], g['vmid']) for g in guests})
+    by_resource: Dict[app.ResourceKeyType, List[Dict[str, Any]]] = app.collect_snapshots_for_resources(prox, guests)
+    assert all(len(snaps) == 2 for snaps in by_resource.values()) and len(by_resource) == 12
+    assert peak == {"pve1": 2, "pve2": 2}
+
+
+def test_failed_guest_yields_an_empty_list_without_stopping_others() -> None:
+    guests: List[Dict[str, Any]] = _guests({"pve1": 2})
+    prox: FakeProxmox = FakeProxmox({"GET nodes/pve1/qemu/100/snapshot": RuntimeError("bağlantı koptu"), "GET nodes/pve1/qemu/101/snapshot": _snapshot_list(101)})
+    by_resource: Dict[app.ResourceKeyType, List[Dict[str, Any]]] = app.collect_snapshots_for_resources(prox, guests)
+    assert by_resource[("pve1", 100, "qemu")] == [] and len(by_resource[("pve1", 101, "qemu")]) == 2
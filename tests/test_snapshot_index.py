@@ -0,0 +1,88 @@
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+import app
+from fake_proxmox import FakeProxmox
+
+GUESTS: List[Dict[str, Any]] = [{"node": "pve1", "vmid": 100, "type": "qemu", "name": "web", "status": "running"}, {"node": "pve1", "vmid": 200, "type": "lxc", "name": "dns", "status": "running"}]
+
+
+@pytest.fixture(autouse=True)
+def clean_caches() -> Iterator[None]:
+    app.CACHED_VM_CONFIGS.clear()
+    yield
+    app.CACHED_VM_CONFIGS.clear()
+
+
+def _prox() -> FakeProxmox:
+    return FakeProxmox({"GET cluster/tasks": [{"type": "qmsnapshot", "id": "100", "upid": "UPID:pve1:1", "starttime": 10, "endtime": 11}],
+                        "GET nodes/pve1/qemu/100/snapshot": [{"name": "base", "snaptime": 100}, {"name": "upgrade", "snaptime": 200, "parent": "base"}, {"name": "current", "parent": "upgrade"}],
+                        "GET nodes/pve1/lxc/200/snapshot": [{"name": "current"}]})
+
+
+def _snapshot_calls(prox: FakeProxmox) -> List[str]:
+    return [call for call in prox.calls if call.endswith("/snapshot")]
+
+
+def test_unchanged_guests_are_served_from_the_index() -> None:
+    prox: FakeProxmox = _prox(); index: app.SnapshotIndex = app.SnapshotIndex(max_age_seconds=900.0)
+    first: Dict[app.ResourceKeyType, List[Dict[str, Any]]] = index.refresh(prox, GUESTS); prox.reset_calls()
+    second: Dict[app.ResourceKeyType, List[Dict[str, Any]]] = index.refresh(prox, GUESTS)
+    assert second == first and _snapshot_calls(prox) == [] and prox.calls == ["GET cluster/tasks"] and index.stats["hits"] == 2
+    second[("pve1", 100, "qemu")][0]["snap_name"] = "degisti" # dönen listeler kopyadır
+    assert index.refresh(prox, GUESTS)[("pve1", 100, "qemu")][0]["snap_name"] == "base"
+
+
+def test_new_snapshot_task_or_config_change_refetches_only_that_guest() -> None:
+    prox: FakeProxmox = _prox(); index: app.SnapshotIndex = app.SnapshotIndex(max_age_seconds=900.0); index.refresh(prox, GUESTS); prox.reset_calls()
+    prox.routes["GET cluster/tasks"] = prox.routes["GET cluster/tasks"] + [{"type": "vzsnapshot", "id": "200", "upid": "UPID:pve1:2", "starttime": 20}]
+    index.refresh(prox, GUESTS)
+    assert _snapshot_calls(prox) == ["GET nodes/pve1/lxc/200/snapshot"]
+    prox.reset_calls(); index.refresh(prox, GUESTS) # görev hâlâ sürüyor; bittiğinde işaret yine değişir
+    assert _snapshot_calls(prox) == []
+    prox.routes["GET cluster/tasks"][1]["endtime"] = 25; app.CACHED_VM_CONFIGS["100"] = {"node": "pve1", "type": "qemu", "config_marker": "yeni", "digest": "d2"}; prox.reset_calls()
+    index.refresh(prox, GUESTS)
+    assert sorted(_snapshot_calls(prox)) == ["GET nodes/pve1/lxc/200/snapshot", "GET nodes/pve1/qemu/100/snapshot"]
+
+
+def test_missing_task_list_or_old_entries_refetch_everything(monkeypatch: pytest.MonkeyPatch) -> None:
+    prox: FakeProxmox = _prox(); index: app.SnapshotIndex = app.SnapshotIndex(max_age_seconds=900.0); index.refresh(prox, GUESTS); prox.reset_calls()
+    del prox.routes["GET cluster/tasks"]; index.refresh(prox, GUESTS)
+    assert len(_snapshot_calls(prox)) == 2
+    prox.routes.update(_prox().routes); index.max_age_seconds = 0.0; prox.reset_calls(); index.refresh(prox, GUESTS)
+    assert len(_snapshot_calls(prox)) == 2
+
+
+def test_guests_that_disappear_are_evicted() -> None:
+    prox: FakeProxmox = _prox(); index: app.SnapshotIndex = app.SnapshotIndex(max_age_seconds=900.0); index.refresh(prox, GUESTS)
+    assert set(index.refresh(prox, GUESTS[:1])) == {("pve1", 100, "qemu")} and index.stats["evictions"] == 1
+
+
+def test_local_delete_reparents_children_without_refetch() -> None:
+    prox: FakeProxmox = _prox(); index: app.SnapshotIndex = app.SnapshotIndex(max_age_seconds=900.0); index.refresh(prox, GUESTS)
+    index.apply_snapshot_deleted("pve1", "qemu", 100, "base", "UPID:pve1:3")
+    prox.routes["GET cluster/tasks"] = [{"type": "qmdelsnapshot", "id": "100", "upid": "UPID:pve1:3", "starttime": 30, "endtime": 31}]; prox.reset_calls()
+    snapshots: List[Dict[str, Any]] = index.refresh(prox, GUESTS)[("pve1", 100, "qemu")]
+    assert [(s["snap_name"], s["parent"]) for s in snapshots] == [("upgrade", None), ("current", "upgrade")] and _snapshot_calls(prox) == []
+
+
+def test_deletes_in_one_worker_invalidate_the_index_of_another(tmp_path: Any) -> None:
+    from state_backend import SQLiteStateBackend
+    backends: List[SQLiteStateBackend] = [SQLiteStateBackend(str(tmp_path / "state.db")) for _ in range(2)]
+    deleting_worker: app.SnapshotIndex = app.SnapshotIndex(900.0, backends[0]); other_worker: app.SnapshotIndex = app.SnapshotIndex(900.0, backends[1])
+    other_prox: FakeProxmox = _prox(); other_worker.refresh(other_prox, GUESTS); generation: int = other_worker.current_generation()
+    deleting_worker.apply_snapshot_deleted("pve1", "qemu", 100, "base", "UPID:pve1:3") # Bu worker'ın dizininde misafir yok; olay yine yayımlanır
+    assert other_worker.current_generation() > generation and other_worker.stats["shared_invalidations"] == 1
+    other_prox.routes["GET nodes/pve1/qemu/100/snapshot"] = [{"name": "upgrade", "snaptime": 200}, {"name": "current", "parent": "upgrade"}]; other_prox.reset_calls()
+    snapshots: List[Dict[str, Any]] = other_worker.refresh(other_prox, GUESTS)[("pve1", 100, "qemu")]
+    assert [s["snap_name"] for s in snapshots] == ["upgrade", "current"] and _snapshot_calls(other_prox) == ["GET nodes/pve1/qemu/100/snapshot"]
+    generation = deleting_worker.current_generation()
+    assert deleting_worker.current_generation() == generation and deleting_worker.stats["shared_invalidations"] == 0 # Kendi olayı dizini düşürmez
+    for backend in backends: backend.close()
+
+
+def test_memory_backend_does_not_publish_delete_events() -> None:
+    backend: app.MemoryStateBackend = app.MemoryStateBackend(); index: app.SnapshotIndex = app.SnapshotIndex(900.0, backend)
+    index.apply_snapshot_deleted("pve1", "qemu", 100, "base", None)
+    assert index.state_backend is None and backend.get_all(app.SNAPSHOT_INDEX_EVENTS_NAMESPACE) == {}
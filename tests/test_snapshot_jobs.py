@@ -0,0 +1,167 @@
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pytest
+from proxmoxer.core import ResourceException
+
+import snapshot_jobs
+from fake_proxmox import FakeProxmox
+from snapshot_jobs import SnapshotDeleteQueue
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(snapshot_jobs.time, "sleep", lambda _seconds: None)
+
+
+def _upid(vmid: int, snap_name: str) -> str:
+    return f"UPID:pve1:0000{vmid}:00000001:65000000:qmdelsnapshot:{vmid}-{snap_name}:root@pam:"
+
+
+def _wait_finished(queue: SnapshotDeleteQueue, job_id: str) -> Dict[str, Any]:
+    job: Optional[Dict[str, Any]] = queue.get(job_id)
+    while job is not None and job["status"] in ('queued', 'running'): job = queue.wait_for_update(job_id, job["version"], timeout=5.0)
+    assert job is not None
+    return job
+
+
+def _deleting(prox: FakeProxmox, node: str, vmid: int, snap_name: str, task_statuses: Optional[List[Dict[str, Any]]] = None) -> None:
+    upid: str = _upid(vmid, snap_name); statuses: List[Dict[str, Any]] = list(task_statuses or [{"status": "stopped", "exitstatus": "OK"}])
+    prox.routes[f"DELETE nodes/{node}/qemu/{vmid}/snapshot/{snap_name}"] = lambda: upid
+    prox.routes[f"GET nodes/{node}/tasks/{upid}/status"] = lambda: statuses.pop(0) if len(statuses) > 1 else statuses[0]
+
+
+def test_snapshots_of_one_guest_are_deleted_in_order() -> None:
+    prox: FakeProxmox = FakeProxmox()
+    for vmid, snap_name in ((100, "a"), (100, "b"), (100, "c"), (101, "x")): _deleting(prox, "pve1", vmid, snap_name)
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, max_workers=4, per_node=2)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/100/a", "pve1/qemu/101/x", "pve1/qemu/100/b", "pve1/qemu/100/c"]).job_id)
+    assert job["status"] == "completed" and job["counts"] == {"total": 4, "done": 4, "error": 0, "pending": 0} and job["finished_at"]
+    assert [c for c in prox.calls if c.startswith("DELETE nodes/pve1/qemu/100/")] == [f"DELETE nodes/pve1/qemu/100/snapshot/{s}" for s in "abc"]
+    assert all(item["upid"].startswith("UPID:") for item in job["items"]) and queue.stats["deleted"] == 4
+
+
+def test_invalid_ids_fail_without_upstream_calls() -> None:
+    prox: FakeProxmox = FakeProxmox(); queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/abc/snap", "pve1/vm/100/snap"]).job_id)
+    assert job["status"] == "failed" and [item["error"] for item in job["items"]] == ["Geçersiz format"] * 2 and prox.calls == []
+
+
+def test_locked_guest_is_retried_with_backoff() -> None:
+    prox: FakeProxmox = FakeProxmox(); _deleting(prox, "pve1", 100, "a"); attempts: List[int] = []
+    success: Callable[[], Any] = prox.routes["DELETE nodes/pve1/qemu/100/snapshot/a"]
+    def locked_once() -> Any:
+        attempts.append(1)
+        if len(attempts) == 1: raise ResourceException(500, "Internal Server Error", "VM is locked (snapshot-delete)")
+        return success()
+    prox.routes["DELETE nodes/pve1/qemu/100/snapshot/a"] = locked_once
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, lock_retries=3)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/100/a"]).job_id)
+    assert job["status"] == "completed" and job["items"][0]["attempts"] == 2 and queue.stats["lock_retries"] == 1
+
+
+def test_other_errors_are_not_retried() -> None:
+    prox: FakeProxmox = FakeProxmox({"DELETE nodes/pve1/qemu/100/snapshot/a": ResourceException(500, "Internal Server Error", "snapshot 'a' does not exist")})
+    errors: List[Exception] = []; queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, lock_retries=3, on_error=errors.append)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/100/a"]).job_id)
+    assert job["status"] == "failed" and job["items"][0]["attempts"] == 1 and len(errors) == 1 and queue.stats["errors"] == 1
+
+
+def test_task_is_polled_until_it_stops() -> None:
+    prox: FakeProxmox = FakeProxmox()
+    _deleting(prox, "pve1", 100, "a", [{"status": "running"}, {"status": "running"}, {"status": "stopped", "exitstatus": "OK"}])
+    _deleting(prox, "pve1", 101, "b", [{"status": "stopped", "exitstatus": "snapshot busy"}])
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, lock_retries=0)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/100/a", "pve1/qemu/101/b"]).job_id)
+    assert prox.count(f"GET nodes/pve1/tasks/{_upid(100, 'a')}/status") == 3
+    assert job["status"] == "partial" and job["items"][1]["error"] == "Görev başarısız: snapshot busy"
+
+
+def test_task_poll_errors_resume_polling_the_same_upid() -> None:
+    prox: FakeProxmox = FakeProxmox(); _deleting(prox, "pve1", 100, "a"); status_route: str = f"GET nodes/pve1/tasks/{_upid(100, 'a')}/status"
+    answers: List[Any] = [ConnectionError("bağlantı koptu"), ResourceException(401, "Unauthorized", "invalid ticket"), {"status": "stopped", "exitstatus": "OK"}]
+    def flaky_status() -> Any:
+        answer: Any = answers.pop(0)
+        if isinstance(answer, Exception): raise answer
+        return answer
+    prox.routes[status_route] = flaky_status; errors: List[Exception] = []
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, on_error=errors.append)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/100/a"]).job_id)
+    assert job["status"] == "completed" and job["items"][0]["upid"] == _upid(100, "a") and job["items"][0]["error"] is None
+    assert prox.count("DELETE nodes/pve1/qemu/100/snapshot/a") == 1 and prox.count(status_route) == 3 and len(errors) == 2 and queue.stats["poll_retries"] == 2
+
+
+def test_task_poll_gives_up_without_deleting_again() -> None:
+    prox: FakeProxmox = FakeProxmox(); _deleting(prox, "pve1", 100, "a"); prox.routes[f"GET nodes/pve1/tasks/{_upid(100, 'a')}/status"] = ConnectionError("got timeout")
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, lock_retries=3, poll_error_retries=2)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/100/a"]).job_id)
+    assert job["status"] == "failed" and job["items"][0]["upid"] == _upid(100, "a") and job["items"][0]["error"].startswith("Görev durumu alınamadı (3 deneme)")
+    assert prox.count("DELETE nodes/pve1/qemu/100/snapshot/a") == 1 and queue.stats["lock_retries"] == 0
+
+
+def test_missing_snapshot_on_a_retry_counts_as_deleted() -> None:
+    prox: FakeProxmox = FakeProxmox(); attempts: List[int] = []; deleted: List[Dict[str, Any]] = []
+    def delete_after_timeout() -> Any:
+        attempts.append(1)
+        if len(attempts) == 1: raise ResourceException(500, "Internal Server Error", "got timeout") # Proxmox silmeyi yine de tamamladı
+        raise ResourceException(500, "Internal Server Error", "snapshot 'a' does not exist")
+    prox.routes["DELETE nodes/pve1/qemu/100/snapshot/a"] = delete_after_timeout
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, lock_retries=3, on_deleted=deleted.append)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(["pve1/qemu/100/a"]).job_id)
+    assert job["status"] == "completed" and job["items"][0]["attempts"] == 2 and job["items"][0]["error"] is None
+    assert queue.stats["deleted"] == 1 and queue.stats["errors"] == 0 and [item["snap_name"] for item in deleted] == ["a"]
+
+
+def test_guest_and_node_concurrency_limits() -> None:
+    prox: FakeProxmox = FakeProxmox(); lock: threading.Lock = threading.Lock(); active: Dict[str, int] = {}; peak: Dict[str, int] = {}; release: threading.Event = threading.Event()
+    for vmid in range(100, 106):
+        for snap_name in ("a", "b"):
+            def deleting(vmid: int = vmid, snap_name: str = snap_name) -> str:
+                with lock:
+                    for key in ("node", f"vm{vmid}"): active[key] = active.get(key, 0) + 1; peak[key] = max(peak.get(key, 0), active[key])
+                release.wait(0.01)
+                with lock:
+                    for key in ("node", f"vm{vmid}"): active[key] -= 1
+                return "OK" # UPID döndürmeyen eşzamanlı silme
+            prox.routes[f"DELETE nodes/pve1/qemu/{vmid}/snapshot/{snap_name}"] = deleting
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, max_workers=8, per_node=3)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit([f"pve1/qemu/{vmid}/{s}" for vmid in range(100, 106) for s in ("a", "b")]).job_id)
+    assert job["status"] == "completed" and peak["node"] == 3 and all(peak[f"vm{vmid}"] == 1 for vmid in range(100, 106))
+
+
+def test_only_finished_jobs_are_pruned() -> None:
+    prox: FakeProxmox = FakeProxmox(); queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, max_jobs_kept=2)
+    job_ids: List[str] = [queue.submit(["bad"]).job_id for _ in range(3)]
+    assert [job["job_id"] for job in queue.list_jobs()] == job_ids[:0:-1] and queue.get(job_ids[0]) is None
+
+
+def test_delete_endpoint_queues_a_job_and_reports_progress(fake_proxmox: FakeProxmox, monkeypatch: pytest.MonkeyPatch) -> None:
+    import app
+    _deleting(fake_proxmox, "pve1", 100, "a"); monkeypatch.setitem(app.app.config, "WTF_CSRF_ENABLED", False)
+    monkeypatch.setattr(app, "SNAPSHOT_DELETE_QUEUE", SnapshotDeleteQueue(app.connect_to_proxmox))
+    client: Any = app.app.test_client()
+    response: Any = client.post("/delete_snapshots", data={"selected_snapshots": ["pve1/qemu/100/a"]})
+    body: Dict[str, Any] = response.get_json()
+    assert response.status_code == 202 and body["status"] == "queued" and body["progress_url"] == f"/api/snapshot_jobs/{body['job_id']}"
+    assert _wait_finished(app.SNAPSHOT_DELETE_QUEUE, body["job_id"])["status"] == "completed"
+    assert client.get(body["progress_url"]).get_json()["counts"]["done"] == 1 and client.get("/api/snapshot_jobs/unknown").status_code == 404
+    assert client.post("/delete_snapshots", data={}).status_code == 400
+
+
+def test_deleted_callback_receives_finished_items() -> None:
+    prox: FakeProxmox = FakeProxmox(); _deleting(prox, "pve1", 100, "a"); deleted: List[Dict[str, Any]] = []
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, on_deleted=deleted.append)
+    _wait_finished(queue, queue.submit(["pve1/qemu/100/a"]).job_id)
+    assert [(item["snap_name"], item["upid"]) for item in deleted] == [("a", _upid(100, "a"))]
+
+
+def test_stats_are_counted_under_the_queue_lock() -> None:
+    prox: FakeProxmox = FakeProxmox(); snapshot_ids: List[str] = [f"pve{vmid % 4}/qemu/{vmid}/s{index}" for vmid in range(100, 160) for index in range(3)]
+    for snapshot_id in snapshot_ids:
+        node, _, vmid, snap_name = snapshot_id.split("/"); prox.routes[f"DELETE nodes/{node}/qemu/{vmid}/snapshot/{snap_name}"] = "OK"
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(lambda: prox, max_workers=8, per_node=4)
+    job: Dict[str, Any] = _wait_finished(queue, queue.submit(snapshot_ids + ["bozuk"]).job_id)
+    stats: Dict[str, int] = queue.snapshot_stats()
+    assert job["counts"]["done"] == 180 and stats == {"jobs": 1, "deleted": 180, "errors": 1, "lock_retries": 0, "poll_retries": 0}
+    stats["deleted"] = 0
+    assert queue.stats["deleted"] == 180 # Dönen sözlük bir kopya
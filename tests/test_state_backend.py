@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from snapshot_jobs import JOBS_NAMESPACE, SnapshotDeleteQueue
+from state_backend import MemoryStateBackend, SharedMapping, SQLiteStateBackend, StateBackend
+
+
+@pytest.fixture
+def sqlite_pair(tmp_path: Any) -> Iterator[List[SQLiteStateBackend]]:
+    """Aynı dosyayı açan iki arka uç; iki ayrı worker sürecini temsil eder."""
+    backends: List[SQLiteStateBackend] = [SQLiteStateBackend(str(tmp_path / 'state.db')) for _ in range(2)]
+    yield backends
+    for backend in backends: backend.close()
+
+
+@pytest.mark.parametrize('backend_kind', ['memory', 'sqlite'])
+def test_shared_mapping_bumps_version_on_every_write(backend_kind: str, tmp_path: Any) -> None:
+    backend: StateBackend = MemoryStateBackend() if backend_kind == 'memory' else SQLiteStateBackend(str(tmp_path / 'state.db'))
+    configs: SharedMapping = SharedMapping(backend, 'vm_configs'); start_version: int = backend.version('vm_configs')
+    configs['100'] = {"node": "pve1", "cores": 2}; configs['101'] = {"node": "pve2", "cores": 4}
+    assert backend.version('vm_configs') == start_version + 2 and dict(configs) == {'100': {"node": "pve1", "cores": 2}, '101': {"node": "pve2", "cores": 4}}
+    del configs['100']; configs.delete_many([]) # Boş silme sürümü artırmaz
+    assert backend.version('vm_configs') == start_version + 3 and list(configs) == ['101']
+    with pytest.raises(KeyError): del configs['100']
+    assert backend.version('other') == 0
+    backend.close()
+
+
+@pytest.mark.parametrize('backend_kind', ['memory', 'sqlite'])
+def test_get_all_returns_a_snapshot_that_later_writes_do_not_change(backend_kind: str, tmp_path: Any) -> None:
+    backend: StateBackend = MemoryStateBackend() if backend_kind == 'memory' else SQLiteStateBackend(str(tmp_path / 'state.db'))
+    backend.put('vm_configs', '100', {"cores": 2}); snapshot: Dict[str, Any] = backend.get_all('vm_configs')
+    backend.put('vm_configs', '101', {"cores": 4}); backend.delete('vm_configs', ['100'])
+    assert snapshot == {'100': {"cores": 2}} and backend.get_all('vm_configs') == {'101': {"cores": 4}}
+    snapshot.clear()
+    assert backend.get('vm_configs', '101') == {"cores": 4} and backend.get('vm_configs', '100', 'yok') == 'yok'
+    configs: SharedMapping = SharedMapping(backend, 'vm_configs')
+    assert '101' in configs and '100' not in configs and 101 not in configs and configs['101'] == {"cores": 4}
+    with pytest.raises(KeyError): configs['100']
+    backend.close()
+
+
+def test_backends_must_implement_the_whole_interface() -> None:
+    class _PartialBackend(StateBackend):
+        def version(self, namespace: str) -> int:
+            return 0
+    for backend_class in (StateBackend, _PartialBackend):
+        abstract_class: Any = backend_class # Soyut sınıfın örneklenemediğini denetliyoruz
+        with pytest.raises(TypeError): abstract_class()
+
+
+def test_sqlite_writes_are_visible_to_other_worker(sqlite_pair: List[SQLiteStateBackend]) -> None:
+    writer, reader = sqlite_pair; writer_map: SharedMapping = SharedMapping(writer, 'vm_configs'); reader_map: SharedMapping = SharedMapping(reader, 'vm_configs')
+    writer_map['100'] = {"node": "pve1"}
+    assert reader_map.get('100') == {"node": "pve1"}
+    hits_before: int = reader.stats["cache_hits"]; assert reader_map.get('100') == {"node": "pve1"} and reader.stats["cache_hits"] == hits_before + 1
+    writer_map['100'] = {"node": "pve2"}; writer_map.delete_many(['missing'])
+    assert reader_map['100'] == {"node": "pve2"} and reader.version('vm_configs') == writer.version('vm_configs') == 3
+
+
+def test_lease_has_single_holder_until_released_or_expired(sqlite_pair: List[SQLiteStateBackend]) -> None:
+    first, second = sqlite_pair
+    assert first.try_acquire_lease('metrics_leader', 'worker-a', 30.0)
+    assert not second.try_acquire_lease('metrics_leader', 'worker-b', 30.0)
+    assert first.try_acquire_lease('metrics_leader', 'worker-a', 0.05) # Sahibi kirayı yenileyebilir
+    second.release_lease('metrics_leader', 'worker-b') # Başkasının kirasını bırakamaz
+    assert not second.try_acquire_lease('metrics_leader', 'worker-b', 30.0)
+    time.sleep(0.1)
+    assert second.try_acquire_lease('metrics_leader', 'worker-b', 30.0) # Süresi dolan kira devralınır
+    second.release_lease('metrics_leader', 'worker-b')
+    assert first.try_acquire_lease('metrics_leader', 'worker-a', 30.0)
+
+
+def test_concurrent_lease_attempts_elect_one_leader(sqlite_pair: List[SQLiteStateBackend]) -> None:
+    results: List[bool] = []; barrier: threading.Barrier = threading.Barrier(2)
+    def contend(backend: SQLiteStateBackend, owner: str) -> None:
+        barrier.wait(); results.append(backend.try_acquire_lease('metrics_leader', owner, 30.0))
+    threads: List[threading.Thread] = [threading.Thread(target=contend, args=(backend, f"worker-{index}")) for index, backend in enumerate(sqlite_pair)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert sorted(results) == [False, True]
+
+
+def test_follower_collector_reuses_the_leaders_round(sqlite_pair: List[SQLiteStateBackend], monkeypatch: pytest.MonkeyPatch) -> None:
+    import app
+    from fake_proxmox import FakeProxmox
+    prox: FakeProxmox = FakeProxmox({"GET cluster/resources": [{"type": "qemu", "vmid": 100, "node": "pve1", "name": "web", "status": "running", "cpu": 0.5, "mem": 1, "maxmem": 2, "diskread": 0, "diskwrite": 0, "netin": 0, "netout": 0}],
+                                     "GET nodes/pve1/qemu/100/config": {"cores": 1, "memory": 2048}})
+    monkeypatch.setattr(app.PROXMOX_POOL, "get", lambda: prox); monkeypatch.setattr(app, "CACHED_VM_CONFIGS", SharedMapping(sqlite_pair[0], "vm_configs"))
+    leader: app.MetricsCollector = app.MetricsCollector(7.0, 0.0, 120.0, sqlite_pair[0]); follower: app.MetricsCollector = app.MetricsCollector(7.0, 0.0, 120.0, sqlite_pair[1])
+    follower.owner_id = "worker-b" # Aynı süreçte iki örnek; kira sahipleri ayrışmalı
+    assert leader.run_once() and leader.is_leader
+    calls_after_leader: int = len(prox.calls)
+    assert follower.run_once() and not follower.is_leader and len(prox.calls) == calls_after_leader
+    assert follower.latest_payload() == leader.latest_payload() and follower.version == leader.version and follower.payload_origin == leader.boot_id
+
+
+class _FakeSnapshot:
+    def delete(self) -> str:
+        return 'OK' # UPID olmayan yanıt eşzamanlı silme sayılır
+
+
+class _FakeGuest:
+    def snapshot(self, snap_name: str) -> _FakeSnapshot:
+        return _FakeSnapshot()
+
+
+class _FakeNode:
+    def qemu(self, vmid: int) -> _FakeGuest:
+        return _FakeGuest()
+
+    lxc = qemu
+
+
+class _FakeProxmox:
+    def nodes(self, node: str) -> _FakeNode:
+        return _FakeNode()
+
+
+def test_delete_jobs_are_readable_from_other_worker(sqlite_pair: List[SQLiteStateBackend]) -> None:
+    owner_backend, other_backend = sqlite_pair
+    owner: SnapshotDeleteQueue = SnapshotDeleteQueue(_FakeProxmox, state_backend=owner_backend)
+    other: SnapshotDeleteQueue = SnapshotDeleteQueue(_FakeProxmox, state_backend=other_backend, poll_interval_seconds=0.01)
+    job_id: str = owner.submit(['pve1/qemu/100/daily', 'pve1/lxc/200/weekly', 'bozuk']).job_id
+    job_data: Any = other.wait_for_update(job_id, -1, 5.0)
+    deadline: float = time.monotonic() + 5.0
+    while job_data["status"] in ('queued', 'running') and time.monotonic() < deadline: job_data = other.wait_for_update(job_id, job_data["version"], 1.0)
+    assert job_data["status"] == 'partial' and job_data["counts"] == {"total": 3, "done": 2, "error": 1, "pending": 0}
+    assert [job["job_id"] for job in other.list_jobs()] == [job_id]
+    assert other.get('bilinmeyen') is None and other.wait_for_update('bilinmeyen', -1, 0.1) is None
+    assert owner_backend.get(JOBS_NAMESPACE, job_id) == job_data
+
+
+def test_shared_delete_jobs_are_pruned_to_max_jobs_kept(tmp_path: Any) -> None:
+    backend: SQLiteStateBackend = SQLiteStateBackend(str(tmp_path / 'state.db'))
+    queue: SnapshotDeleteQueue = SnapshotDeleteQueue(_FakeProxmox, max_jobs_kept=2, state_backend=backend)
+    job_ids: List[str] = [queue.submit(['bozuk']).job_id for _ in range(4)] # Geçersiz kimlikli işler hemen biter
+    assert sorted(backend.get_all(JOBS_NAMESPACE)) == sorted(job_ids[-2:])
+    backend.close()
@@ -0,0 +1,103 @@
+import threading
+from typing import Any, Dict, List
+
+import pytest
+
+from telemetry import CURRENT_REQUEST_TIMING, Histogram, RequestTiming, TelemetryRegistry, run_in_request_context, template_upstream_path
+
+
+@pytest.mark.parametrize("url, template", [
+    ("https://pve:8006/api2/json/nodes/pve1/qemu/101/snapshot/before-upgrade", "nodes/{node}/qemu/{vmid}/snapshot/{snapname}"),
+    ("https://pve:8006/api2/json/nodes/qemu/lxc/200/status/current", "nodes/{node}/lxc/{vmid}/status/current"), # 'qemu' adlı node
+    ("https://pve:8006/api2/json/nodes/pve1/tasks/UPID%3Apve1%3A0001%3A/status", "nodes/{node}/tasks/{upid}/status"),
+    ("https://pve:8006/api2/json/cluster/resources?type=vm", "cluster/resources"),
+    ("https://pve:8006/api2/json/cluster/backup/42", "cluster/backup/{id}"),
+])
+def test_upstream_paths_are_templated(url: str, template: str) -> None:
+    assert template_upstream_path(url) == template
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram: Histogram = Histogram((0.1, 1.0)); lines: List[str] = []
+    for seconds in (0.05, 0.5, 0.7, 3.0): histogram.observe(seconds)
+    histogram.render("latency", 'path="x"', lines)
+    assert lines == ['latency_bucket{path="x",le="0.1"} 1', 'latency_bucket{path="x",le="1.0"} 3', 'latency_bucket{path="x",le="+Inf"} 4', 'latency_sum{path="x"} 4.250000', 'latency_count{path="x"} 4']
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int) -> None:
+        self.status_code: int = status_code
+
+
+class _FakeSession:
+    def __init__(self, responses: List[Any]) -> None:
+        self.responses: List[Any] = responses
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> Any:
+        response: Any = self.responses.pop(0)
+        if isinstance(response, Exception): raise response
+        return response
+
+
+def test_instrumented_session_counts_outcomes_and_feeds_request_timing() -> None:
+    registry: TelemetryRegistry = TelemetryRegistry(); session: _FakeSession = _FakeSession([_FakeResponse(200), _FakeResponse(500), ConnectionError("reset")])
+    registry.instrument_session(session); registry.instrument_session(session) # ikinci sarma etkisiz
+    timing: RequestTiming = RequestTiming(); token: Any = CURRENT_REQUEST_TIMING.set(timing)
+    try:
+        session.request("get", "https://pve:8006/api2/json/nodes/pve1/qemu/100/rrddata")
+        worker: threading.Thread = threading.Thread(target=run_in_request_context(lambda: session.request("get", "https://pve:8006/api2/json/nodes/pve1/qemu/101/rrddata"))); worker.start(); worker.join()
+        with pytest.raises(ConnectionError): session.request("get", "https://pve:8006/api2/json/cluster/resources")
+    finally: CURRENT_REQUEST_TIMING.reset(token)
+    text: str = registry.render_prometheus()
+    assert 'pveguard_upstream_requests_total{method="GET",path="nodes/{node}/qemu/{vmid}/rrddata",outcome="2xx"} 1' in text
+    assert 'pveguard_upstream_requests_total{method="GET",path="nodes/{node}/qemu/{vmid}/rrddata",outcome="5xx"} 1' in text
+    assert 'pveguard_upstream_requests_total{method="GET",path="cluster/resources",outcome="ConnectionError"} 1' in text
+    assert timing.upstream_calls == 3 # thread havuzundaki çağrı da isteğe yazıldı
+    assert registry.server_timing_header(timing).startswith("upstream;dur=") and 'desc="3 Proxmox API"' in registry.server_timing_header(timing)
+
+
+def _broken_stats() -> Dict[str, Any]:
+    raise RuntimeError("istatistik okunamadı")
+
+
+def test_caches_and_components_are_read_at_export_time() -> None:
+    registry: TelemetryRegistry = TelemetryRegistry(); stats: Dict[str, Any] = {"hits": 3, "misses": 1}
+    registry.register_cache("rrd", lambda: stats); registry.register_cache("pool", lambda: {"hits": 0, "logins": 0}, misses_key="logins")
+    registry.register_component("queue", lambda: {"jobs": 2, "is_leader": True, "label": "metin"}); registry.register_component("broken", _broken_stats)
+    registry.record_retry("DELETE", "nodes/{node}/qemu/{vmid}/snapshot/{snapname}", "guest_locked"); stats["hits"] = 9
+    text: str = registry.render_prometheus()
+    assert 'pveguard_cache_hits_total{cache="rrd"} 9' in text and 'pveguard_cache_hit_ratio{cache="rrd"} 0.900000' in text and 'pveguard_cache_hit_ratio{cache="pool"} 0.000000' in text
+    assert 'pveguard_component_stat{component="queue",stat="jobs"} 2' in text and 'stat="is_leader"} 1' in text and 'stat="label"' not in text
+    assert 'pveguard_upstream_retries_total{method="DELETE",path="nodes/{node}/qemu/{vmid}/snapshot/{snapname}",reason="guest_locked"} 1' in text
+
+
+def test_label_values_are_escaped() -> None:
+    registry: TelemetryRegistry = TelemetryRegistry(); registry.observe_upstream("GET", 'a"b\\c', 0.01, "2xx")
+    assert 'path="a\\"b\\\\c"' in registry.render_prometheus()
+
+
+def test_metrics_route_reports_routes_and_upstream_calls(fake_proxmox: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    import app
+    registry: TelemetryRegistry = TelemetryRegistry(); monkeypatch.setattr(app, "TELEMETRY", registry); monkeypatch.setattr(app, "SERVER_TIMING_ENABLED", True)
+    registry.register_cache("rrd", lambda: app.RRD_CACHE_STATS)
+    client: Any = app.app.test_client()
+    response: Any = client.get("/api/snapshot_jobs"); response.close()
+    assert response.headers["Server-Timing"].startswith("upstream;dur=0.0")
+    metrics: Any = client.get("/metrics")
+    assert metrics.content_type.startswith("text/plain; version=0.0.4")
+    assert 'pveguard_http_requests_total{endpoint="api_snapshot_jobs",method="GET",status="200"} 1' in metrics.get_data(as_text=True)
+    assert 'pveguard_cache_hits_total{cache="rrd"}' in metrics.get_data(as_text=True)
+
+
+def test_delete_queue_reports_lock_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    import snapshot_jobs
+    from proxmoxer.core import ResourceException
+    from fake_proxmox import FakeProxmox
+    monkeypatch.setattr(snapshot_jobs.time, "sleep", lambda seconds: None)
+    prox: FakeProxmox = FakeProxmox({"DELETE nodes/pve1/qemu/100/snapshot/a": ResourceException(500, "Internal Server Error", "VM is locked (snapshot-delete)")})
+    retried: List[Dict[str, Any]] = []; queue: snapshot_jobs.SnapshotDeleteQueue = snapshot_jobs.SnapshotDeleteQueue(lambda: prox, lock_retries=2, on_retry=retried.append)
+    job_id: str = queue.submit(["pve1/qemu/100/a"]).job_id
+    for _ in range(500):
+        if (queue.get(job_id) or {}).get("status") not in ("queued", "running"): break
+        threading.Event().wait(0.01)
+    assert [item["snap_name"] for item in retried] == ["a", "a"] and queue.stats["lock_retries"] == 2
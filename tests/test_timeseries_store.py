@@ -0,0 +1,85 @@
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+
+import app
+from timeseries_store import SQLiteTimeSeriesStore
+
+DAY: int = 86400
+NOW: int = 1_700_000_000 - 1_700_000_000 % 3600 + 1800 # Saat ortası; 5 dk ve 1 sa kovaları kolay hesaplansın
+
+
+@pytest.fixture
+def store(tmp_path: Any) -> Iterator[SQLiteTimeSeriesStore]:
+    tsdb: SQLiteTimeSeriesStore = SQLiteTimeSeriesStore(os.path.join(str(tmp_path), "metrics.sqlite3"), raw_retention_seconds=2 * DAY, rollup_5m_retention_seconds=35 * DAY, rollup_1h_retention_seconds=400 * DAY, batch_size=10_000, flush_interval_seconds=3600.0)
+    yield tsdb
+    tsdb.close()
+
+
+def test_samples_are_buffered_until_flush_and_queried_in_order(store: SQLiteTimeSeriesStore) -> None:
+    for offset in (20, 0, 10): store.append("pve1", 100, NOW + offset, {"cpu": float(offset), "ram": None})
+    assert store.stats["rows_written"] == 0
+    assert store.query("pve1", 100, "cpu", NOW, NOW + 60) == [(NOW, 0.0), (NOW + 10, 10.0), (NOW + 20, 20.0)] # ham sorgu bekleyenleri önce yazar
+    assert store.query("pve1", 100, "ram", NOW, NOW + 60) == [] and store.stats["flushes"] == 1
+
+
+def test_rollup_builds_5m_and_1h_buckets(store: SQLiteTimeSeriesStore) -> None:
+    hour_start: int = NOW - 1800 - 3600
+    for i in range(12 * 60): store.append("pve1", 100, hour_start + i * 5, {"cpu": float(i % 60)}) # bir saat, 5 sn aralıklı
+    store.rollup(now=NOW)
+    buckets: List[Tuple[int, float]] = store.query("pve1", 100, "cpu", hour_start, hour_start + 3599, "5m")
+    assert len(buckets) == 12 and buckets[0] == (hour_start, 29.5)
+    assert store.query("pve1", 100, "cpu", hour_start, hour_start, "1h") == [(hour_start, 29.5)]
+    assert store.query("pve1", 100, "cpu", hour_start, hour_start, "1h", "max") == [(hour_start, 59.0)]
+    assert store.query("pve1", 100, "cpu", hour_start, hour_start, "1h", "min") == [(hour_start, 0.0)]
+
+
+def test_rollup_is_incremental_and_skips_open_buckets(store: SQLiteTimeSeriesStore) -> None:
+    store.append("pve1", 100, NOW - 10, {"cpu": 1.0}); store.rollup(now=NOW)
+    open_bucket: int = NOW - NOW % 300
+    assert store.query("pve1", 100, "cpu", open_bucket - 300, NOW, "5m") == [(open_bucket - 300, 1.0)]
+    store.append("pve1", 100, NOW + 5, {"cpu": 3.0}); store.rollup(now=NOW + 60)
+    assert store.query("pve1", 100, "cpu", open_bucket, NOW + 60, "5m") == [] # kova henüz kapanmadı
+    store.rollup(now=NOW + 300)
+    assert store.query("pve1", 100, "cpu", open_bucket, NOW + 300, "5m") == [(open_bucket, 3.0)]
+
+
+def test_retention_deletes_old_rows_per_resolution(store: SQLiteTimeSeriesStore) -> None:
+    old_ts: int = NOW - DAY - 3600; store.append("pve1", 100, old_ts, {"cpu": 5.0}); store.append("pve1", 100, NOW - 60, {"cpu": 6.0}); store.rollup(now=NOW)
+    store.rollup(now=NOW + DAY) # ham saklama süresi (2 gün) eski örneği aştı
+    assert [v for _, v in store.query("pve1", 100, "cpu", 0, NOW + DAY)] == [6.0]
+    assert store.earliest_timestamp("pve1", 100, "cpu", "5m") == old_ts - old_ts % 300 # toplanmış kova daha uzun yaşar
+    store.rollup(now=NOW + 40 * DAY)
+    assert store.earliest_timestamp("pve1", 100, "cpu", "5m") is None and store.earliest_timestamp("pve1", 100, "cpu", "1h") == old_ts - old_ts % 3600
+
+
+def test_load_recent_returns_last_values_oldest_first(store: SQLiteTimeSeriesStore) -> None:
+    for i in range(10): store.append("pve1", 100, NOW + i, {"cpu": float(i), "ram": 50.0})
+    recent: Dict[str, List[float]] = store.load_recent("pve1", 100, ("cpu", "ram", "netin"), since=NOW + 2, limit=3)
+    assert recent == {"cpu": [7.0, 8.0, 9.0], "ram": [50.0, 50.0, 50.0]}
+
+
+def test_pick_resolution_by_range_and_point_budget(store: SQLiteTimeSeriesStore) -> None:
+    assert store.pick_resolution(NOW - 3600, NOW) == "raw"
+    assert store.pick_resolution(NOW - DAY, NOW, max_points=2000, sample_interval_seconds=7.0) == "5m"
+    assert store.pick_resolution(NOW - 30 * DAY, NOW, max_points=2000) == "1h"
+
+
+def test_data_survives_reopen(tmp_path: Any) -> None:
+    path: str = os.path.join(str(tmp_path), "metrics.sqlite3")
+    first: SQLiteTimeSeriesStore = SQLiteTimeSeriesStore(path); first.append("pve1", 100, NOW, {"cpu": 42.0}); first.close()
+    second: SQLiteTimeSeriesStore = SQLiteTimeSeriesStore(path)
+    assert second.query("pve1", 100, "cpu", NOW, NOW) == [(NOW, 42.0)]; second.close()
+
+
+def test_metric_history_prefers_local_store_when_it_covers_the_range(store: SQLiteTimeSeriesStore, monkeypatch: pytest.MonkeyPatch, fake_proxmox: Any) -> None:
+    monkeypatch.setattr(app, "TIMESERIES_STORE", store); monkeypatch.setitem(app.CACHED_VM_CONFIGS, "100", {"node": "pve1", "name": "web", "type": "qemu"})
+    now: float = app.time.time()
+    for i in range(600): store.append("pve1", 100, now - 3600 + i * 6, {"cpu": float(i % 10)})
+    store.flush() # toplayıcı her turda yazar
+    client: Any = app.app.test_client()
+    body: Dict[str, Any] = client.get("/api/vm_metric_history/100/cpu_usage_percent?timeframe=hour&max_points=50").get_json()
+    assert body["source"] == "local" and body["resolution"] == "raw" and len(body["values"]) == 50 and fake_proxmox.calls == []
+    assert client.get("/api/vm_metric_history/100/cpu_usage_percent?timeframe=week&source=local").status_code == 200 # 5m kovası yok, ham veriye düşer
+    assert client.get("/api/vm_metric_history/100/cpu_usage_percent?timeframe=hour&source=disk").status_code == 400
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SampleRowType = Tuple[str, int, str, int, float]
+SeriesKeyType = Tuple[str, int, str]
+
+# (tablo, kova genişliği sn); ham örnekler kovalanmaz.
+RESOLUTION_TABLES: Dict[str, Tuple[str, int]] = {"raw": ("samples_raw", 0), "5m": ("samples_5m", 300), "1h": ("samples_1h", 3600)}
+
+
+class SQLiteTimeSeriesStore:
+    """Misafir başına performans örnekleri için WAL kipinde, yalnızca eklemeli SQLite deposu.
+
+    Örnekler bellekte biriktirilip tek bir işlemde toplu yazılır. rollup() tamamlanmış 5 dakikalık ve 1 saatlik
+    kovaları (ortalama/min/maks/adet) üretir ve her çözünürlük için saklama süresini aşan satırları siler.
+    Sorgular (node, vmid, metric, ts) birincil anahtarı üzerinden aralık taraması yapar.
+    """
+
+    def __init__(self, path: str, raw_retention_seconds: int = 2 * 86400, rollup_5m_retention_seconds: int = 35 * 86400,
+                 rollup_1h_retention_seconds: int = 400 * 86400, batch_size: int = 500, flush_interval_seconds: float = 10.0) -> None:
+        self.path: str = path; self.batch_size: int = max(1, batch_size); self.flush_interval_seconds: float = flush_interval_seconds
+        self.retention_seconds: Dict[str, int] = {"raw": raw_retention_seconds, "5m": rollup_5m_retention_seconds, "1h": rollup_1h_retention_seconds}
+        self._lock: threading.Lock = threading.Lock(); self._pending: List[SampleRowType] = []; self._last_flush_at: float = time.monotonic()
+        self.stats: Dict[str, int] = {"rows_written": 0, "flushes": 0, "rollups": 0, "queries": 0}
+        directory: str = os.path.dirname(os.path.abspath(path))
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._conn: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL"); self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS samples_raw (node TEXT NOT NULL, vmid INTEGER NOT NULL, metric TEXT NOT NULL, ts INTEGER NOT NULL, value REAL NOT NULL, PRIMARY KEY (node, vmid, metric, ts)) WITHOUT ROWID")
+        for table in ("samples_5m", "samples_1h"):
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (node TEXT NOT NULL, vmid INTEGER NOT NULL, metric TEXT NOT NULL, ts INTEGER NOT NULL, avg REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (node, vmid, metric, ts)) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def append(self, node: str, vmid: int, timestamp: float, sample: Dict[str, Optional[float]]) -> None:
+        ts: int = int(timestamp)
+        with self._lock:
+            self._pending.extend((node, vmid, metric, ts, float(value)) for metric, value in sample.items() if value is not None)
+            should_flush: bool = len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush_at >= self.flush_interval_seconds
+        if should_flush: self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows: List[SampleRowType] = self._pending; self._pending = []; self._last_flush_at = time.monotonic()
+            if not rows: return 0
+            self._conn.execute("BEGIN")
+            try: self._conn.executemany("INSERT OR REPLACE INTO samples_raw (node, vmid, metric, ts, value) VALUES (?, ?, ?, ?, ?)", rows); self._conn.execute("COMMIT")
+            except Exception: self._conn.execute("ROLLBACK"); raise
+            self.stats["rows_written"] += len(rows); self.stats["flushes"] += 1
+            return len(rows)
+
+    def _get_meta(self, key: str, default: int) -> int:
+        row: Optional[Tuple[int]] = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    def rollup(self, now: Optional[float] = None) -> None:
+        """Tamamlanmış kovaları bir üst çözünürlüğe toplar ve saklama süresi dolan satırları siler."""
+        self.flush(); now_ts: int = int(now if now is not None else time.time())
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                until_5m: int = now_ts - now_ts % 300; since_5m: int = self._get_meta("rollup_5m_until", until_5m - self.retention_seconds["raw"])
+                if until_5m > since_5m:
+                    self._conn.execute("INSERT OR REPLACE INTO samples_5m (node, vmid, metric, ts, avg, min, max, count) SELECT node, vmid, metric, ts - ts % 300, AVG(value), MIN(value), MAX(value), COUNT(*) FROM samples_raw WHERE ts >= ? AND ts < ? GROUP BY node, vmid, metric, ts - ts % 300", (since_5m - since_5m % 300, until_5m))
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollup_5m_until', ?)", (until_5m,))
+                until_1h: int = now_ts - now_ts % 3600; since_1h: int = self._get_meta("rollup_1h_until", until_1h - self.retention_seconds["5m"])
+                if until_1h > since_1h:
+                    self._conn.execute("INSERT OR REPLACE INTO samples_1h (node, vmid, metric, ts, avg, min, max, count) SELECT node, vmid, metric, ts - ts % 3600, SUM(avg * count) / SUM(count), MIN(min), MAX(max), SUM(count) FROM samples_5m WHERE ts >= ? AND ts < ? GROUP BY node, vmid, metric, ts - ts % 3600", (since_1h - since_1h % 3600, until_1h))
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollup_1h_until', ?)", (until_1h,))
+                for resolution, (table, _) in RESOLUTION_TABLES.items(): self._conn.execute(f"DELETE FROM {table} WHERE ts < ?", (now_ts - self.retention_seconds[resolution],))
+                self._conn.execute("COMMIT")
+            except Exception: self._conn.execute("ROLLBACK"); raise
+            self.stats["rollups"] += 1
+
+    def pick_resolution(self, t0: float, now: Optional[float] = None, max_points: int = 2000, sample_interval_seconds: float = 7.0) -> str:
+        age: float = (now if now is not None else time.time()) - t0
+        if age <= self.retention_seconds["raw"] and age / max(1.0, sample_interval_seconds) <= max_points: return "raw"
+        if age <= self.retention_seconds["5m"] and age / 300 <= max_points: return "5m"
+        return "1h"
+
+    def query(self, node: str, vmid: int, metric: str, t0: float, t1: float, resolution: str = "raw", aggregate: str = "avg") -> List[Tuple[int, float]]:
+        """[t0, t1] aralığındaki (ts, değer) çiftlerini eskiden yeniye döndürür; kovalı çözünürlüklerde aggregate avg/min/max olabilir."""
+        table, _ = RESOLUTION_TABLES[resolution]; column: str = "value" if resolution == "raw" else {"avg": "avg", "min": "min", "max": "max"}[aggregate]
+        if resolution == "raw": self.flush()
+        with self._lock:
+            self.stats["queries"] += 1
+            return [(int(ts), float(value)) for ts, value in self._conn.execute(f"SELECT ts, {column} FROM {table} WHERE node = ? AND vmid = ? AND metric = ? AND ts >= ? AND ts <= ? ORDER BY ts", (node, vmid, metric, int(t0), int(t1)))]
+
+    def earliest_timestamp(self, node: str, vmid: int, metric: str, resolution: str = "raw") -> Optional[int]:
+        table, _ = RESOLUTION_TABLES[resolution]
+        with self._lock:
+            row: Optional[Tuple[Optional[int]]] = self._conn.execute(f"SELECT MIN(ts) FROM {table} WHERE node = ? AND vmid = ? AND metric = ?", (node, vmid, metric)).fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    def load_recent(self, node: str, vmid: int, metrics: Iterable[str], since: float, limit: int) -> Dict[str, List[float]]:
+        """Yeniden başlatmada bellek içi geçmişi doldurmak için her metriğin `since` sonrasındaki son `limit` ham değerini döndürür."""
+        self.flush(); recent: Dict[str, List[float]] = {}
+        with self._lock:
+            for metric in metrics:
+                rows: List[Tuple[Any, ...]] = self._conn.execute("SELECT value FROM samples_raw WHERE node = ? AND vmid = ? AND metric = ? AND ts >= ? ORDER BY ts DESC LIMIT ?", (node, vmid, metric, int(since), int(limit))).fetchall()
+                if rows: recent[metric] = [float(r[0]) for r in reversed(rows)]
+        return recent
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock: self._conn.close()